@@ -0,0 +1,75 @@
+"""
+Memory benchmark of the cell face storage of the exporter.
+
+Compares the peak memory of keeping the faces of a synthetic tetrahedral
+mesh as a python object per volume with lists of faces and tuple keys
+(the old MeshBuffer) against faceStore.CellFaceStore with packed keys.
+
+Usage: python benchmarks/cellFaceMemory.py [number of cells, default 1e6]
+"""
+
+import os, sys, time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import faceMatching
+import faceStore
+import syntheticMesh
+
+
+class ListBuffer(object):
+    """The face storage of a volume before faceStore, for comparison"""
+
+    def __init__(self, v, faces):
+        self.v = v
+        self.faces = faces
+        self.keys = [tuple(sorted(fnodes)) for fnodes in faces]
+        self.fL = len(faces)
+
+
+def buildLists(cellNrFaces, faceLengths, faceNodes):
+    nodes = faceNodes.tolist()
+    buffers = list()
+    fi = 0
+    ni = 0
+    for v, nf in enumerate(cellNrFaces.tolist()):
+        faces = list()
+        for l in faceLengths[fi:fi + nf].tolist():
+            faces.append(nodes[ni:ni + l])
+            ni += l
+        fi += nf
+        buffers.append(ListBuffer(v, faces))
+    return buffers
+
+
+def buildStore(cellNrFaces, faceLengths, faceNodes):
+    cells = faceStore.CellFaceStore(cellNrFaces, faceStore.FaceStore(faceLengths, faceNodes))
+    bits = faceMatching.bitsPerNode(faceNodes.max())
+    keys = faceMatching.packKeys(cells.faces.lengths(), cells.faces.nodes, bits)
+    return cells, keys
+
+
+def measure(build, args):
+    tracemalloc.start()
+    start = time.time()
+    res = build(*args)
+    elapsed = time.time() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del res
+    return current, peak, elapsed
+
+
+def main(nrCells=1000000):
+    n = syntheticMesh.tetsForCells(nrCells)
+    tets = syntheticMesh.blockTets(n)
+    args = syntheticMesh.tetCellFaces(tets)
+    del tets
+    print('%d tetrahedra, %d cell faces' % (len(args[0]), len(args[1])))
+    for name, build in (('per volume lists', buildLists), ('CellFaceStore', buildStore)):
+        current, peak, elapsed = measure(build, args)
+        print('%-18s kept %8.1f MB  peak %8.1f MB  %6.2fs' % (name, current / 1e6, peak / 1e6, elapsed))
+
+
+if __name__ == '__main__':
+    main(int(float(sys.argv[1])) if len(sys.argv) > 1 else 1000000)
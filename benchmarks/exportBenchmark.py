@@ -0,0 +1,137 @@
+"""
+Benchmark of exportToFoam on synthetic meshes without Salome.
+
+Each case exports a block of cells of one type (tet, hex, prism or
+poly, see syntheticMesh) through the fake SMESH mesh of fakeSmesh, so
+the exporter makes the same per element calls as in Salome. The stages
+of the export are timed by exportProfile and for each of them the time,
+throughput and peak memory are printed. Every case runs in its own
+process so the peak memory is that of the case.
+
+The results can be saved as a baseline and later runs compared to it,
+a stage slower than the baseline by more than the tolerance is reported
+as a regression and the exit status is 1.
+
+Usage: python benchmarks/exportBenchmark.py [options]
+    --types tet,hex,prism,poly   cell types
+    --cells 1e4,1e5,1e6,5e6      approximate numbers of cells
+    --engine numpy               dict or numpy, see exportToFoam
+    --format ascii               ascii or binary
+    --save results.json          save the results, e.g. as the baseline
+    --baseline results.json      compare with saved results
+    --tolerance 0.2              allowed slowdown against the baseline
+"""
+
+import argparse
+import concurrent.futures
+import json
+import os, sys, shutil, tempfile, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import fakeSmesh
+import syntheticMesh
+
+SIZES = (1e4, 1e5, 1e6, 5e6)
+
+
+def runCase(cellType, nrCells, engine, format):
+    """Export one block in a temporary directory, return the stages by name"""
+    fakeSmesh.install()
+    import salomeToOpenFOAMPython3 as exporter
+    exporter.debug = 0
+    start = time.time()
+    mesh = fakeSmesh.FakeMesh.block(cellType, nrCells)
+    buildTime = time.time() - start
+    stages = dict()
+
+    def onStage(record):
+        stages[record['name']] = dict((key, record.get(key)) for key in
+                                      ('wall', 'cpu', 'items', 'itemsPerSecond', 'peakMemory'))
+        stages[record['name']]['smeshCalls'] = sum(record['smeshCalls'].values())
+    tmp = tempfile.mkdtemp(prefix='exportBenchmark')
+    try:
+        exporter.exportToFoam(mesh, os.path.join(tmp, 'constant', 'polyMesh'), engine=engine,
+                              format=format, profileCallback=onStage)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return dict(cells=len(mesh.cellNodes), build=buildTime, stages=stages)
+
+
+def caseName(cellType, nrCells):
+    return '%s-%d' % (cellType, nrCells)
+
+
+def printCase(name, result):
+    print('%s: %d cells, mesh built in %.1fs' % (name, result['cells'], result['build']))
+    print('    %-16s %9s %9s %14s %10s %12s' % ('stage', 'wall [s]', 'cpu [s]', 'items/s',
+                                               'peak [MB]', 'SMESH calls'))
+    for stage, r in result['stages'].items():
+        rate = '%14.0f' % r['itemsPerSecond'] if r['itemsPerSecond'] else '%14s' % '-'
+        peak = '%10.0f' % (r['peakMemory'] / 1e6) if r['peakMemory'] else '%10s' % '-'
+        print('    %-16s %9.3f %9.3f %s %s %12d' % (stage, r['wall'], r['cpu'], rate, peak,
+                                                   r['smeshCalls']))
+
+
+def compare(results, baseline, tolerance):
+    """Print the stages slower than the baseline, return their number"""
+    regressions = 0
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        for stage, r in result['stages'].items():
+            base = baseline[name]['stages'].get(stage)
+            if base is None or base['wall'] <= 0:
+                continue
+            ratio = r['wall'] / base['wall']
+            #very short stages are mostly noise
+            if ratio > 1.0 + tolerance and r['wall'] - base['wall'] > 0.05:
+                print('REGRESSION %s %s: %.3fs, baseline %.3fs (%+.0f%%)' \
+                          % (name, stage, r['wall'], base['wall'], 100 * (ratio - 1)))
+                regressions += 1
+            peak, basePeak = r['peakMemory'], base['peakMemory']
+            if stage == 'total' and peak and basePeak and peak > (1.0 + tolerance) * basePeak:
+                print('REGRESSION %s peak memory: %.0f MB, baseline %.0f MB' \
+                          % (name, peak / 1e6, basePeak / 1e6))
+                regressions += 1
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark exportToFoam on synthetic meshes')
+    parser.add_argument('--types', default=','.join(syntheticMesh.CELLTYPES))
+    parser.add_argument('--cells', default=','.join('%g' % n for n in SIZES))
+    parser.add_argument('--engine', default='numpy', choices=('dict', 'numpy'))
+    parser.add_argument('--format', default='ascii', choices=('ascii', 'binary'))
+    parser.add_argument('--save')
+    parser.add_argument('--baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    results = dict()
+    for nrCells in [int(float(n)) for n in args.cells.split(',')]:
+        for cellType in args.types.split(','):
+            name = caseName(cellType, nrCells)
+            #a new process per case so the peak memory is its own
+            with concurrent.futures.ProcessPoolExecutor(max_workers=1) as pool:
+                results[name] = pool.submit(runCase, cellType, nrCells, args.engine,
+                                            args.format).result()
+            printCase(name, results[name])
+
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump(dict(engine=args.engine, format=args.format, cases=results),
+                      file, indent=2)
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        if (baseline['engine'], baseline['format']) != (args.engine, args.format):
+            print('Warning, the baseline is for engine %s and format %s' \
+                      % (baseline['engine'], baseline['format']))
+        regressions = compare(results, baseline['cases'], args.tolerance)
+        print('%d regressions against %s' % (regressions, args.baseline))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
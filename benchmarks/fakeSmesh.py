@@ -0,0 +1,228 @@
+"""
+A fake SMESH mesh for benchmarking the Salome to OpenFOAM exporter.
+
+FakeMesh answers the SMESH calls meshSource.SalomeMeshSource makes
+(GetElementsByType, GetElemFaceNodes, GetElemNodes, GetNodeXYZ,
+GetGroups, GetIdsFromFilter, CreateGroup) one element at a time like
+SMESH does, from the numpy arrays of a syntheticMesh block. ExportMED
+writes the mesh as a MED file with h5py, the nodes and the elements of
+each type by increasing id like SMESH. With medNumbers the file also
+has the ids and the elements are written in reverse. So the exporter
+runs through the same calls as in Salome.
+The volumes have ids 1..nrCells and the boundary faces follow after
+them. The boundary faces are in six groups, one per side of the block,
+and every other cell is in the volume group zone.
+
+install() points meshSource at the fake SMESH module when Salome is
+missing.
+"""
+
+import types
+import numpy as np
+try:
+    import h5py
+except ImportError:
+    h5py = None #no ExportMED
+import meshSource
+import syntheticMesh
+
+SMESH = types.SimpleNamespace(NODE='NODE', EDGE='EDGE', FACE='FACE', VOLUME='VOLUME',
+                              FT_FreeFaces='FT_FreeFaces', FT_EntityType='FT_EntityType',
+                              Entity_Triangle='Entity_Triangle',
+                              Entity_Quadrangle='Entity_Quadrangle',
+                              Entity_Polygon='Entity_Polygon', Entity_Tetra='Entity_Tetra',
+                              Entity_Penta='Entity_Penta', Entity_Hexa='Entity_Hexa',
+                              Entity_Polyhedra='Entity_Polyhedra')
+
+#the MED type and SMESH entity of the faces by number of nodes
+MEDFACES = {3: ('TR3', SMESH.Entity_Triangle), 4: ('QU4', SMESH.Entity_Quadrangle)}
+MEDPOLYGON = ('POG', SMESH.Entity_Polygon)
+
+SIDES = ('xmin', 'xmax', 'ymin', 'ymax', 'zmin', 'zmax')
+
+
+class FakeBuilder(object):
+    """smeshBuilder.New() of the fake SMESH"""
+
+    def GetFilter(self, elemType, criterion, compare=None, threshold=None):
+        return (elemType, criterion, threshold)
+
+    def SetName(self, obj, name):
+        pass
+
+
+smeshBuilder = types.SimpleNamespace(New=FakeBuilder)
+salome = types.SimpleNamespace(sg=types.SimpleNamespace(hasDesktop=lambda: False))
+
+
+def install():
+    """Let meshSource.SalomeMeshSource read FakeMesh when Salome is missing"""
+    if meshSource.salome is None:
+        meshSource.SMESH = SMESH
+        meshSource.smeshBuilder = smeshBuilder
+        meshSource.salome = salome
+
+
+class FakeGroup(object):
+    """A group of elements"""
+
+    def __init__(self, name, elemType, ids):
+        self.name = name
+        self.elemType = elemType
+        self.ids = list(ids)
+
+    def GetName(self):
+        return self.name
+
+    def GetType(self):
+        return self.elemType
+
+    def GetIDs(self):
+        return list(self.ids)
+
+    def Add(self, ids):
+        self.ids.extend(ids)
+
+
+class FakeMesh(object):
+    """
+    A SMESH mesh of a block of cells.
+
+    args:
+        +    points: (n, 3) coordinates, node i has id i + 1
+        + cellNodes: (nrCells, k) node ids of each cell
+        +     faces: faces of a cell as indices into its row of cellNodes
+    """
+
+    def __init__(self, points, cellNodes, faces, name='Mesh_1'):
+        self.name = name
+        self.points = np.asarray(points, dtype=np.float64)
+        self.cellNodes = np.asarray(cellNodes, dtype=np.int64)
+        self.faces = [np.asarray(f, dtype=np.int64) for f in faces]
+        lengths, nodes = syntheticMesh.boundaryFaces(self.cellNodes, faces)
+        self.faceOffsets = np.concatenate(([0], np.cumsum(lengths)))
+        self.faceNodes = nodes
+        nrCells = len(self.cellNodes)
+        self.faceIds = np.arange(nrCells + 1, nrCells + 1 + len(lengths))
+
+        #the side of the block each boundary face is on
+        centres = np.add.reduceat(self.points[nodes - 1], self.faceOffsets[:-1], axis=0) / \
+            lengths[:, None]
+        low, high = self.points.min(axis=0), self.points.max(axis=0)
+        tol = 1e-9 * np.max(high - low)
+        side = np.full(len(lengths), -1)
+        for axis in range(3):
+            side[np.abs(centres[:, axis] - low[axis]) < tol] = 2 * axis
+            side[np.abs(centres[:, axis] - high[axis]) < tol] = 2 * axis + 1
+        self.groups = [FakeGroup(name, SMESH.FACE, self.faceIds[side == i].tolist())
+                       for i, name in enumerate(SIDES)]
+        self.groups.append(FakeGroup('zone', SMESH.VOLUME, range(1, nrCells + 1, 2)))
+        self.medNumbers = False
+
+        #the MED type and SMESH entity of the volumes
+        nrNodes, nrFaces = self.cellNodes.shape[1], len(self.faces)
+        self.medVolume = {(4, 4): ('TE4', SMESH.Entity_Tetra),
+                          (6, 5): ('PE6', SMESH.Entity_Penta),
+                          (8, 6): ('HE8', SMESH.Entity_Hexa)}.get(
+                              (nrNodes, nrFaces), ('POE', SMESH.Entity_Polyhedra))
+
+    @classmethod
+    def block(cls, cellType, nrCells, name='Mesh_1'):
+        """Return a mesh of about nrCells cells of cellType, see syntheticMesh"""
+        return cls(*syntheticMesh.blockCells(cellType, nrCells), name=name)
+
+    def GetName(self):
+        return self.name
+
+    def GetElementsByType(self, elemType):
+        if elemType == SMESH.NODE:
+            return list(range(1, len(self.points) + 1))
+        elif elemType == SMESH.VOLUME:
+            return list(range(1, len(self.cellNodes) + 1))
+        elif elemType == SMESH.FACE:
+            return self.faceIds.tolist()
+        return []
+
+    def GetNodeXYZ(self, nodeId):
+        return self.points[nodeId - 1].tolist()
+
+    def GetElemFaceNodes(self, volumeId, faceIndex):
+        if faceIndex >= len(self.faces):
+            return []
+        return self.cellNodes[volumeId - 1, self.faces[faceIndex]].tolist()
+
+    def GetElemNodes(self, elemId):
+        nrCells = len(self.cellNodes)
+        if elemId <= nrCells:
+            return self.cellNodes[elemId - 1].tolist()
+        fi = elemId - nrCells - 1
+        return self.faceNodes[self.faceOffsets[fi]:self.faceOffsets[fi + 1]].tolist()
+
+    def GetGroups(self):
+        return list(self.groups)
+
+    def GetIdsFromFilter(self, filter):
+        elemType, criterion, entity = filter
+        if criterion == SMESH.FT_FreeFaces:
+            return self.faceIds.tolist()
+        if elemType == SMESH.VOLUME:
+            if entity == self.medVolume[1]:
+                return list(range(1, len(self.cellNodes) + 1))
+            return []
+        return self.faceIds[self.faceTypes() == entity].tolist()
+
+    def faceTypes(self):
+        """Return the SMESH entity of each face"""
+        lengths = np.diff(self.faceOffsets)
+        entities = np.full(len(lengths), MEDPOLYGON[1], dtype=object)
+        for nrNodes, (medType, entity) in MEDFACES.items():
+            entities[lengths == nrNodes] = entity
+        return entities
+
+    def ExportMED(self, fileName, *args, **kwargs):
+        """Write the mesh to the MED file fileName"""
+        if h5py is None:
+            raise ImportError('h5py is needed to write MED files')
+        lengths = np.diff(self.faceOffsets)
+        faces = [self.faceNodes[s:e] for s, e in zip(self.faceOffsets[:-1], self.faceOffsets[1:])]
+        order = -1 if self.medNumbers else 1
+        with h5py.File(fileName, 'w') as f:
+            mesh = f.create_group('ENS_MAA/' + self.name)
+            coo = mesh.create_dataset('NOE/COO', data=self.points.ravel(order='F'))
+            coo.attrs['NBR'] = len(self.points)
+            if self.medNumbers:
+                mesh['NOE'].create_dataset('NUM', data=np.arange(1, len(self.points) + 1))
+
+            def write(medType, ids, nod, **indices):
+                elems = mesh.create_group('MAI/' + medType)
+                elems.create_dataset('NOD', data=nod).attrs['NBR'] = len(ids)
+                for name, index in indices.items():
+                    elems.create_dataset(name, data=index)
+                if self.medNumbers:
+                    elems.create_dataset('NUM', data=ids)
+
+            entities = self.faceTypes()
+            for nrNodes, (medType, entity) in MEDFACES.items():
+                sel = np.flatnonzero(entities == entity)[::order]
+                if len(sel):
+                    write(medType, self.faceIds[sel],
+                          np.array([faces[i] for i in sel]).ravel(order='F'))
+            sel = np.flatnonzero(entities == MEDPOLYGON[1])[::order]
+            if len(sel):
+                write(MEDPOLYGON[0], self.faceIds[sel], np.concatenate([faces[i] for i in sel]),
+                      INN=np.concatenate(([1], 1 + np.cumsum(lengths[sel]))))
+
+            ids = np.arange(1, len(self.cellNodes) + 1)[::order]
+            cells = self.cellNodes[ids - 1]
+            if self.medVolume[0] != 'POE':
+                write(self.medVolume[0], ids, cells.ravel(order='F'))
+            else:
+                cellNrFaces, faceLengths, faceNodes = syntheticMesh.cellFaces(cells, self.faces)
+                write('POE', ids, faceNodes,
+                      IFN=np.concatenate(([1], 1 + np.cumsum(faceLengths))),
+                      INN=np.concatenate(([1], 1 + np.cumsum(cellNrFaces))))
+
+    def CreateGroup(self, elemType, name):
+        group = FakeGroup(name, elemType, [])
+        self.groups.append(group)
+        return group
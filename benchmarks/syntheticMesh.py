@@ -0,0 +1,148 @@
+"""
+Synthetic meshes for benchmarking the Salome to OpenFOAM exporter.
+
+The meshes are generated with numpy as a structured block of n x n x n
+hexahedra, optionally split into tetrahedra, so they can be made large
+without Salome.
+
+blockCells makes a block of about nrCells cells of one of CELLTYPES:
+    +   tet: hexahedra split into 6 tetrahedra
+    +   hex: the hexahedra
+    + prism: hexahedra split into 2 triangular prisms
+    +  poly: polyhedra of 2 x 2 x 1 hexahedra with octagons on top and
+             bottom and hexagons on the sides
+as the points, the nodes of each cell and the faces of a cell in terms
+of its nodes, all cells of a block have the same shape.
+"""
+
+import numpy as np
+import faceMatching
+import faceStore
+
+#split of a hexahedron (nodes 0-7) into 6 tetrahedra around the diagonal 0-6
+HEXTETS = np.array([[0, 1, 2, 6], [0, 2, 3, 6], [0, 3, 7, 6],
+                    [0, 7, 4, 6], [0, 4, 5, 6], [0, 5, 1, 6]])
+
+#faces of a tetrahedron pointing out of the cell
+TETFACES = np.array([[0, 2, 1], [0, 1, 3], [1, 2, 3], [0, 3, 2]])
+
+#faces of a hexahedron pointing out of the cell
+HEXFACES = [[0, 3, 2, 1], [4, 5, 6, 7], [0, 1, 5, 4], [1, 2, 6, 5], [2, 3, 7, 6], [3, 0, 4, 7]]
+
+#split of a hexahedron into 2 prisms along the diagonal 0-2 of its bottom
+HEXPRISMS = np.array([[0, 1, 2, 4, 5, 6], [0, 2, 3, 4, 6, 7]])
+PRISMFACES = [[0, 2, 1], [3, 4, 5], [0, 1, 4, 3], [1, 2, 5, 4], [2, 0, 3, 5]]
+
+#a polyhedron of 2 x 2 x 1 hexahedra, nodes 0-7 go around its bottom
+#at these (x, y) offsets and nodes 8-15 around its top
+POLYRING = [(0, 0), (1, 0), (2, 0), (2, 1), (2, 2), (1, 2), (0, 2), (0, 1)]
+POLYFACES = [[0, 7, 6, 5, 4, 3, 2, 1], [8, 9, 10, 11, 12, 13, 14, 15],
+             [0, 8, 15, 14, 6, 7], [2, 3, 4, 12, 11, 10],
+             [0, 1, 2, 10, 9, 8], [6, 14, 13, 12, 4, 5]]
+
+CELLTYPES = ('tet', 'hex', 'prism', 'poly')
+
+
+def blockPoints(n, size=1.0):
+    """Return the (n+1)^3 points of the block"""
+    x = np.linspace(0.0, size, n + 1)
+    z, y, x = np.meshgrid(x, x, x, indexing='ij')
+    return np.column_stack((x.ravel(), y.ravel(), z.ravel()))
+
+
+def blockHexes(n):
+    """Return the (n^3, 8) node ids of the hexahedra, counting from one"""
+    i, j, k = np.meshgrid(np.arange(n), np.arange(n), np.arange(n), indexing='ij')
+    i, j, k = k.ravel(), j.ravel(), i.ravel()
+    nid = lambda i, j, k: 1 + i + (n + 1) * (j + (n + 1) * k)
+    return np.column_stack((nid(i, j, k), nid(i + 1, j, k), nid(i + 1, j + 1, k), nid(i, j + 1, k),
+                            nid(i, j, k + 1), nid(i + 1, j, k + 1), nid(i + 1, j + 1, k + 1),
+                            nid(i, j + 1, k + 1)))
+
+
+def blockTets(n):
+    """Return the (6 n^3, 4) node ids of the tetrahedra, counting from one"""
+    return blockHexes(n)[:, HEXTETS].reshape(-1, 4)
+
+
+def tetCellFaces(tets):
+    """
+    Return (cellNrFaces, faceLengths, faceNodes) of the tetrahedra,
+    the layout of meshSource.MeshSource.cellFaces.
+    """
+    faces = tets[:, TETFACES].reshape(-1, 3)
+    return (np.full(len(tets), 4, dtype=np.int64), np.full(len(faces), 3, dtype=np.int64),
+            faces.ravel())
+
+
+def tetsForCells(nrCells):
+    """Return the block size n giving about nrCells tetrahedra"""
+    return max(int(round((nrCells / 6.0) ** (1.0 / 3.0))), 1)
+
+
+def blockPrisms(n):
+    """Return the (2 n^3, 6) node ids of the prisms, counting from one"""
+    return blockHexes(n)[:, HEXPRISMS].reshape(-1, 6)
+
+
+def blockPolyhedra(m):
+    """
+    Return the points and the (m^3, 16) node ids of the polyhedra,
+    counting from one. The nodes in the middle of the octagons are
+    left out.
+    """
+    n = 2 * m
+    points = blockPoints(n)
+    i, j, k = np.meshgrid(np.arange(m), np.arange(m), np.arange(m), indexing='ij')
+    i, j, k = 2 * k.ravel(), 2 * j.ravel(), i.ravel()
+    nid = lambda i, j, k: 1 + i + (n + 1) * (j + (n + 1) * k)
+    cells = np.column_stack([nid(i + dx, j + dy, k + dz)
+                             for dz in (0, 1) for dx, dy in POLYRING])
+    used, cells = np.unique(cells, return_inverse=True)
+    return points[used - 1], cells.reshape(-1, 16) + 1
+
+
+def blockCells(cellType, nrCells):
+    """
+    Return (points, cellNodes, cellFaces) of a block of about nrCells
+    cells of cellType, cellFaces are the faces of each cell as indices
+    into its row of cellNodes.
+    """
+    if cellType == 'tet':
+        n = tetsForCells(nrCells)
+        return blockPoints(n), blockTets(n), TETFACES.tolist()
+    elif cellType == 'hex':
+        n = max(int(round(nrCells ** (1.0 / 3.0))), 1)
+        return blockPoints(n), blockHexes(n), HEXFACES
+    elif cellType == 'prism':
+        n = max(int(round((nrCells / 2.0) ** (1.0 / 3.0))), 1)
+        return blockPoints(n), blockPrisms(n), PRISMFACES
+    elif cellType == 'poly':
+        m = max(int(round(nrCells ** (1.0 / 3.0))), 1)
+        points, cells = blockPolyhedra(m)
+        return points, cells, POLYFACES
+    raise ValueError('Unknown cell type %s, use %s' % (cellType, ', '.join(CELLTYPES)))
+
+
+def cellFaces(cellNodes, faces):
+    """
+    Return (cellNrFaces, faceLengths, faceNodes) of cells which all have
+    the faces, the layout of meshSource.MeshSource.cellFaces.
+    """
+    nrCells = len(cellNodes)
+    lengths = np.array([len(f) for f in faces], dtype=np.int64)
+    return (np.full(nrCells, len(faces), dtype=np.int64), np.tile(lengths, nrCells),
+            cellNodes[:, np.concatenate(faces)].ravel())
+
+
+def boundaryFaces(cellNodes, faces):
+    """
+    Return (faceLengths, faceNodes) of the faces seen by one cell only,
+    pointing out of the mesh.
+    """
+    cellNrFaces, lengths, nodes = cellFaces(cellNodes, faces)
+    keys = faceMatching.packKeys(lengths, nodes, faceMatching.bitsPerNode(nodes.max()))
+    order, groupId = faceMatching.groupRows(keys)
+    single = np.bincount(groupId)[groupId] == 1
+    store = faceStore.FaceStore(lengths, nodes).take(np.sort(order[single]))
+    return store.lengths(), store.nodes
@@ -0,0 +1,134 @@
+"""
+Boundary face classification for the Salome to OpenFOAM exporter.
+
+Before the cells are walked the face groups are sorted into patches:
+    + a group with a face that is not a free face lies inside the mesh.
+      It's a baffle and each of its faces is added twice, the second
+      copy is owned by the cell on the other side.
+    + the free faces that are in no group are unassigned, they go to
+      a new patch called defaultPatches.
+Group membership is tested with np.isin on the face ids and faces are
+compared by their packed keys, see faceMatching, instead of probing
+face by face. The nodes of all group faces are fetched in one call and
+those of the free faces only if they are in no group.
+"""
+
+import time
+import numpy as np
+import faceMatching
+import meshSource
+from faceStore import FaceStore
+
+DEFAULTPATCH = 'defaultPatches'
+
+
+def defaultPatchName(names):
+    """Return defaultPatches, or defaultPatches_N if the name is taken"""
+    name = DEFAULTPATCH
+    nri = 1
+    while name in names:
+        name = '%s_%d' % (DEFAULTPATCH, nri)
+        nri += 1
+    return name
+
+
+def classifyBoundaryFaces(source, bits=None):
+    """
+    Classify the boundary faces of a mesh.
+
+    args:
+        + source: a meshSource.MeshSource
+        +   bits: bits per node in the face keys, from the largest node if None
+
+    returns a dict with
+        +    patches: list of (name, face ids), the face groups followed by
+                      the default patch if there are unassigned faces
+        +    baffles: names of the groups that are baffles
+        + unassigned: ids of the free faces in no group
+        +      faces: FaceStore with one face per boundary slot, the faces
+                      of each patch followed by their copies for baffles
+        +    partner: the slot of the copy of each slot, -1 if there is none
+                      and -2 for the copies, see faceMatching.matchFaces
+        +      slots: (first slot, number of slots) of each patch
+        +    timings: seconds spent fetching, on baffles and unassigned faces
+    """
+    timings = dict()
+    start = time.time()
+    groups = [(name, np.asarray(ids, dtype=np.int64))
+              for name, grType, ids in source.groups() if grType == meshSource.FACE]
+    groupSizes = np.array([len(ids) for name, ids in groups], dtype=np.int64)
+    groupIds = np.concatenate([ids for name, ids in groups] + [np.zeros(0, dtype=np.int64)])
+    freeFaces = source.freeFaces()
+    #free faces in no group, by increasing id
+    extFaces = np.unique(np.asarray(freeFaces, dtype=np.int64))
+    candidates = extFaces[~np.isin(extFaces, groupIds)]
+    lengths, nodes = source.elemNodes(np.concatenate((groupIds, candidates)).tolist())
+    allFaces = FaceStore(lengths, nodes)
+    timings['fetch'] = time.time() - start
+
+    start = time.time()
+    if bits is None:
+        nodeIds = source.nodes()[0]
+        bits = faceMatching.bitsPerNode(nodeIds.max() if len(nodeIds) else 0)
+    keys = faceMatching.packKeys(lengths, nodes, bits)
+    nrGroupFaces = len(groupIds)
+    groupKeys = keys[:nrGroupFaces]
+
+    #a face may only be in one group
+    order, groupId = faceMatching.groupRows(groupKeys)
+    repeated = order[1:][groupId[1:] == groupId[:-1]]
+    if len(repeated):
+        first = int(repeated.min())
+        group = int(np.searchsorted(np.cumsum(groupSizes), first, side='right'))
+        raise Exception(\
+            'Error the face, elemId %d, %s belongs to two ' % (groupIds[first], allFaces.face(first)) +\
+                'or more groups. One is : %s' % (groups[group][0]))
+
+    inFree = np.isin(groupIds, freeFaces)
+    groupStarts = np.cumsum(groupSizes) - groupSizes
+    baffle = [not inFree[s:s + n].all() for s, n in zip(groupStarts.tolist(), groupSizes.tolist())]
+    timings['baffles'] = time.time() - start
+
+    start = time.time()
+    #the free faces in no group, unless a group has the same face
+    candidateKeys = keys[nrGroupFaces:]
+    new = np.flatnonzero(~np.isin(faceMatching.rowView(candidateKeys),
+                                  faceMatching.rowView(groupKeys)))
+    first = np.unique(faceMatching.rowView(candidateKeys[new]), return_index=True)[1]
+    new = new[np.sort(first)]
+    unassigned = candidates[new]
+    timings['unassigned'] = time.time() - start
+
+    #the boundary slots, baffle groups get a second copy of their faces
+    patches = list()
+    slots = list()
+    slotFaces = list()
+    partner = list()
+    nrSlots = 0
+    for (name, ids), s, n, isBaf in zip(groups, groupStarts.tolist(), groupSizes.tolist(), baffle):
+        patches.append((name, ids))
+        faceIndex = np.arange(s, s + n)
+        slotFaces.append(faceIndex)
+        if isBaf:
+            slotFaces.append(faceIndex)
+            partner.append(nrSlots + n + np.arange(n))
+            partner.append(np.full(n, -2, dtype=np.int64))
+            slots.append((nrSlots, 2 * n))
+        else:
+            partner.append(np.full(n, -1, dtype=np.int64))
+            slots.append((nrSlots, n))
+        nrSlots += slots[-1][1]
+    if len(unassigned) > 0:
+        patches.append((defaultPatchName([name for name, ids in groups]), unassigned))
+        slotFaces.append(nrGroupFaces + new)
+        partner.append(np.full(len(new), -1, dtype=np.int64))
+        slots.append((nrSlots, len(new)))
+
+    empty = [np.zeros(0, dtype=np.int64)]
+    return dict(patches=patches,
+                baffles=[name for (name, ids), isBaf in zip(groups, baffle) if isBaf],
+                unassigned=unassigned,
+                faces=allFaces.take(np.concatenate(slotFaces + empty)),
+                partner=np.concatenate(partner + empty),
+                slots=slots,
+                timings=timings)
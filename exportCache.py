@@ -0,0 +1,164 @@
+"""
+Incremental re-export for the Salome to OpenFOAM exporter.
+
+With exportToFoam(..., incremental=True) the state of the export is kept
+in <dirname>.exportState.npz next to the polyMesh directory:
+    + a fingerprint of the mesh, see meshSource.MeshSource.fingerprint
+    + the boundary faces as matched to the cells, with their owner and
+      whether they are the reversed copy of a baffle face
+    + the byte positions where the boundary faces start in the files
+      faces and owner
+When the mesh is exported again and only the groups changed, the
+boundary faces are looked up in the state instead of walking all
+cells. The internal faces don't change, so only the boundary part of
+faces and owner is rewritten in place, together with the files boundary
+and cellZones. points and neighbour are left as they are.
+The files written are the same as those of a full export.
+"""
+
+import os
+import numpy as np
+import faceMatching
+import foamWriter
+from faceStore import FaceStore
+
+VERSION = 1
+
+
+def statePath(dirname):
+    """Return the file the state of the export in dirname is kept in"""
+    return os.path.abspath(dirname) + '.exportState.npz'
+
+
+def saveState(dirname, fingerprint, options, meshSize, nrCellFaces, nrIntNodes, bcFaces,
+              bcOwner, bcCopy, cellIds, facesPosition, ownerPosition):
+    """
+    Save the state of an export.
+
+    args:
+        + fingerprint: the fingerprint of the mesh
+        +     options: the export options changing the files, e.g. the format
+        +    meshSize: (nrPoints, nrCells, nrFaces, nrIntFaces)
+        + nrCellFaces: the number of faces of all cells together
+        +  nrIntNodes: the number of nodes of all internal faces together
+        +     bcFaces: FaceStore of the boundary faces in slot order,
+                       oriented and counting from one
+        +     bcOwner: owner of each boundary face
+        +      bcCopy: True for the reversed copies of baffle faces
+        +     cellIds: OpenFOAM cell id of each volume
+        + facesPosition: byte positions from foamWriter.writeFaces
+        + ownerPosition: byte position from foamWriter.writeLabels
+    """
+    path = statePath(dirname)
+    tmpPath = path + '.tmp'
+    with open(tmpPath, 'wb') as file:
+        np.savez(file, version=VERSION, fingerprint=str(fingerprint), options=repr(options),
+                 meshSize=np.asarray(meshSize, dtype=np.int64), nrCellFaces=nrCellFaces,
+                 nrIntNodes=nrIntNodes,
+                 bcLengths=bcFaces.lengths(), bcNodes=bcFaces.nodes,
+                 bcOwner=np.asarray(bcOwner, dtype=np.int64),
+                 bcCopy=np.asarray(bcCopy, dtype=bool),
+                 cellIds=np.asarray(cellIds, dtype=np.int64),
+                 facesPosition=np.asarray(facesPosition, dtype=np.int64),
+                 ownerPosition=ownerPosition,
+                 fileSizes=fileSizes(dirname))
+    os.replace(tmpPath, path)
+
+
+def fileSizes(dirname):
+    """Return the sizes of the files faces and owner, -1 if missing"""
+    sizes = list()
+    for name in ('faces', 'owner'):
+        path = os.path.join(dirname, name)
+        sizes.append(os.path.getsize(path) if os.path.exists(path) else -1)
+    return np.asarray(sizes, dtype=np.int64)
+
+
+def loadState(dirname, fingerprint, options):
+    """
+    Return the saved state of the export in dirname as a dict, None if
+    there is none or if the mesh, the options or the files differ.
+    """
+    path = statePath(dirname)
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            state = dict((key, data[key]) for key in data.files)
+    except (IOError, ValueError, KeyError):
+        return None
+    if int(state['version']) != VERSION or str(state['fingerprint']) != str(fingerprint) or \
+            str(state['options']) != repr(options) or \
+            not np.array_equal(state['fileSizes'], fileSizes(dirname)):
+        return None
+    return state
+
+
+def matchBoundary(state, bcFaces, bcPartner, bits):
+    """
+    Look up the boundary face slots in the state.
+
+    args:
+        +   bcFaces: FaceStore, one face per boundary slot
+        + bcPartner: as for faceMatching.matchFaces, -2 for baffle copies
+        +      bits: bits per node in the keys
+
+    returns (faces, owner) of the slots, faces oriented as in the cells,
+    or None if the boundary faces are not the ones in the state.
+    """
+    cached = FaceStore(state['bcLengths'], state['bcNodes'])
+    if len(cached) != len(bcFaces):
+        return None
+    if len(cached) == 0:
+        return cached, state['bcOwner']
+    width = int(max(cached.lengths().max(), bcFaces.lengths().max()))
+    rows = list()
+    for faces, copy in ((bcFaces, np.asarray(bcPartner) == -2), (cached, state['bcCopy'])):
+        keys = faceMatching.packKeys(faces.lengths(), faces.nodes, bits, width)
+        rows.append(np.column_stack((keys, copy)))
+    newOrder = faceMatching.groupRows(rows[0])[0]
+    oldOrder = faceMatching.groupRows(rows[1])[0]
+    if not np.array_equal(rows[0][newOrder], rows[1][oldOrder]):
+        return None
+    slotFace = np.empty(len(cached), dtype=np.int64)
+    slotFace[newOrder] = oldOrder
+    return cached.take(slotFace), state['bcOwner'][slotFace]
+
+
+def rewriteBoundary(dirname, state, faces, owner, format='ascii', labelSize=32,
+                    chunkSize=foamWriter.CHUNKSIZE):
+    """
+    Rewrite the boundary faces in the files faces and owner of dirname.
+
+    args:
+        + faces: FaceStore of the boundary faces, counting from zero
+        + owner: owner of the boundary faces
+    The number of boundary faces and their nodes are the same as when
+    the files were written, so the files keep their size.
+    """
+    nrIntFaces = int(state['meshSize'][3])
+    facesPath = os.path.join(dirname, 'faces')
+    ownerPath = os.path.join(dirname, 'owner')
+    if format == 'binary':
+        labelBytes = foamWriter.labelType(labelSize).itemsize
+        offsetsStart, nodesStart = state['facesPosition'].tolist()
+        nrIntNodes = int(state['nrIntNodes'])
+        offsets = nrIntNodes + np.cumsum(faces.lengths())
+        for path, position, values in (
+                (facesPath, offsetsStart + (nrIntFaces + 1) * labelBytes, offsets),
+                (facesPath, nodesStart + nrIntNodes * labelBytes, faces.nodes),
+                (ownerPath, int(state['ownerPosition']) + nrIntFaces * labelBytes, owner)):
+            values = np.ascontiguousarray(values, dtype=foamWriter.labelType(labelSize))
+            with open(path, 'r+b') as file:
+                file.seek(position)
+                file.write(memoryview(values).cast('B'))
+    else:
+        os.truncate(facesPath, int(state['facesPosition'][0]))
+        with open(facesPath, 'a') as file:
+            foamWriter.writeAsciiFaceLines(file, faces.lengths(), faces.nodes, chunkSize)
+            file.write(')\n')
+        os.truncate(ownerPath, int(state['ownerPosition']))
+        with open(ownerPath, 'a') as file:
+            foamWriter.writeAsciiLines(file, ' %d \n', np.asarray(owner, dtype=np.int64),
+                                       chunkSize)
+            file.write(')\n')
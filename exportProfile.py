@@ -0,0 +1,98 @@
+"""
+Stage timings of the Salome to OpenFOAM exporter.
+
+exportToFoam splits its work into stages, e.g. fetch, boundary,
+matching, ordering and write, and records for each of them
+    +          wall: seconds from start to stop
+    +           cpu: cpu seconds of the process, all threads
+    +    peakMemory: peak resident memory of the process in bytes when the
+                     stage stopped, None where it is not available
+    +         items: the number of things handled, e.g. cells or faces
+    + itemsPerSecond: items / wall
+    +    smeshCalls: number of calls of each SMESH method in the stage
+Stages may overlap, e.g. the quality check runs while the files are
+written. When the export is done the whole record is written as JSON
+and a last stage called total covers all of it. A callback gets every
+stage record as it stops, e.g. to feed a regression dashboard.
+"""
+
+import collections
+import json
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None #windows
+
+
+def peakMemory():
+    """Return the peak resident memory of the process in bytes, or None"""
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    #kilobytes on linux, bytes on macOS
+    return int(maxrss if sys.platform == 'darwin' else maxrss * 1024)
+
+
+class ExportProfile(object):
+    """
+    Timings of the stages of one export.
+
+    args:
+        +    calls: collections.Counter of the SMESH calls, see
+                    meshSource.MeshSource.calls, or None
+        + callback: called with each stage record when it stops
+    """
+
+    def __init__(self, calls=None, callback=None):
+        self.calls = calls if calls is not None else collections.Counter()
+        self.callback = callback
+        self.stages = list()
+        self.running = dict()
+        self.info = dict()
+        self.start('total')
+
+    def start(self, name):
+        """Start the stage name"""
+        self.running[name] = (time.perf_counter(), time.process_time(),
+                              collections.Counter(self.calls))
+
+    def stop(self, name, items=None):
+        """Stop the stage name and return its record"""
+        wall, cpu, calls = self.running.pop(name)
+        wall = time.perf_counter() - wall
+        record = dict(name=name, wall=wall, cpu=time.process_time() - cpu,
+                      peakMemory=peakMemory(),
+                      smeshCalls=dict(collections.Counter(self.calls) - calls))
+        if items is not None:
+            record['items'] = int(items)
+            record['itemsPerSecond'] = items / wall if wall > 0 else None
+        self.stages.append(record)
+        if self.callback is not None:
+            self.callback(record)
+        return record
+
+    def call(self, name, items, function, *args):
+        """Run function(*args) as the stage name, e.g. in a thread"""
+        self.start(name)
+        try:
+            return function(*args)
+        finally:
+            self.stop(name, items)
+
+    def finish(self, items=None):
+        """Stop the total and any running stages, return the whole record"""
+        for name in [n for n in self.running if n != 'total']:
+            self.stop(name)
+        total = self.stop('total', items)
+        record = dict(self.info)
+        record.update(stages=self.stages[:-1], total=total)
+        return record
+
+
+def writeRecord(record, path):
+    """Write the record of an export as JSON to path"""
+    with open(path, 'w') as file:
+        json.dump(record, file, indent=2)
@@ -0,0 +1,308 @@
+"""
+Vectorized face matching for the Salome to OpenFOAM exporter.
+
+Instead of building a tuple key per face and probing dictionaries
+face by face, the sorted node ids of all cell faces are packed into an
+integer array. The rows are sorted once with numpy and identical rows
+(the same face seen from two cells or from a boundary group) end up
+next to each other, from which owner, neighbour and boundary
+membership are derived in bulk.
+
+A key packs the sorted node ids with bits = bitsPerNode(max node id)
+bits each, as many as fit in 63 bits per int64 word. A triangle of a
+mesh with less than 2M nodes is one word and a quad two, polygons take
+as many words as needed. Node ids start at one, so the zero padding of
+faces with fewer nodes never collides with a node.
+
+The result is identical to the dictionary based loop in
+salomeToOpenFOAMPython3.exportToFoam:
+    + internal faces are numbered in the order they are first seen,
+      with the node order of the first (owner) cell.
+    + the neighbour of an internal face is the last other cell seeing it.
+    + boundary faces keep their slot, but take the node order of the
+      cell owning them. The second copy of a baffle face is owned by
+      the second cell seeing it.
+"""
+
+import numpy as np
+
+KEYCHUNK = 65536 #number of faces packed at a time
+
+
+def sortedKeys(lengths, nodes, width=None):
+    """
+    Build the padded array of face keys.
+
+    Each row holds the sorted node ids of one face, padded with -1 so
+    faces with a different number of nodes never compare equal.
+    """
+    if width is None:
+        width = int(lengths.max()) if len(lengths) else 0
+    keys = np.full((len(lengths), width), -1, dtype=np.int64)
+    starts = np.cumsum(lengths) - lengths
+    rows = np.repeat(np.arange(len(lengths)), lengths)
+    cols = np.arange(len(nodes)) - np.repeat(starts, lengths)
+    keys[rows, cols] = nodes
+    keys.sort(axis=1)
+    return keys
+
+
+def bitsPerNode(maxNodeId):
+    """Return the number of bits needed for a node id in a key"""
+    return max(int(maxNodeId).bit_length(), 1)
+
+
+def packKey(fnodes, bits):
+    """Pack the sorted nodes of one face into a python int"""
+    key = 0
+    for n in sorted(fnodes):
+        key = (key << bits) | n
+    return key
+
+
+def packKeys(lengths, nodes, bits, width=None):
+    """
+    Pack the sorted nodes of each face into an (n, words) int64 array.
+    The faces are packed KEYCHUNK at a time to keep the memory down.
+    """
+    if width is None:
+        width = int(lengths.max()) if len(lengths) else 0
+    nodesPerWord = max(63 // bits, 1)
+    words = max(-(-width // nodesPerWord), 1)
+    width = words * nodesPerWord
+    shifts = np.arange(nodesPerWord - 1, -1, -1, dtype=np.int64) * bits
+    packed = np.empty((len(lengths), words), dtype=np.int64)
+    ends = np.cumsum(lengths)
+    for start in range(0, len(lengths), KEYCHUNK):
+        stop = min(start + KEYCHUNK, len(lengths))
+        first = ends[start] - lengths[start]
+        keys = sortedKeys(lengths[start:stop], nodes[first:ends[stop - 1]], width)
+        keys[keys < 0] = 0
+        keys <<= np.tile(shifts, words)
+        packed[start:stop] = np.bitwise_or.reduce(
+            keys.reshape(stop - start, words, nodesPerWord), axis=2)
+    return packed
+
+
+def groupRows(keys):
+    """
+    Sort the rows of keys and group identical rows.
+
+    Returns (order, groupId) where order is a stable row ordering with
+    identical rows next to each other and groupId[i] is the group of
+    row order[i].
+    """
+    if len(keys) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    if keys.shape[1] == 1:
+        order = np.argsort(keys[:, 0], kind='stable')
+    else:
+        order = np.lexsort(keys.T[::-1])
+    sortedKeys = keys[order]
+    newGroup = np.empty(len(keys), dtype=bool)
+    newGroup[0] = True
+    newGroup[1:] = np.any(sortedKeys[1:] != sortedKeys[:-1], axis=1)
+    groupId = np.cumsum(newGroup) - 1
+    return order, groupId
+
+
+def matchFaces(cellFaces, faceCells, bcFaces, bcPartner, nrIntFaces, bits=None, nrProcs=1):
+    """
+    Find owner and neighbour of all faces.
+
+    args:
+        +  cellFaces: FaceStore, all faces of all cells in cell order
+        +  faceCells: the OpenFOAM cell id of each entry in cellFaces
+        +    bcFaces: FaceStore, one face per boundary face slot
+        +  bcPartner: for each boundary slot the slot of its reversed baffle
+                      copy, -1 if there is none. Reversed copies themselves
+                      are marked with -2 and never match a cell face directly.
+        + nrIntFaces: the number of internal faces
+        +       bits: bits per node in the keys, from the largest node if None
+        +    nrProcs: number of processes, see matchPartitions
+
+    returns (faces, owner, neighbour) where faces is a FaceStore with the
+    internal faces followed by the boundary faces.
+    """
+    nrCellFaces = len(cellFaces)
+    nrBcFaces = len(bcFaces)
+    bcPartner = np.asarray(bcPartner, dtype=np.int64).reshape(-1)
+    faceCells = np.asarray(faceCells, dtype=np.int64).reshape(-1)
+
+    cellLengths, cellNodes = cellFaces.lengths(), cellFaces.nodes
+    bcLengths, bcNodes = bcFaces.lengths(), bcFaces.nodes
+    width = int(max(cellLengths.max() if nrCellFaces else 0,
+                    bcLengths.max() if nrBcFaces else 0))
+    if bits is None:
+        bits = bitsPerNode(max(cellNodes.max() if len(cellNodes) else 0,
+                               bcNodes.max() if len(bcNodes) else 0))
+
+    #only the not reversed boundary slots are matched against the cells
+    bcSlots = np.flatnonzero(bcPartner != -2)
+    bcMatched = bcFaces.take(bcSlots)
+    bcKeys = packKeys(bcMatched.lengths(), bcMatched.nodes, bits, width)
+    del bcMatched
+
+    if nrProcs > 1 and nrCellFaces > 1:
+        pairFirst, pairNext, restCfi, restKeys = matchPartitions(
+            cellFaces, bcKeys, bits, width, nrProcs)
+    else:
+        pairFirst = pairNext = np.zeros(0, dtype=np.int64)
+        restCfi = np.arange(nrCellFaces)
+        restKeys = packKeys(cellLengths, cellNodes, bits, width)
+    intFirst, intNext, bcSource = _matchRows(bcKeys, bcSlots, bcPartner, nrBcFaces,
+                                             restKeys, restCfi)
+    del restKeys
+
+    #internal faces are numbered in the order they are first seen
+    firstCfi = np.concatenate((pairFirst, intFirst))
+    nextCfi = np.concatenate((pairNext, intNext))
+    order = np.argsort(firstCfi, kind='stable')
+    firstCfi = firstCfi[order]
+    nextCfi = nextCfi[order]
+    nrFound = len(firstCfi)
+    if nrFound > nrIntFaces:
+        raise Exception('Error found %d internal faces but expected %d. ' % (nrFound, nrIntFaces) +\
+                            'Is the mesh conformal?')
+
+    owner = np.full(nrIntFaces + nrBcFaces, -1, dtype=np.int64)
+    owner[:nrFound] = faceCells[firstCfi]
+    owner[nrIntFaces:] = np.where(bcSource >= 0, faceCells[np.maximum(bcSource, 0)], -1)
+    neighbour = np.full(nrIntFaces, -1, dtype=np.int64)
+    neighbour[:nrFound] = np.where(nextCfi >= 0, faceCells[np.maximum(nextCfi, 0)], -1)
+
+    #boundary faces take the nodes of the owner cell, those not owned
+    #by a cell keep the nodes of the group
+    owned = np.flatnonzero(bcSource >= 0)
+    slots = np.arange(nrBcFaces)
+    slots[owned] = nrBcFaces + np.arange(len(owned))
+    bcFaces = bcFaces.concatenate(cellFaces.take(bcSource[owned])).take(slots)
+    faces = cellFaces.take(firstCfi).concatenate(bcFaces)
+
+    return faces, owner, neighbour
+
+
+def _matchRows(bcKeys, bcSlots, bcPartner, nrBcFaces, keys, cfi):
+    """
+    Match cell faces against each other and the boundary slots.
+
+    args:
+        +    bcKeys: keys of the boundary slots bcSlots
+        +      keys: keys of the cell faces, cfi their cell face index in
+                     increasing order
+
+    returns (firstCfi, nextCfi, bcSource): the first and last other cell
+    face of each internal face (-1 if there's none), and the cell face
+    owning each boundary slot (-1 if there's none).
+    """
+    #the boundary slots are stacked before the cell faces so that the
+    #stable sort puts them first in their group
+    nrBcRows = len(bcKeys)
+    order, groupId = groupRows(np.vstack((bcKeys, keys)))
+
+    #first row of each group and whether it's a boundary slot
+    groupStart = np.flatnonzero(np.r_[True, groupId[1:] != groupId[:-1]]) \
+        if len(groupId) else np.zeros(0, dtype=np.int64)
+    isBcRow = order < nrBcRows
+    if np.any(isBcRow[1:] & (groupId[1:] == groupId[:-1])):
+        raise Exception('Error a face belongs to two or more groups.')
+    groupBcSlot = np.full(len(groupStart), -1, dtype=np.int64)
+    bcStart = groupStart[isBcRow[groupStart]]
+    groupBcSlot[groupId[bcStart]] = bcSlots[order[bcStart]]
+
+    #rank of each cell face among the cell faces of its group
+    rank = np.arange(len(order)) - groupStart[groupId]
+    bcSlot = groupBcSlot[groupId]
+    rank -= (bcSlot >= 0)
+    cellRow = ~isBcRow
+    rowCfi = cfi[order[cellRow] - nrBcRows]
+    rank = rank[cellRow]
+    bcSlot = bcSlot[cellRow]
+    partner = np.full(len(bcSlot), -1, dtype=np.int64)
+    partner[bcSlot >= 0] = bcPartner[bcSlot[bcSlot >= 0]]
+    grp = groupId[cellRow]
+
+    bcSource = np.full(nrBcFaces, -1, dtype=np.int64)
+    #the first cell seeing a boundary face owns it
+    sel = (bcSlot >= 0) & (rank == 0)
+    bcSource[bcSlot[sel]] = rowCfi[sel]
+    #following cells own the reversed copy of a baffle, last one wins
+    sel = (bcSlot >= 0) & (rank > 0) & (partner >= 0)
+    last = _lastPerKey(bcSlot[sel], rowCfi[sel])
+    bcSource[partner[sel][last]] = rowCfi[sel][last]
+
+    #remaining faces are internal, a boundary face seen again without a
+    #reversed copy becomes an internal face as well
+    intRank = np.where(bcSlot >= 0, rank - 1, rank)
+    isInt = (intRank >= 0) & ~((bcSlot >= 0) & (partner >= 0))
+    first = isInt & (intRank == 0)
+    nextByGroup = np.full(len(groupStart), -1, dtype=np.int64)
+    sel = isInt & (intRank > 0)
+    last = _lastPerKey(grp[sel], rowCfi[sel])
+    nextByGroup[grp[sel][last]] = rowCfi[sel][last]
+
+    return rowCfi[first], nextByGroup[grp[first]], bcSource
+
+
+def matchPartitions(cellFaces, bcKeys, bits, width, nrProcs):
+    """
+    Match the cell faces in nrProcs partitions in a process pool.
+
+    Each process packs the keys of its part of the cell faces and pairs
+    the faces seen exactly twice within the part which aren't boundary
+    faces. The rest, i.e. faces shared with other parts, boundary and
+    baffle faces, is returned with its keys to be matched globally by
+    _matchRows. For a conformal mesh the result equals the serial one.
+
+    returns (pairFirst, pairNext, restCfi, restKeys)
+    """
+    import multiprocessing
+
+    nrCellFaces = len(cellFaces)
+    bounds = np.linspace(0, nrCellFaces, nrProcs + 1).astype(np.int64)
+    tasks = list()
+    for start, stop in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+        if stop > start:
+            part = cellFaces.take(np.arange(start, stop))
+            tasks.append((part.lengths(), part.nodes, start, bcKeys, bits, width))
+    pool = multiprocessing.Pool(min(nrProcs, len(tasks)))
+    try:
+        results = pool.map(_matchPartition, tasks)
+    finally:
+        pool.close()
+        pool.join()
+    return tuple(np.concatenate(r) for r in zip(*results))
+
+
+def _matchPartition(task):
+    """Match one partition, run in a worker process by matchPartitions"""
+    lengths, nodes, start, bcKeys, bits, width = task
+    keys = packKeys(lengths, nodes, bits, width)
+    cfi = start + np.arange(len(lengths))
+    candidate = np.ones(len(keys), dtype=bool)
+    if len(bcKeys):
+        candidate = ~np.isin(rowView(keys), rowView(bcKeys))
+    rows = np.flatnonzero(candidate)
+    order, groupId = groupRows(keys[rows])
+    counts = np.bincount(groupId)
+    paired = counts[groupId] == 2
+    #rows of a group are in increasing order, the first one owns the face
+    pairRows = rows[order[paired]].reshape(-1, 2)
+    rest = np.ones(len(keys), dtype=bool)
+    rest[pairRows.ravel()] = False
+    return cfi[pairRows[:, 0]], cfi[pairRows[:, 1]], cfi[rest], keys[rest]
+
+
+def rowView(keys):
+    """View each row of keys as one item, for np.isin"""
+    keys = np.ascontiguousarray(keys)
+    return keys.view(np.dtype((np.void, keys.dtype.itemsize * keys.shape[1]))).ravel()
+
+
+def _lastPerKey(key, value):
+    """Indices of the largest value for each distinct key"""
+    if len(key) == 0:
+        return np.zeros(0, dtype=np.int64)
+    order = np.lexsort((value, key))
+    isLast = np.r_[key[order][1:] != key[order][:-1], True]
+    return order[isLast]
@@ -0,0 +1,111 @@
+"""
+Compact storage of faces for the Salome to OpenFOAM exporter.
+
+Like OpenFOAM's faceCompactList, a FaceStore keeps all faces in two flat
+arrays: offsets, where face i is nodes[offsets[i]:offsets[i + 1]], and
+nodes. A CellFaceStore adds the same kind of offsets from cells to their
+faces. This replaces a python object per volume holding lists of lists,
+which needs several times the memory on large meshes.
+"""
+
+import itertools
+import numpy as np
+
+
+def compactType(maxValue):
+    """Return the smallest integer type used to store values up to maxValue"""
+    if maxValue < np.iinfo(np.int32).max:
+        return np.int32
+    return np.int64
+
+
+class FaceStore(object):
+    """
+    Faces stored as offsets and flat node ids.
+    """
+    __slots__ = ('offsets', 'nodes')
+
+    def __init__(self, lengths, nodes):
+        lengths = np.asarray(lengths, dtype=np.int64)
+        nodes = np.asarray(nodes)
+        self.offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=self.offsets[1:])
+        self.nodes = nodes.astype(compactType(nodes.max() if len(nodes) else 0), copy=False)
+
+    @staticmethod
+    def fromList(faces):
+        """Build a FaceStore from a list of node lists"""
+        lengths = np.fromiter(map(len, faces), dtype=np.int64, count=len(faces))
+        nodes = np.fromiter(itertools.chain.from_iterable(faces), dtype=np.int64,
+                            count=int(lengths.sum()))
+        return FaceStore(lengths, nodes)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def lengths(self):
+        """Return the number of nodes of each face"""
+        return np.diff(self.offsets)
+
+    def face(self, i):
+        """Return the nodes of face i as a list"""
+        return self.nodes[self.offsets[i]:self.offsets[i + 1]].tolist()
+
+    def tolist(self):
+        """Return all faces as a list of node lists"""
+        nodes = self.nodes.tolist()
+        offsets = self.offsets.tolist()
+        return [nodes[s:e] for s, e in zip(offsets[:-1], offsets[1:])]
+
+    def take(self, indices):
+        """Return a FaceStore with the faces indices, in that order"""
+        indices = np.asarray(indices, dtype=np.int64)
+        lengths = self.lengths()[indices]
+        newStarts = np.cumsum(lengths) - lengths
+        pos = np.repeat(self.offsets[indices] - newStarts, lengths) + \
+            np.arange(int(lengths.sum()), dtype=np.int64)
+        return FaceStore(lengths, self.nodes[pos])
+
+    def flip(self, indices):
+        """
+        Return a FaceStore with the faces indices reversed, keeping
+        the first node like OpenFOAM's face::reverseFace.
+        """
+        lengths = self.lengths()
+        flipped = np.zeros(len(self), dtype=bool)
+        flipped[np.asarray(indices, dtype=np.int64)] = True
+        starts = np.repeat(self.offsets[:-1], lengths)
+        k = np.arange(len(self.nodes), dtype=np.int64) - starts
+        rev = np.repeat(flipped, lengths) & (k > 0)
+        k[rev] = np.repeat(lengths, lengths)[rev] - k[rev]
+        return FaceStore(lengths, self.nodes[starts + k])
+
+    def concatenate(self, other):
+        """Return the faces of self followed by the faces of other"""
+        return FaceStore(np.concatenate((self.lengths(), other.lengths())),
+                         np.concatenate((self.nodes.astype(np.int64), other.nodes.astype(np.int64))))
+
+
+class CellFaceStore(object):
+    """
+    The faces of all cells, the faces of cell i are
+    faces[cellOffsets[i]:cellOffsets[i + 1]].
+    """
+    __slots__ = ('cellOffsets', 'faces')
+
+    def __init__(self, cellNrFaces, faces):
+        self.cellOffsets = np.zeros(len(cellNrFaces) + 1, dtype=np.int64)
+        np.cumsum(cellNrFaces, out=self.cellOffsets[1:])
+        self.faces = faces
+
+    def __len__(self):
+        return len(self.cellOffsets) - 1
+
+    def nrFaces(self):
+        """Return the number of faces of each cell"""
+        return np.diff(self.cellOffsets)
+
+    def faceCells(self):
+        """Return the cell of each face"""
+        nrFaces = self.nrFaces()
+        return np.repeat(np.arange(len(nrFaces), dtype=compactType(len(nrFaces))), nrFaces)
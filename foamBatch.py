@@ -0,0 +1,222 @@
+"""
+Batch export of Salome meshes to OpenFOAM without the GUI.
+
+Converts the meshes in MED (.med), UNV (.unv) and Salome study (.hdf)
+files, each mesh to its own case directory
+    <outdir>/<file name>/constant/polyMesh
+or <outdir>/<file name>_<mesh name>/constant/polyMesh if the file has
+several meshes. Files with the same name get the extension and then
+the name of their directory added, e.g. run_med and run_unv or
+a_run_med and b_run_med, so no two files write to the same case. The
+files are spread over a pool of worker processes, each loads its file
+in its own Salome instance as the mesh objects can't be handed between
+processes.
+
+Run it with the python of Salome, e.g.
+    salome shell -- python foamBatch.py -o cases -j 4 a.med b.med study.hdf
+The options of exportToFoam can be given, see --help. The exit status
+is 1 if any mesh failed.
+
+MED files are read with h5py, see meshSource.MedMeshSource, if it is
+installed. They then don't need Salome at all:
+    python foamBatch.py -o cases -j 8 *.med
+"""
+
+import argparse
+import collections
+import concurrent.futures
+import os, sys, time, traceback
+
+try:
+    import salome
+    import SMESH
+    from salome.smesh import smeshBuilder
+except ImportError:
+    salome = None
+import meshSource
+import salomeToOpenFOAMPython3 as exporter
+
+EXTENSIONS = ('.med', '.unv', '.hdf')
+
+_smesh = None
+
+
+def initSalome():
+    """Start Salome in this process without a session, once"""
+    global _smesh
+    if _smesh is None:
+        try:
+            salome.salome_init_without_session()
+        except AttributeError:
+            salome.salome_init()
+        _smesh = smeshBuilder.New()
+    return _smesh
+
+
+def needsSalome(path):
+    """Return True if path can only be read by Salome"""
+    return not (path.lower().endswith('.med') and meshSource.h5py is not None)
+
+
+def loadMeshes(path):
+    """Return the meshes in a med, unv or hdf file"""
+    if not needsSalome(path):
+        return [meshSource.MedMeshSource(path, name) for name in meshSource.medMeshNames(path)]
+    smesh = initSalome()
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.med':
+        meshes, status = smesh.CreateMeshesFromMED(path)
+        return meshes
+    elif ext == '.unv':
+        return [smesh.CreateMeshesFromUNV(path)]
+    elif ext == '.hdf':
+        salome.myStudy.Open(path)
+        component = salome.myStudy.FindComponent('SMESH')
+        meshes = list()
+        if component is None:
+            return meshes
+        it = salome.myStudy.NewChildIterator(component)
+        it.InitEx(True)
+        while it.More():
+            obj = it.Value().GetObject()
+            if isinstance(obj, SMESH._objref_SMESH_Mesh):
+                meshes.append(smesh.Mesh(obj))
+            it.Next()
+        return meshes
+    raise ValueError('Unknown file type %s, use %s' % (path, ', '.join(EXTENSIONS)))
+
+
+def casePrefixes(paths):
+    """
+    Return the case name of each file by path, the file name without
+    the extension, with the extension and then with the name of the
+    directory too where that isn't unique. Raises ValueError if
+    names remain the same.
+    """
+    def stem(path):
+        return os.path.splitext(os.path.basename(path))[0]
+
+    def withExtension(path):
+        base, ext = os.path.splitext(os.path.basename(path))
+        return '%s_%s' % (base, ext[1:].lower()) if ext else base
+
+    def withDirectory(path):
+        return '%s_%s' % (os.path.basename(os.path.dirname(path)), withExtension(path))
+
+    prefixes = dict((path, stem(path)) for path in paths)
+    for name in (withExtension, withDirectory):
+        counts = collections.Counter(prefixes.values())
+        for path in paths:
+            if counts[prefixes[path]] > 1:
+                prefixes[path] = name(path)
+    counts = collections.Counter(prefixes.values())
+    clashes = sorted(path for path in paths if counts[prefixes[path]] > 1)
+    if clashes:
+        raise ValueError('Files with the same case name: %s' % ', '.join(clashes))
+    return prefixes
+
+
+def caseName(prefix, meshName, nrMeshes):
+    """Return the name of the case directory of a mesh of the nrMeshes in a file"""
+    if nrMeshes == 1:
+        return prefix
+    return '%s_%s' % (prefix, meshName.replace(' ', '_'))
+
+
+def exportFile(path, prefix, outdir, names, options, debug=0):
+    """
+    Export the meshes in path, run in a worker process.
+
+    args:
+        +    path: med, unv or hdf file
+        +  prefix: case name of the file, see casePrefixes
+        +  outdir: directory of the case directories
+        +   names: names of the meshes to export, all if empty
+        + options: keyword arguments of exportToFoam
+
+    returns a list of (mesh name, case directory, seconds, error) where
+    error is the traceback of a failed export or None.
+    """
+    exporter.debug = debug
+    try:
+        meshes = loadMeshes(path)
+    except Exception:
+        return [(None, path, 0.0, traceback.format_exc())]
+    #the case names depend on all meshes of the file, not the ones exported
+    nrMeshes = len(meshes)
+    if names:
+        meshes = [m for m in meshes if m.GetName() in names]
+    results = list()
+    for mesh in meshes:
+        name = mesh.GetName()
+        caseDir = os.path.join(outdir, caseName(prefix, name, nrMeshes))
+        start = time.time()
+        try:
+            exporter.exportToFoam(mesh, os.path.join(caseDir, 'constant', 'polyMesh'), **options)
+            error = None
+        except Exception:
+            error = traceback.format_exc()
+        results.append((name, caseDir, time.time() - start, error))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Export Salome meshes to OpenFOAM cases')
+    parser.add_argument('files', nargs='+', help='med, unv or hdf files')
+    parser.add_argument('-o', '--outdir', default=os.getcwd(),
+                        help='directory of the case directories')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='number of worker processes')
+    parser.add_argument('--mesh', action='append', default=[],
+                        help='only export the meshes with this name, can be repeated')
+    parser.add_argument('--engine', default='numpy', choices=('dict', 'numpy'))
+    parser.add_argument('--format', default='ascii', choices=('ascii', 'binary'))
+    parser.add_argument('--labelSize', type=int, default=32, choices=(32, 64))
+    parser.add_argument('--renumber', action='store_true')
+    parser.add_argument('--decompose', type=int, default=0)
+    parser.add_argument('--compress', action='store_true')
+    parser.add_argument('--quality', action='store_true')
+    parser.add_argument('--profile', action='store_true')
+    parser.add_argument('--dual', action='store_true', help='export the polyhedral dual')
+    parser.add_argument('-v', '--verbose', type=int, default=0, help='debug level 0-3')
+    args = parser.parse_args(argv)
+
+    if salome is None and any(needsSalome(f) for f in args.files):
+        print('Salome is needed, run with: salome shell -- python foamBatch.py ...')
+        return 2
+    options = dict(engine=args.engine, format=args.format, labelSize=args.labelSize,
+                   renumber=args.renumber, decompose=args.decompose,
+                   compress=args.compress, quality=args.quality, profile=args.profile,
+                   dual=args.dual)
+    outdir = os.path.abspath(args.outdir)
+    files = list(collections.OrderedDict((os.path.abspath(f), None) for f in args.files))
+    try:
+        prefixes = casePrefixes(files)
+    except ValueError as e:
+        print(e)
+        return 2
+
+    failed = 0
+    start = time.time()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max(args.jobs, 1)) as pool:
+        jobs = dict((pool.submit(exportFile, path, prefixes[path], outdir, args.mesh, options,
+                                 args.verbose), path) for path in files)
+        for job in concurrent.futures.as_completed(jobs):
+            path = jobs[job]
+            try:
+                results = job.result()
+            except Exception:
+                results = [(None, path, 0.0, traceback.format_exc())]
+            if not results:
+                print('%s: no meshes to export' % path)
+            for name, caseDir, seconds, error in results:
+                if error is None:
+                    print('%s: exported %s to %s in %.0fs' % (path, name, caseDir, seconds))
+                else:
+                    failed += 1
+                    print('%s: FAILED %s\n%s' % (path, name or '', error))
+    print('Exported %d files in %.0fs, %d failed' % (len(files), time.time() - start, failed))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,229 @@
+"""
+Decomposed export for parallel runs of the Salome to OpenFOAM exporter.
+
+Instead of running decomposePar on the exported mesh the cells are split
+into nProcs subdomains and each one is written to
+    processorN/constant/polyMesh
+next to constant, like decomposePar does. The methods are
+    + simple: recursive coordinate bisection of the cell centres, each
+              part is split along its longest side
+    + graph:  equal chunks of the reverse Cuthill-McKee order of the
+              cells, which follows the face connectivity
+Each subdomain keeps its cells, faces and points in the global order.
+Faces between two subdomains go to processor patches procBoundaryAtoB,
+sorted by neighbour processor, with the faces in the same order on both
+sides. On the side that doesn't own the face globally it is reversed,
+so it points out of the local cell.
+The files cellProcAddressing, faceProcAddressing (+-(face + 1), negative
+for reversed faces), pointProcAddressing and boundaryProcAddressing map
+back to the serial mesh, so decomposePar -fields and reconstructPar work
+on the case.
+"""
+
+import os
+import numpy as np
+import faceStore
+import foamWriter
+import meshGeometry
+import meshOrdering
+
+METHODS = ('simple', 'graph')
+
+
+def caseDirectory(dirname):
+    """Return the case directory of the mesh directory dirname"""
+    dirname = os.path.abspath(dirname)
+    parent, name = os.path.split(dirname)
+    if name == 'polyMesh' and os.path.basename(parent) == 'constant':
+        return os.path.dirname(parent)
+    return parent
+
+
+def simplePartition(centres, nProcs):
+    """Return the processor of each cell by recursive coordinate bisection"""
+    cellProc = np.zeros(len(centres), dtype=np.int64)
+    parts = [(np.arange(len(centres)), 0, nProcs)]
+    while parts:
+        cells, first, n = parts.pop()
+        if n == 1 or len(cells) == 0:
+            cellProc[cells] = first
+            continue
+        axis = np.argmax(np.ptp(centres[cells], axis=0))
+        cells = cells[np.argsort(centres[cells, axis], kind='stable')]
+        #split the cells in proportion to the number of processors
+        nLow = n // 2
+        split = len(cells) * nLow // n
+        parts.append((cells[:split], first, nLow))
+        parts.append((cells[split:], first + nLow, n - nLow))
+    return cellProc
+
+
+def graphPartition(owner, neighbour, nrCells, nProcs):
+    """Return the processor of each cell, chunks of the Cuthill-McKee order"""
+    order = meshOrdering.rcmOrder(owner, neighbour, nrCells)
+    cellProc = np.empty(nrCells, dtype=np.int64)
+    cellProc[order] = np.arange(nrCells) * nProcs // max(nrCells, 1)
+    return cellProc
+
+
+def partitionCells(xyz, faces, owner, neighbour, nrCells, nProcs, method='simple'):
+    """Return the processor of each cell with method simple or graph"""
+    if method == 'simple':
+        centres = meshGeometry.cellCentres(xyz, faces, owner, neighbour, nrCells)
+        return simplePartition(centres, nProcs)
+    elif method == 'graph':
+        return graphPartition(owner, neighbour, nrCells, nProcs)
+    raise ValueError('Unknown method %s, use %s' % (method, ' or '.join(METHODS)))
+
+
+def processorMesh(proc, cellProc, faces, owner, neighbour, patches):
+    """
+    Return the mesh of subdomain proc.
+
+    args:
+        +     proc: the subdomain
+        + cellProc: processor of each cell
+        +    faces: FaceStore of all faces counting from zero
+        +    owner: owner of all faces
+        + neighbour: neighbour of the internal faces
+        +  patches: list of (name, entries) as for foamWriter.writeBoundary
+
+    returns a dict with points, faces, owner, neighbour and patches
+    like the serial mesh plus the addressing back to it.
+    """
+    owner = np.asarray(owner, dtype=np.int64)
+    neighbour = np.asarray(neighbour, dtype=np.int64)
+    nrIntFaces = len(neighbour)
+    ownerProc = cellProc[owner]
+    neighbProc = cellProc[neighbour]
+    intOwnerProc = ownerProc[:nrIntFaces]
+
+    cells = np.flatnonzero(cellProc == proc)
+    localCell = np.full(len(cellProc), -1, dtype=np.int64)
+    localCell[cells] = np.arange(len(cells))
+
+    faceList = [np.flatnonzero((intOwnerProc == proc) & (neighbProc == proc))]
+    nrLocalFaces = len(faceList[0])
+    localPatches = list()
+    for name, entries in patches:
+        entries = list(entries)
+        values = dict(entries)
+        start = values['startFace']
+        patchFaces = start + np.flatnonzero(ownerProc[start:start + values['nFaces']] == proc)
+        faceList.append(patchFaces)
+        values['nFaces'] = len(patchFaces)
+        values['startFace'] = nrLocalFaces
+        localPatches.append((name, [(key, values[key]) for key, v in entries]))
+        nrLocalFaces += len(patchFaces)
+    boundaryAddressing = list(range(len(patches)))
+
+    #faces on the cut between proc and the other processors
+    cut = np.flatnonzero((intOwnerProc != neighbProc) & \
+                             ((intOwnerProc == proc) | (neighbProc == proc)))
+    other = np.where(intOwnerProc[cut] == proc, neighbProc[cut], intOwnerProc[cut])
+    order = np.argsort(other, kind='stable')
+    cut = cut[order]
+    other = other[order]
+    faceList.append(cut)
+    for nbrProc, nr in zip(*np.unique(other, return_counts=True)):
+        localPatches.append(('procBoundary%dto%d' % (proc, nbrProc),
+                             [('type', 'processor'), ('inGroups', '1(processor)'),
+                              ('nFaces', int(nr)), ('startFace', nrLocalFaces),
+                              ('matchTolerance', 0.0001), ('transform', 'unknown'),
+                              ('myProcNo', proc), ('neighbProcNo', int(nbrProc))]))
+        boundaryAddressing.append(-1)
+        nrLocalFaces += int(nr)
+
+    #reverse the cut faces owned by the other processor
+    faceIds = np.concatenate(faceList)
+    reverse = neighbProc[cut] == proc
+    flipped = len(faceIds) - len(cut) + np.flatnonzero(reverse)
+    localOwner = owner[faceIds]
+    localOwner[flipped] = neighbour[cut[reverse]]
+    localFaces = faces.take(faceIds).flip(flipped)
+
+    points = np.unique(localFaces.nodes)
+    faceAddressing = faceIds + 1
+    faceAddressing[flipped] *= -1
+    return dict(points=points,
+                faces=faceStore.FaceStore(localFaces.lengths(),
+                                          np.searchsorted(points, localFaces.nodes)),
+                owner=localCell[localOwner],
+                neighbour=localCell[neighbour[faceList[0]]],
+                patches=localPatches,
+                cellProcAddressing=cells,
+                faceProcAddressing=faceAddressing,
+                pointProcAddressing=points,
+                boundaryProcAddressing=boundaryAddressing)
+
+
+def writeDecomposeParDict(caseDir, nProcs):
+    """Write system/decomposeParDict unless the case already has one"""
+    sysDir = os.path.join(caseDir, 'system')
+    path = os.path.join(sysDir, 'decomposeParDict')
+    if os.path.exists(path):
+        return
+    if not os.path.exists(sysDir):
+        os.makedirs(sysDir)
+    with open(path, 'w') as file:
+        foamWriter.writeHeader(file, 'decomposeParDict', location='system')
+        file.write('numberOfSubdomains\t%d;\n\n' % nProcs)
+        file.write('method\t\tscotch;\n')
+
+
+def writeDecomposed(caseDir, cellProc, nProcs, xyz, faces, owner, neighbour, patches,
+                    zones=(), format='ascii', labelSize=32, chunkSize=foamWriter.CHUNKSIZE,
+                    compress=False):
+    """
+    Write processor0..processor<nProcs - 1>/constant/polyMesh in caseDir.
+
+    args:
+        +  cellProc: processor of each cell, see partitionCells
+        +       xyz: (n, 3) coordinates of the points
+        +     faces: FaceStore of all faces counting from zero
+        +     owner: owner of all faces
+        + neighbour: neighbour of the internal faces
+        +   patches: list of (name, entries) as for foamWriter.writeBoundary
+        +     zones: list of (name, cell labels) written as cellZones
+        +  compress: write gzip compressed files, see foamWriter.openFile
+    """
+    xyz = np.asarray(xyz)
+    cellProc = np.asarray(cellProc, dtype=np.int64)
+    for proc in range(nProcs):
+        mesh = processorMesh(proc, cellProc, faces, owner, neighbour, patches)
+        procDir = os.path.join(caseDir, 'processor%d' % proc, 'constant', 'polyMesh')
+        if not os.path.exists(procDir):
+            os.makedirs(procDir)
+        meshSize = (len(mesh['points']), len(mesh['cellProcAddressing']),
+                    len(mesh['faces']), len(mesh['neighbour']))
+
+        with foamWriter.openFile(os.path.join(procDir, 'points'), compress) as file:
+            foamWriter.writePoints(file, xyz[mesh['points']], format, labelSize, chunkSize)
+        with foamWriter.openFile(os.path.join(procDir, 'faces'), compress) as file:
+            foamWriter.writeFaces(file, mesh['faces'].lengths(), mesh['faces'].nodes,
+                                  format, labelSize, chunkSize)
+        with foamWriter.openFile(os.path.join(procDir, 'owner'), compress) as file:
+            foamWriter.writeLabels(file, 'owner', mesh['owner'], meshSize, ' %d \n',
+                                   format, labelSize, chunkSize)
+        with foamWriter.openFile(os.path.join(procDir, 'neighbour'), compress) as file:
+            foamWriter.writeLabels(file, 'neighbour', mesh['neighbour'], meshSize, ' %d\n',
+                                   format, labelSize, chunkSize)
+        with foamWriter.openFile(os.path.join(procDir, 'boundary'), compress) as file:
+            foamWriter.writeBoundary(file, mesh['patches'])
+        for name in ('cellProcAddressing', 'faceProcAddressing',
+                     'pointProcAddressing', 'boundaryProcAddressing'):
+            with foamWriter.openFile(os.path.join(procDir, name), compress) as file:
+                foamWriter.writeLabels(file, name, mesh[name], format=format,
+                                       labelSize=labelSize, chunkSize=chunkSize)
+
+        if len(zones) > 0:
+            localCell = np.full(len(cellProc), -1, dtype=np.int64)
+            localCell[mesh['cellProcAddressing']] = np.arange(len(mesh['cellProcAddressing']))
+            localZones = list()
+            for name, labels in zones:
+                labels = np.asarray(labels, dtype=np.int64)
+                localZones.append((name, localCell[labels[cellProc[labels] == proc]]))
+            with foamWriter.openFile(os.path.join(procDir, 'cellZones'), compress) as file:
+                foamWriter.writeCellZones(file, localZones)
+
+    writeDecomposeParDict(caseDir, nProcs)
@@ -0,0 +1,338 @@
+"""
+Reader of the OpenFOAM polyMesh files, the inverse of foamWriter.
+
+The files points, faces, owner, neighbour and boundary are memory mapped
+and parsed in bulk with numpy instead of line by line:
+    + binary lists are read straight from the mapped bytes, in the byte
+      order and sizes of the arch entry of the header
+    + ascii labels and faces are scanned as bytes, the digit runs give
+      the numbers and a number right before '(' is the size of a face
+    + ascii points are parsed by numpy from text with the parentheses
+      blanked out
+Ascii lists are parsed CHUNKSIZE bytes at a time so the memory use stays
+flat on multi-GB files. Files compressed as path.gz are read as well,
+they are decompressed in memory as they can't be mapped.
+
+checkPolyMesh validates a mesh read back: the sizes of the files, the
+ranges of the labels, owner < neighbour, the upper triangular order of
+the internal faces and the patch ranges of the boundary. Run it as
+    python foamReader.py constant/polyMesh
+"""
+
+import gzip
+import mmap
+import os
+import re
+import sys
+import numpy as np
+from faceStore import FaceStore
+
+CHUNKSIZE = 1 << 24 #bytes of an ascii list parsed at a time
+
+HEADER = re.compile(rb'FoamFile\s*\{([^}]*)\}')
+ENTRY = re.compile(r'(\w+)\s+("[^"]*"|[^;]*);')
+LISTSTART = re.compile(rb'(?:\s|//[^\n]*\n)*(\d+)\s*([({])')
+PATCH = re.compile(r'([^\s{}();]+)\s*\{([^}]*)\}')
+NOTE = re.compile(r'(\w+):\s*(\d+)')
+POWERS = 10 ** np.arange(19, dtype=np.int64)
+BLANKPARENTHESES = bytes.maketrans(b'()', b'  ')
+
+
+def mapFile(path):
+    """
+    Return the content of the OpenFOAM file path, or path.gz, as an mmap
+    or as bytes if it is compressed or empty.
+    """
+    if not os.path.exists(path) and os.path.exists(path + '.gz'):
+        path = path + '.gz'
+    if path.endswith('.gz'):
+        with gzip.open(path, 'rb') as file:
+            return file.read()
+    with open(path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return b''
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def closeFile(buf):
+    """Unmap a file returned by mapFile"""
+    if isinstance(buf, mmap.mmap):
+        buf.close()
+
+
+def parseHeader(buf):
+    """Return the entries of the FoamFile header as a dict and where it ends"""
+    match = HEADER.search(buf)
+    if match is None:
+        raise ValueError('No FoamFile header')
+    entries = dict((key, value.strip().strip('"'))
+                   for key, value in ENTRY.findall(match.group(1).decode('ascii', 'replace')))
+    return entries, match.end()
+
+
+def binaryTypes(header):
+    """Return the numpy (label, scalar) types of a binary file from its arch entry"""
+    arch = header.get('arch', '')
+    match = re.search(r'label=(\d+)', arch)
+    labelSize = int(match.group(1)) if match else 32
+    match = re.search(r'scalar=(\d+)', arch)
+    scalarSize = int(match.group(1)) if match else 64
+    order = '>' if arch.startswith('MSB') else '<'
+    return np.dtype('%si%d' % (order, labelSize // 8)), np.dtype('%sf%d' % (order, scalarSize // 8))
+
+
+def scanIntegers(chunk):
+    """
+    Return the integers in the ascii bytes chunk and which of them are
+    followed by '(', i.e. are the size of a face.
+    """
+    b = np.frombuffer(chunk, dtype=np.uint8)
+    digit = (b >= 48) & (b <= 57)
+    edges = np.diff(digit.view(np.int8), prepend=np.int8(0), append=np.int8(0))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    if len(starts) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=bool)
+    lengths = ends - starts
+    pos = np.flatnonzero(digit)
+    #each digit times the power of ten of its place in the number
+    place = np.repeat(ends - 1, lengths) - pos
+    values = np.add.reduceat((b[pos] - 48).astype(np.int64) * POWERS[place],
+                             np.cumsum(lengths) - lengths)
+    negative = b[np.maximum(starts - 1, 0)] == ord('-')
+    negative[starts == 0] = False
+    values[negative] *= -1
+    isSize = b[np.minimum(ends, len(b) - 1)] == ord('(')
+    isSize[ends >= len(b)] = False
+    return values, isSize
+
+
+def asciiChunks(buf, start, end):
+    """Yield the bytes start:end of buf in pieces of about CHUNKSIZE ending at a newline"""
+    while start < end:
+        stop = end if end - start <= CHUNKSIZE else buf.rfind(b'\n', start, start + CHUNKSIZE) + 1
+        if stop <= start:
+            stop = min(start + CHUNKSIZE, end)
+        yield buf[start:stop]
+        start = stop
+
+
+def readList(buf, pos, kind, labelType, scalarType, binary):
+    """
+    Read the list starting at pos, after any white space, of kind
+    'label', 'vector' or 'face'.
+
+    returns (values, end) where values is an array, (n, 3) for vectors,
+    or (lengths, nodes) for faces, and end is the position after the list.
+    """
+    match = LISTSTART.match(buf, pos)
+    if match is None:
+        raise ValueError('No list at byte %d' % pos)
+    size = int(match.group(1))
+    start = match.end()
+    if match.group(2) == b'{':
+        #a uniform list, size{value}
+        end = buf.find(b'}', start)
+        value = np.fromstring(bytes(buf[start:end]).translate(BLANKPARENTHESES), sep=' ')
+        if kind == 'vector':
+            return np.tile(value, (size, 1)), end + 1
+        return np.full(size, int(value[0]), dtype=np.int64), end + 1
+
+    if binary:
+        dtype = scalarType if kind == 'vector' else labelType
+        count = 3 * size if kind == 'vector' else size
+        values = np.frombuffer(buf, dtype=dtype, count=count, offset=start)
+        values = values.astype(np.float64 if kind == 'vector' else np.int64)
+        end = start + count * dtype.itemsize
+        if buf[end:end + 1] != b')':
+            raise ValueError('The binary list at byte %d is not closed' % pos)
+        return (values.reshape(-1, 3) if kind == 'vector' else values), end + 1
+
+    #the list ends at a ')' starting a line, the entries don't
+    end = buf.find(b'\n)', start) + 1 if size else buf.find(b')', start)
+    if end <= 0:
+        raise ValueError('The list at byte %d is not closed' % pos)
+    if kind == 'vector':
+        values = np.concatenate([np.fromstring(chunk.translate(BLANKPARENTHESES), sep=' ')
+                                 for chunk in asciiChunks(buf, start, end)] + [np.zeros(0)])
+        if len(values) != 3 * size:
+            raise ValueError('Read %d values of %d vectors' % (len(values), size))
+        return values.reshape(-1, 3), end + 1
+    scanned = [scanIntegers(chunk) for chunk in asciiChunks(buf, start, end)]
+    values = np.concatenate([v for v, s in scanned] + [np.zeros(0, dtype=np.int64)])
+    if kind == 'label':
+        if len(values) != size:
+            raise ValueError('Read %d of %d labels' % (len(values), size))
+        return values, end + 1
+    isSize = np.concatenate([s for v, s in scanned] + [np.zeros(0, dtype=bool)])
+    lengths, nodes = values[isSize], values[~isSize]
+    if len(lengths) != size or lengths.sum() != len(nodes):
+        raise ValueError('Read %d of %d faces' % (len(lengths), size))
+    return (lengths, nodes), end + 1
+
+
+def readFile(path, kind):
+    """
+    Read a polyMesh file with one list of kind 'label', 'vector' or
+    'face', return (header, values), faces as a FaceStore.
+    """
+    buf = mapFile(path)
+    try:
+        header, pos = parseHeader(buf)
+        binary = header.get('format') == 'binary'
+        labelType, scalarType = binaryTypes(header)
+        if kind == 'face' and header.get('class') == 'faceCompactList':
+            offsets, pos = readList(buf, pos, 'label', labelType, scalarType, binary)
+            nodes, pos = readList(buf, pos, 'label', labelType, scalarType, binary)
+            return header, FaceStore(np.diff(offsets), nodes)
+        values, pos = readList(buf, pos, kind, labelType, scalarType, binary)
+        if kind == 'face':
+            return header, FaceStore(*values)
+        return header, values
+    finally:
+        closeFile(buf)
+
+
+def readBoundary(path):
+    """Return the patches of the file boundary as (name, entries), see foamWriter.writeBoundary"""
+    buf = mapFile(path)
+    try:
+        header, pos = parseHeader(buf)
+        text = bytes(buf[pos:]).decode('ascii', 'replace')
+    finally:
+        closeFile(buf)
+    text = re.sub(r'//[^\n]*', '', text)
+    return [(name, ENTRY.findall(body)) for name, body in PATCH.findall(text)]
+
+
+def readPolyMesh(dirname):
+    """
+    Read the mesh in dirname, e.g. constant/polyMesh.
+
+    returns a dict with
+        +    points: (n, 3) coordinates
+        +     faces: FaceStore of the faces
+        +     owner: owner cell of each face
+        + neighbour: neighbour cell of each internal face
+        +  boundary: the patches as (name, [(keyword, value), ...])
+        +      note: the sizes in the note of owner, e.g. nCells
+    Files which are missing, also as .gz, are None.
+    """
+    def exists(name):
+        path = os.path.join(dirname, name)
+        return os.path.exists(path) or os.path.exists(path + '.gz')
+
+    mesh = dict(points=None, faces=None, owner=None, neighbour=None, boundary=None, note=dict())
+    if exists('points'):
+        mesh['points'] = readFile(os.path.join(dirname, 'points'), 'vector')[1]
+    if exists('faces'):
+        mesh['faces'] = readFile(os.path.join(dirname, 'faces'), 'face')[1]
+    if exists('owner'):
+        header, mesh['owner'] = readFile(os.path.join(dirname, 'owner'), 'label')
+        mesh['note'] = dict((key, int(value))
+                            for key, value in NOTE.findall(header.get('note', '')))
+    if exists('neighbour'):
+        mesh['neighbour'] = readFile(os.path.join(dirname, 'neighbour'), 'label')[1]
+    if exists('boundary'):
+        mesh['boundary'] = readBoundary(os.path.join(dirname, 'boundary'))
+    return mesh
+
+
+def checkPolyMesh(mesh):
+    """
+    Validate a mesh read by readPolyMesh, return a list of the problems
+    found, empty if there are none.
+
+    Checks the sizes of the files against each other and the note of
+    owner, that the labels are in range, owner < neighbour, the upper
+    triangular order of the internal faces, that every cell has faces
+    and that the patches follow each other from the first boundary face
+    to the last face. Checks of missing files are skipped.
+    """
+    problems = list()
+    for name in ('points', 'faces', 'owner', 'neighbour', 'boundary'):
+        if mesh[name] is None:
+            problems.append('The file %s is missing' % name)
+    points, faces = mesh['points'], mesh['faces']
+    owner, neighbour, note = mesh['owner'], mesh['neighbour'], mesh['note']
+
+    nrFaces = len(owner) if owner is not None else (len(faces) if faces is not None else None)
+    nrIntFaces = len(neighbour) if neighbour is not None else note.get('nInternalFaces')
+    if faces is not None and owner is not None and len(faces) != len(owner):
+        problems.append('%d faces but %d owners' % (len(faces), len(owner)))
+    if nrFaces is not None and nrIntFaces is not None and nrIntFaces > nrFaces:
+        problems.append('%d internal faces of %d faces' % (nrIntFaces, nrFaces))
+    for key, value in (('nPoints', None if points is None else len(points)),
+                       ('nFaces', nrFaces), ('nInternalFaces', nrIntFaces)):
+        if key in note and value is not None and note[key] != value:
+            problems.append('The note of owner gives %s %d but there are %d' % (key, note[key], value))
+
+    #the labels
+    if faces is not None:
+        if len(faces) and faces.lengths().min() < 3:
+            problems.append('%d faces have less than 3 points'
+                            % np.count_nonzero(faces.lengths() < 3))
+        if points is not None and len(faces.nodes) and \
+                (faces.nodes.min() < 0 or faces.nodes.max() >= len(points)):
+            problems.append('Faces use points out of range 0..%d' % (len(points) - 1))
+    nrCells = note.get('nCells')
+    if owner is not None:
+        if nrCells is None:
+            nrCells = int(max(owner.max() if len(owner) else -1,
+                              neighbour.max() if neighbour is not None and len(neighbour) else -1)) + 1
+        cells = owner if neighbour is None else np.concatenate((owner, neighbour))
+        if len(cells) and (cells.min() < 0 or cells.max() >= nrCells):
+            problems.append('Owner or neighbour have cells out of range 0..%d' % (nrCells - 1))
+        else:
+            empty = np.count_nonzero(np.bincount(cells, minlength=nrCells) == 0)
+            if empty:
+                problems.append('%d cells have no faces' % empty)
+
+    #the internal faces in upper triangular order
+    if owner is not None and neighbour is not None and len(neighbour) <= len(owner):
+        intOwner = owner[:len(neighbour)]
+        wrongWay = np.count_nonzero(intOwner >= neighbour)
+        if wrongWay:
+            problems.append('%d internal faces have owner >= neighbour' % wrongWay)
+        unordered = np.count_nonzero((intOwner[1:] < intOwner[:-1]) |
+                                     ((intOwner[1:] == intOwner[:-1]) &
+                                      (neighbour[1:] < neighbour[:-1])))
+        if unordered:
+            problems.append('%d internal faces are not in upper triangular order' % unordered)
+
+    #the patches cover the boundary faces in turn
+    if mesh['boundary'] is not None and nrFaces is not None and nrIntFaces is not None:
+        nextFace = nrIntFaces
+        for name, entries in mesh['boundary']:
+            entries = dict(entries)
+            try:
+                start, nr = int(entries['startFace']), int(entries['nFaces'])
+            except (KeyError, ValueError):
+                problems.append('Patch %s has no startFace or nFaces' % name)
+                continue
+            if start != nextFace or nr < 0:
+                problems.append('Patch %s starts at face %d, expected %d' % (name, start, nextFace))
+            nextFace = start + nr
+        if nextFace != nrFaces:
+            problems.append('The patches end at face %d of %d faces' % (nextFace, nrFaces))
+    return problems
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    dirnames = argv or ['constant/polyMesh']
+    failed = 0
+    for dirname in dirnames:
+        mesh = readPolyMesh(dirname)
+        problems = checkPolyMesh(mesh)
+        sizes = ['%s %d' % (name, len(mesh[name])) for name in
+                 ('points', 'faces', 'owner', 'neighbour', 'boundary') if mesh[name] is not None]
+        print('%s: %s' % (dirname, ', '.join(sizes)))
+        for problem in problems:
+            print('    ' + problem)
+        failed += len(problems) > 0
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,375 @@
+"""
+Writers for the OpenFOAM polyMesh files.
+
+In binary format OpenFOAM stores a list as its size followed by the raw
+bytes between parentheses, e.g. for a labelList
+    3
+    (<3 labels as 32 or 64 bit integers>)
+Points are a vectorField of doubles and faces are a faceCompactList,
+i.e. a labelList of offsets (nFaces + 1) followed by a labelList with
+all face nodes. The byte order and sizes are given by the arch entry
+of the header, here always "LSB;label=32|64;scalar=64".
+
+The data is written straight from contiguous numpy arrays through the
+buffer protocol, without formatting a line per entry.
+
+In ascii format the entries are formatted chunkSize at a time into one
+string which is written in one go. This keeps the memory use flat on
+large meshes while avoiding a write call per number.
+
+Files opened with openFile(path, compress=True) are written gzip
+compressed as path.gz, which OpenFOAM reads as well. Each file is
+compressed in its own thread, zlib releases the GIL so the compression
+runs while the next chunk is formatted.
+"""
+
+import gzip
+import io
+import os
+import queue
+import threading
+import numpy as np
+
+CHUNKSIZE = 65536 #number of entries formatted per write in ascii
+COMPRESSLEVEL = 1 #gzip level of compressed files, low levels are much faster
+QUEUESIZE = 16 #number of buffers waiting to be compressed per file
+
+
+class CompressedWriter(io.RawIOBase):
+    """
+    A binary file handing what is written to a thread which gzips it
+    into path.
+    """
+
+    def __init__(self, path, level=COMPRESSLEVEL):
+        io.RawIOBase.__init__(self)
+        self.path = path
+        self.position = 0
+        self.error = None
+        self.queue = queue.Queue(maxsize=QUEUESIZE)
+        self.thread = threading.Thread(target=self.compress, args=(level,),
+                                       name='compress ' + os.path.basename(path))
+        self.thread.daemon = True
+        self.thread.start()
+
+    def compress(self, level):
+        try:
+            with gzip.open(self.path, 'wb', compresslevel=level) as gz:
+                while True:
+                    data = self.queue.get()
+                    if data is None:
+                        break
+                    gz.write(data)
+        except Exception as e:
+            self.error = e
+            #let a waiting writer through
+            while self.queue.get() is not None:
+                pass
+
+    def writable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def write(self, data):
+        if self.error is not None:
+            raise self.error
+        data = bytes(data)
+        self.queue.put(data)
+        self.position += len(data)
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self.queue.put(None)
+            self.thread.join()
+            io.RawIOBase.close(self)
+            if self.error is not None:
+                raise self.error
+
+
+def openFile(path, compress=False):
+    """
+    Open the OpenFOAM file path for writing as text, gzip compressed
+    into path.gz if compress. The other variant of the file is removed
+    so OpenFOAM can't read an old one.
+    """
+    stale = path if compress else path + '.gz'
+    if os.path.exists(stale):
+        os.remove(stale)
+    if not compress:
+        return open(path, 'w')
+    return io.TextIOWrapper(io.BufferedWriter(CompressedWriter(path + '.gz'), 1 << 20))
+
+
+def writeHeader(file, fileType, nrPoints=0, nrCells=0, nrFaces=0, nrIntFaces=0,
+                format='ascii', labelSize=32, location='constant/polyMesh'):
+    """Write a header for the files points, faces, owner, neighbour"""
+    file.write('/*' + '-'*68 + '*\\\n')
+    file.write('|' + ' '*70 + '|\n')
+    file.write('|' + ' '*4 + 'File exported from Salome Platform' +\
+                   ' using SalomeToFoamExporter' +' '*5 +'|\n')
+    file.write('|' + ' '*4 + 'Keep up to date: https://github.com/nicolasedh/salomeToOpenFOAM' +\
+                   ' '*3 + '|\n')
+    file.write('|' + ' '*70 + '|\n')
+    file.write('\*' + '-'*68 + '*/\n')
+
+    file.write('FoamFile\n{\n')
+    file.write('\tversion\t\t2.0;\n')
+    file.write('\tformat\t\t%s;\n' % format)
+    if format == 'binary':
+        file.write('\tarch\t\t\"%s\";\n' % archString(labelSize))
+    file.write('\tclass\t\t')
+
+    if(fileType == 'points'):
+        file.write('vectorField;\n')
+
+    elif(fileType == 'faces' and format == 'binary'):
+        file.write('faceCompactList;\n')
+
+    elif(fileType == 'faces'):
+        file.write('faceList;\n')
+
+    elif(fileType == 'owner' or fileType == 'neighbour'):
+        file.write('labelList;\n')
+        file.write('\tnote\t\t\"nPoints: %d nCells: %d nFaces: %d nInternalFaces: %d\";\n' \
+                       %(nrPoints, nrCells, nrFaces, nrIntFaces))
+
+    elif(fileType == 'boundary'):
+        file.write('polyBoundaryMesh;\n')
+
+    elif(fileType == 'cellZones'):
+        file.write('regIOobject;\n')
+
+    elif(fileType.endswith('ProcAddressing')):
+        file.write('labelList;\n')
+
+    elif(fileType.endswith('Dict')):
+        file.write('dictionary;\n')
+
+    file.write('\tlocation\t\"%s\";\n' % location)
+    file.write('\tobject\t\t' + fileType + ';\n')
+    file.write('}\n\n')
+
+
+def labelType(labelSize):
+    """Return the numpy type of an OpenFOAM label"""
+    if labelSize == 32:
+        return np.dtype('<i4')
+    elif labelSize == 64:
+        return np.dtype('<i8')
+    raise ValueError('labelSize has to be 32 or 64, not %s' % labelSize)
+
+
+def archString(labelSize):
+    """The arch entry of binary files"""
+    return 'LSB;label=%d;scalar=64' % labelSize
+
+
+def tell(file):
+    """Return the position in bytes of a text file"""
+    file.flush()
+    return file.buffer.tell()
+
+
+def writeRaw(file, values, dtype):
+    """
+    Write values as one binary list entry: size ( bytes )
+    returns the byte position of the first value.
+    """
+    values = np.ascontiguousarray(values, dtype=dtype)
+    file.write('\n%d\n' % len(values))
+    file.write('(' if len(values) else '')
+    start = tell(file)
+    if len(values):
+        file.buffer.write(memoryview(values).cast('B'))
+        file.write(')')
+    file.write('\n')
+    return start
+
+
+def writeBinaryLabelList(file, labels, labelSize=32):
+    """Write a labelList in binary format"""
+    labels = np.asarray(labels, dtype=np.int64)
+    dtype = labelType(labelSize)
+    if len(labels) and labelSize == 32 and \
+            (labels.max() > np.iinfo(dtype).max or labels.min() < np.iinfo(dtype).min):
+        raise ValueError('Labels do not fit in 32 bits, use labelSize=64')
+    return writeRaw(file, labels, dtype)
+
+
+def writeBinaryVectorField(file, xyz):
+    """Write an (n, 3) array as a binary vectorField"""
+    writeRaw(file, np.asarray(xyz).reshape(-1, 3), '<f8')
+
+
+def writeBinaryFaceCompactList(file, lengths, nodes, labelSize=32):
+    """
+    Write faces as a binary faceCompactList.
+
+    args:
+        + lengths: the number of nodes of each face
+        +   nodes: all face nodes after each other, counting from zero
+    returns the byte positions of the first offset and the first node.
+    """
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return (writeBinaryLabelList(file, offsets, labelSize),
+            writeBinaryLabelList(file, nodes, labelSize))
+
+
+def writeAsciiLines(file, lineFormat, values, chunkSize=CHUNKSIZE):
+    """Write the entries of values, one per line formatted with lineFormat"""
+    values = np.asarray(values)
+    chunkSize = max(int(chunkSize), 1)
+    for start in range(0, len(values), chunkSize):
+        chunk = values[start:start + chunkSize]
+        file.write((lineFormat * len(chunk)) % tuple(chunk.ravel().tolist()))
+
+
+def writeAsciiList(file, lineFormat, values, chunkSize=CHUNKSIZE, mark=None):
+    """
+    Write values in ascii, one entry per line formatted with lineFormat.
+    values is a 1D array or a 2D array with one entry per row.
+    returns the byte position of entry mark, if given.
+    """
+    values = np.asarray(values)
+    file.write('\n%d\n(\n' % len(values))
+    position = None
+    if mark is not None:
+        writeAsciiLines(file, lineFormat, values[:mark], chunkSize)
+        position = tell(file)
+        values = values[mark:]
+    writeAsciiLines(file, lineFormat, values, chunkSize)
+    file.write(')\n')
+    return position
+
+
+def writeAsciiLabelList(file, labels, lineFormat=' %d\n', chunkSize=CHUNKSIZE, mark=None):
+    """Write a labelList in ascii format"""
+    return writeAsciiList(file, lineFormat, np.asarray(labels, dtype=np.int64), chunkSize, mark)
+
+
+def writeAsciiVectorField(file, xyz, chunkSize=CHUNKSIZE):
+    """Write an (n, 3) array as an ascii vectorField"""
+    writeAsciiList(file, '\t(%g %g %g)\n', np.asarray(xyz, dtype=np.float64).reshape(-1, 3),
+                   chunkSize)
+
+
+def writeAsciiFaceList(file, lengths, nodes, chunkSize=CHUNKSIZE, mark=None):
+    """
+    Write faces as an ascii faceList.
+
+    args:
+        + lengths: the number of nodes of each face
+        +   nodes: all face nodes after each other, counting from zero
+        +    mark: return the byte position of this face
+    """
+    lengths = np.asarray(lengths, dtype=np.int64)
+    nodes = np.asarray(nodes, dtype=np.int64)
+    file.write('\n%d\n(\n' % len(lengths))
+    position = None
+    if mark is not None:
+        split = int(lengths[:mark].sum())
+        writeAsciiFaceLines(file, lengths[:mark], nodes[:split], chunkSize)
+        position = tell(file)
+        lengths, nodes = lengths[mark:], nodes[split:]
+    writeAsciiFaceLines(file, lengths, nodes, chunkSize)
+    file.write(')\n')
+    return position
+
+
+def writeAsciiFaceLines(file, lengths, nodes, chunkSize=CHUNKSIZE):
+    """Write faces one per line as length(nodes)"""
+    lengths = np.asarray(lengths, dtype=np.int64)
+    nodes = np.asarray(nodes, dtype=np.int64)
+    ends = np.cumsum(lengths)
+    faceFormats = dict()
+    chunkSize = max(int(chunkSize), 1)
+    for start in range(0, len(lengths), chunkSize):
+        chunkLengths = lengths[start:start + chunkSize]
+        first = ends[start] - lengths[start]
+        chunkNodes = nodes[first:ends[start + len(chunkLengths) - 1]]
+        #each face is written as its length followed by its nodes
+        values = np.insert(chunkNodes, ends[start:start + len(chunkLengths)] \
+                               - chunkLengths - first, chunkLengths)
+        lineFormats = list()
+        for n in chunkLengths.tolist():
+            try:
+                lineFormats.append(faceFormats[n])
+            except KeyError:
+                faceFormats[n] = '\t%d(' + '%d ' * n + ')\n'
+                lineFormats.append(faceFormats[n])
+        file.write(''.join(lineFormats) % tuple(values.tolist()))
+
+
+def writePoints(file, xyz, format='ascii', labelSize=32, chunkSize=CHUNKSIZE):
+    """Write the file points"""
+    writeHeader(file, 'points', format=format, labelSize=labelSize)
+    if format == 'binary':
+        writeBinaryVectorField(file, xyz)
+    else:
+        writeAsciiVectorField(file, xyz, chunkSize)
+
+
+def writeFaces(file, lengths, nodes, format='ascii', labelSize=32, chunkSize=CHUNKSIZE,
+               mark=None):
+    """
+    Write the file faces, nodes count from zero.
+    returns the byte positions where the faces start in binary format,
+    see writeBinaryFaceCompactList, or where face mark starts in ascii.
+    """
+    writeHeader(file, 'faces', format=format, labelSize=labelSize)
+    if format == 'binary':
+        return writeBinaryFaceCompactList(file, lengths, nodes, labelSize)
+    return (writeAsciiFaceList(file, lengths, nodes, chunkSize, mark),)
+
+
+def writeLabels(file, fileType, labels, meshSize=(0, 0, 0, 0), lineFormat=' %d\n',
+                format='ascii', labelSize=32, chunkSize=CHUNKSIZE, mark=None):
+    """
+    Write a labelList file like owner, neighbour or cellProcAddressing.
+    meshSize is (nrPoints, nrCells, nrFaces, nrIntFaces) for the note
+    of owner and neighbour.
+    returns the byte position of the first label in binary format
+    or of label mark in ascii.
+    """
+    writeHeader(file, fileType, *meshSize, format=format, labelSize=labelSize)
+    if format == 'binary':
+        return writeBinaryLabelList(file, labels, labelSize)
+    return writeAsciiLabelList(file, labels, lineFormat, chunkSize, mark)
+
+
+def writeBoundary(file, patches):
+    """
+    Write the file boundary.
+
+    patches is a list of (name, entries) where entries is a list of
+    (keyword, value) like [('type', 'wall'), ('nFaces', 10), ...]
+    """
+    writeHeader(file, 'boundary')
+    file.write('%d\n(\n' %len(patches))
+    for name, entries in patches:
+        file.write('\t%s\n\t{\n' %name)
+        for key, value in entries:
+            file.write('\t%s%s%s;\n' % (key, '\t' * (2 if len(key) < 8 else 1), value))
+        file.write('\t}\n')
+    file.write(')\n')
+
+
+def writeCellZones(file, zones):
+    """Write the file cellZones, zones is a list of (name, cell labels)"""
+    writeHeader(file, 'cellZones')
+    file.write('\n%d(\n' %len(zones))
+    for name, labels in zones:
+        file.write(name + '\n{\n')
+        file.write('\ttype\tcellZone;\n')
+        file.write('\tcellLabels\tList<label>\n')
+        labels = np.asarray(labels, dtype=np.int64)
+        file.write('%d\n(\n' %len(labels))
+        for start in range(0, len(labels), CHUNKSIZE):
+            chunk = labels[start:start + CHUNKSIZE]
+            file.write(('%d\n' * len(chunk)) % tuple(chunk.tolist()))
+        file.write(');\n}\n')
+    file.write(')\n')
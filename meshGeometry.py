@@ -0,0 +1,135 @@
+"""
+Vectorized mesh geometry for the Salome to OpenFOAM exporter.
+
+Face and cell centres and face area vectors are computed for all faces
+at once from an (n, 3) array of coordinates and a FaceStore, instead of
+fetching the coordinates node by node.
+    + face centre: the mean of the face nodes
+    + face area:   the area vector, the sum of the triangles from the
+                   face centre to each edge. It points along the
+                   normal given by the node order (right hand rule).
+    + cell centre: the mean of the centres of the faces of the cell
+The faces count from zero, i.e. they index the coordinates.
+
+faceCentresAndAreas and cellCentresAndVolumes give the centres like
+OpenFOAM computes them: area weighted over the triangles of a face and
+volume weighted over the pyramids from a cell to its faces.
+"""
+
+import numpy as np
+
+
+def nextPositions(faces):
+    """Return the position of the next node of each face node, the last one wraps around"""
+    nextPos = np.arange(1, len(faces.nodes) + 1)
+    nextPos[faces.offsets[1:] - 1] = faces.offsets[:-1]
+    return nextPos
+
+
+def faceCentres(xyz, faces):
+    """Return the centre of each face, the mean of its nodes"""
+    xyz = np.asarray(xyz, dtype=np.float64)
+    lengths = faces.lengths()
+    if len(lengths) == 0:
+        return np.zeros((0, 3))
+    return np.add.reduceat(xyz[faces.nodes], faces.offsets[:-1], axis=0) / lengths[:, None]
+
+
+def faceAreas(xyz, faces, centres=None):
+    """Return the area vector of each face"""
+    xyz = np.asarray(xyz, dtype=np.float64)
+    if centres is None:
+        centres = faceCentres(xyz, faces)
+    if len(faces) == 0:
+        return np.zeros((0, 3))
+    lengths = faces.lengths()
+    c = np.repeat(centres, lengths, axis=0)
+    triangles = np.cross(xyz[faces.nodes] - c, xyz[faces.nodes[nextPositions(faces)]] - c)
+    return 0.5 * np.add.reduceat(triangles, faces.offsets[:-1], axis=0)
+
+
+def cellCentres(xyz, faces, owner, neighbour, nrCells, centres=None):
+    """
+    Return the approximate cell centres, the mean of the centres of
+    the faces of each cell.
+    """
+    if centres is None:
+        centres = faceCentres(xyz, faces)
+    owner = np.asarray(owner, dtype=np.int64)
+    neighbour = np.asarray(neighbour, dtype=np.int64)
+    cells = np.concatenate((owner, neighbour))
+    result = np.empty((nrCells, 3))
+    count = np.maximum(np.bincount(cells, minlength=nrCells), 1)
+    for i in range(3):
+        weights = np.concatenate((centres[:, i], centres[:len(neighbour), i]))
+        result[:, i] = np.bincount(cells, weights, minlength=nrCells) / count
+    return result
+
+
+def inwardFaces(xyz, faces, owner, neighbour, nrCells):
+    """
+    Return the faces whose area vector points into their owner cell,
+    i.e. towards the owner cell centre.
+    """
+    centres = faceCentres(xyz, faces)
+    areas = faceAreas(xyz, faces, centres)
+    cc = cellCentres(xyz, faces, owner, neighbour, nrCells, centres)
+    toOwner = cc[np.asarray(owner, dtype=np.int64)] - centres
+    return np.flatnonzero(np.einsum('ij,ij->i', areas, toOwner) > 0.0)
+
+
+
+def faceCentresAndAreas(xyz, faces):
+    """
+    Return the area weighted face centres and the area vectors,
+    the centre of each triangle from the mean of the nodes to an edge
+    weighted by its area.
+    """
+    xyz = np.asarray(xyz, dtype=np.float64)
+    if len(faces) == 0:
+        return np.zeros((0, 3)), np.zeros((0, 3))
+    lengths = faces.lengths()
+    starts = faces.offsets[:-1]
+    estimate = np.repeat(faceCentres(xyz, faces), lengths, axis=0)
+    p = xyz[faces.nodes]
+    pNext = xyz[faces.nodes[nextPositions(faces)]]
+    n = np.cross(p - estimate, pNext - estimate)
+    a = np.sqrt(np.einsum('ij,ij->i', n, n))
+    sumA = np.add.reduceat(a, starts)
+    sumAc = np.add.reduceat(a[:, None] * (p + pNext + estimate), starts, axis=0)
+    centres = sumAc / (3.0 * np.maximum(sumA, 1e-300)[:, None])
+    #degenerate faces keep the mean of their nodes
+    degenerate = sumA <= 1e-300
+    centres[degenerate] = estimate[starts[degenerate]]
+    return centres, 0.5 * np.add.reduceat(n, starts, axis=0)
+
+
+def cellCentresAndVolumes(centres, areas, owner, neighbour, nrCells):
+    """
+    Return the cell centres and volumes from the face centres and
+    area vectors, summing the pyramids from the mean of the face
+    centres of each cell to its faces.
+    """
+    owner = np.asarray(owner, dtype=np.int64)
+    neighbour = np.asarray(neighbour, dtype=np.int64)
+    nrIntFaces = len(neighbour)
+    cells = np.concatenate((owner, neighbour))
+    count = np.maximum(np.bincount(cells, minlength=nrCells), 1)
+    estimate = np.empty((nrCells, 3))
+    for i in range(3):
+        weights = np.concatenate((centres[:, i], centres[:nrIntFaces, i]))
+        estimate[:, i] = np.bincount(cells, weights, minlength=nrCells) / count
+
+    #three times the pyramid volumes, positive for faces pointing out
+    pyr3Vol = np.concatenate((
+        np.einsum('ij,ij->i', areas, centres - estimate[owner]),
+        np.einsum('ij,ij->i', areas[:nrIntFaces], estimate[neighbour] - centres[:nrIntFaces])))
+    pyrCentres = 0.75 * np.concatenate((centres, centres[:nrIntFaces])) + \
+        0.25 * estimate[cells]
+    vol3 = np.bincount(cells, pyr3Vol, minlength=nrCells)
+    cellCentres = estimate.copy()
+    valid = np.abs(vol3) > 1e-300
+    for i in range(3):
+        weighted = np.bincount(cells, pyr3Vol * pyrCentres[:, i], minlength=nrCells)
+        cellCentres[valid, i] = weighted[valid] / vol3[valid]
+    return cellCentres, vol3 / 3.0
@@ -0,0 +1,154 @@
+"""
+Face ordering for the Salome to OpenFOAM exporter.
+
+OpenFOAM wants the internal faces in upper triangular order: the owner
+is the lower of the two cells, the faces are sorted by owner and the
+faces of a cell are sorted by neighbour, e.g.
+    owner   neighbour      owner   neighbour
+        0          15         0           3
+        0           3  to     0          15
+        0          17         0          17
+        1           5         1           5
+The boundary faces are sorted by owner within each patch.
+Done here the mesh can be used without running renumberMesh.
+
+The cells can also be renumbered with reverse Cuthill-McKee to reduce
+the bandwidth of the matrix, i.e. the largest difference between owner
+and neighbour, which improves the cache use of the solver. scipy is
+used if it's installed, otherwise a python implementation.
+"""
+
+import numpy as np
+
+try:
+    from scipy.sparse import csr_matrix
+    from scipy.sparse.csgraph import reverse_cuthill_mckee
+except ImportError:
+    reverse_cuthill_mckee = None
+
+
+def upperTriangularOrder(owner, neighbour):
+    """
+    Return the order of the internal faces sorting them by owner and
+    then by neighbour.
+    """
+    owner = np.asarray(owner)
+    neighbour = np.asarray(neighbour)
+    return np.lexsort((neighbour, owner[:len(neighbour)]))
+
+
+def patchOrder(owner, startFaces, nrFaces):
+    """Return the order of the faces sorting each patch by owner"""
+    owner = np.asarray(owner)
+    order = np.arange(len(owner))
+    for start, nr in zip(startFaces, nrFaces):
+        order[start:start + nr] = start + np.argsort(owner[start:start + nr], kind='stable')
+    return order
+
+
+def orderFaces(faces, owner, neighbour, startFaces, nrFaces):
+    """
+    Put the faces in upper triangular order.
+
+    args:
+        +      faces: FaceStore, internal faces then boundary faces
+        +      owner: owner of all faces
+        +  neighbour: neighbour of the internal faces
+        + startFaces: first face of each patch
+        +    nrFaces: number of faces of each patch
+
+    Internal faces where owner > neighbour are flipped.
+    returns (faces, owner, neighbour), faces as a FaceStore.
+    """
+    owner = np.array(owner, dtype=np.int64)
+    neighbour = np.array(neighbour, dtype=np.int64)
+    nrIntFaces = len(neighbour)
+
+    #the lower cell owns the face, flipping the face keeps it pointing
+    #from owner to neighbour
+    flip = np.flatnonzero((owner[:nrIntFaces] > neighbour) & (neighbour >= 0))
+    owner[flip], neighbour[flip] = neighbour[flip], owner[flip]
+    faces = faces.flip(flip)
+
+    order = patchOrder(owner, startFaces, nrFaces)
+    order[:nrIntFaces] = upperTriangularOrder(owner, neighbour)
+
+    return faces.take(order), owner[order], neighbour[order[:nrIntFaces]]
+
+
+def bandwidth(owner, neighbour):
+    """Return the largest difference between owner and neighbour"""
+    neighbour = np.asarray(neighbour)
+    if len(neighbour) == 0:
+        return 0
+    return int(np.abs(neighbour - np.asarray(owner)[:len(neighbour)]).max())
+
+
+def cellAdjacency(owner, neighbour, nrCells):
+    """
+    Return the cell to cell connectivity as (offsets, cells), the
+    neighbours of cell i are cells[offsets[i]:offsets[i + 1]].
+    """
+    neighbour = np.asarray(neighbour, dtype=np.int64)
+    owner = np.asarray(owner, dtype=np.int64)[:len(neighbour)]
+    valid = neighbour >= 0
+    rows = np.concatenate((owner[valid], neighbour[valid]))
+    cols = np.concatenate((neighbour[valid], owner[valid]))
+    order = np.lexsort((cols, rows))
+    offsets = np.zeros(nrCells + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=nrCells), out=offsets[1:])
+    return offsets, cols[order]
+
+
+def rcmOrder(owner, neighbour, nrCells):
+    """
+    Return the reverse Cuthill-McKee order of the cells,
+    order[newId] = oldId.
+    """
+    offsets, adjacent = cellAdjacency(owner, neighbour, nrCells)
+    if reverse_cuthill_mckee is not None:
+        graph = csr_matrix((np.ones(len(adjacent), dtype=np.int8), adjacent, offsets),
+                           shape=(nrCells, nrCells))
+        return np.asarray(reverse_cuthill_mckee(graph, symmetric_mode=True), dtype=np.int64)
+
+    #Breadth first from a cell of lowest degree in each part of the mesh,
+    #visiting the neighbours with the lowest degree first
+    degree = np.diff(offsets)
+    offsets = offsets.tolist()
+    adjacent = adjacent.tolist()
+    degreeList = degree.tolist()
+    visited = [False] * nrCells
+    order = list()
+    for start in np.argsort(degree, kind='stable').tolist():
+        if visited[start]:
+            continue
+        visited[start] = True
+        head = len(order)
+        order.append(start)
+        while head < len(order):
+            cell = order[head]
+            head += 1
+            nbrs = [c for c in adjacent[offsets[cell]:offsets[cell + 1]] if not visited[c]]
+            nbrs.sort(key=degreeList.__getitem__)
+            for c in nbrs:
+                visited[c] = True
+            order.extend(nbrs)
+    return np.array(order[::-1], dtype=np.int64)
+
+
+def renumberCells(owner, neighbour, nrCells):
+    """
+    Renumber the cells with reverse Cuthill-McKee.
+
+    returns (owner, neighbour, newId) where newId[oldId] is the new cell id.
+    The faces have to be ordered again afterwards, see orderFaces.
+    """
+    order = rcmOrder(owner, neighbour, nrCells)
+    newId = np.empty(nrCells, dtype=np.int64)
+    newId[order] = np.arange(nrCells)
+    owner = np.asarray(owner, dtype=np.int64)
+    neighbour = np.asarray(neighbour, dtype=np.int64)
+    #keep -1 for faces without a cell
+    newOwner = np.where(owner >= 0, newId[np.maximum(owner, 0)], -1)
+    newNeighbour = np.where(neighbour >= 0, newId[np.maximum(neighbour, 0)], -1)
+    return newOwner, newNeighbour, newId
@@ -0,0 +1,200 @@
+"""
+Mesh quality metrics for the Salome to OpenFOAM exporter.
+
+The metrics of OpenFOAM's checkMesh are computed with numpy from the
+arrays the exporter builds, see meshGeometry for the centres:
+    + nonOrthogonality: angle in degrees between the face area vector
+                        and the line from the owner to the neighbour
+                        centre, internal faces only
+    + skewness:         distance from the face centre to where the line
+                        between the cell centres crosses the face,
+                        relative to the extent of the face in that
+                        direction or 0.2 of the length of the line if
+                        that is larger. For boundary faces the cell is
+                        mirrored in the face.
+    + aspectRatio:      ratio of the largest to the smallest summed
+                        projected face area of a cell, or the ratio of
+                        its face area to that of a cube of the same
+                        volume if that is larger
+    + faceArea:         magnitude of the face area vectors
+    + cellVolume:       volumes of the cells
+A metric fails if any value is beyond the limit checkMesh uses, e.g.
+a non-orthogonality above 70 degrees. The report is a dict that can
+be written as JSON, with the stats as CSV and histograms.
+"""
+
+import csv
+import json
+import numpy as np
+import meshGeometry
+
+VSMALL = 1e-300
+ROOTVSMALL = 1e-150
+
+#a metric fails if a value is above (max) or below (min) the limit
+LIMITS = dict(nonOrthogonality=('max', 70.0),
+              skewness=('max', 4.0),
+              aspectRatio=('max', 1000.0),
+              faceArea=('min', VSMALL),
+              cellVolume=('min', VSMALL))
+
+#histogram bin edges, values beyond the last edge go to the last bin
+BINS = dict(nonOrthogonality=np.arange(0.0, 91.0, 10.0),
+            skewness=np.array([0.0, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0]),
+            aspectRatio=np.array([1.0, 2.0, 5.0, 10.0, 20.0, 50.0, 100.0, 1000.0, 1e4]))
+
+
+def nonOrthogonality(cellCentres, faceAreas, owner, neighbour):
+    """Return the non-orthogonality of the internal faces in degrees"""
+    nrIntFaces = len(neighbour)
+    d = cellCentres[neighbour] - cellCentres[owner[:nrIntFaces]]
+    s = faceAreas[:nrIntFaces]
+    magProd = np.sqrt(np.einsum('ij,ij->i', d, d) * np.einsum('ij,ij->i', s, s))
+    cosine = np.einsum('ij,ij->i', d, s) / np.maximum(magProd, VSMALL)
+    return np.degrees(np.arccos(np.clip(cosine, -1.0, 1.0)))
+
+
+def skewness(xyz, faces, cellCentres, faceCentres, faceAreas, owner, neighbour):
+    """
+    Return the skewness of all faces like OpenFOAM's faceSkewness and
+    boundaryFaceSkewness: the distance from the face centre to where the
+    line between the cell centres crosses the face, divided by the
+    extent of the face in that direction, at least 0.2 of the distance
+    between the cell centres.
+    """
+    if len(faces) == 0:
+        return np.zeros(0)
+    nrIntFaces = len(neighbour)
+    cpf = faceCentres - cellCentres[owner]
+    magArea = np.sqrt(np.einsum('ij,ij->i', faceAreas, faceAreas))
+    normal = faceAreas / np.maximum(magArea, VSMALL)[:, None]
+    #boundary faces: the owner centre projected on the face normal, so
+    #0.4 of that distance is the 0.2 of the mirrored cell
+    d = np.einsum('ij,ij->i', normal, cpf)[:, None] * normal
+    scale = np.full(len(faceCentres), 0.4)
+    if nrIntFaces:
+        d[:nrIntFaces] = cellCentres[neighbour] - cellCentres[owner[:nrIntFaces]]
+        scale[:nrIntFaces] = 0.2
+    fraction = np.einsum('ij,ij->i', faceAreas, cpf) / \
+        (np.einsum('ij,ij->i', faceAreas, d) + ROOTVSMALL)
+    sv = cpf - fraction[:, None] * d
+    magSv = np.sqrt(np.einsum('ij,ij->i', sv, sv))
+    svHat = sv / (magSv + ROOTVSMALL)[:, None]
+    #extent of the face along the skewness vector
+    lengths = faces.lengths()
+    extent = np.abs(np.einsum('ij,ij->i', np.repeat(svHat, lengths, axis=0),
+                              xyz[faces.nodes] - np.repeat(faceCentres, lengths, axis=0)))
+    fd = np.maximum(scale * np.sqrt(np.einsum('ij,ij->i', d, d)) + ROOTVSMALL,
+                    np.maximum.reduceat(extent, faces.offsets[:-1]))
+    return magSv / fd
+
+
+def aspectRatio(faceAreas, cellVolumes, owner, neighbour, nrCells):
+    """Return the aspect ratio of all cells"""
+    cells = np.concatenate((owner, neighbour))
+    magAreas = np.abs(np.concatenate((faceAreas, faceAreas[:len(neighbour)])))
+    sumMag = np.column_stack([np.bincount(cells, magAreas[:, i], minlength=nrCells)
+                              for i in range(3)])
+    ratio = sumMag.max(axis=1) / (sumMag.min(axis=1) + ROOTVSMALL)
+    volume = np.maximum(cellVolumes, ROOTVSMALL)
+    return np.maximum(ratio, sumMag.sum(axis=1) / 6.0 / volume ** (2.0 / 3.0))
+
+
+def metricStats(values, limit):
+    """Return min, max, mean and the number of values beyond the limit"""
+    kind, threshold = limit
+    stats = dict(count=int(len(values)), threshold=threshold)
+    if len(values):
+        stats.update(min=float(values.min()), max=float(values.max()),
+                     mean=float(values.mean()))
+    else:
+        stats.update(min=0.0, max=0.0, mean=0.0)
+    bad = values > threshold if kind == 'max' else values < threshold
+    stats['nrBad'] = int(np.count_nonzero(bad))
+    return stats
+
+
+def histogram(values, edges=None, nrBins=10):
+    """
+    Return the histogram of values as dict(edges, counts).
+    Without edges there are nrBins logarithmic bins between the
+    smallest positive and the largest value.
+    """
+    if edges is None:
+        positive = values[values > 0]
+        if len(positive) == 0:
+            edges = np.array([0.0, 1.0])
+        else:
+            low, high = np.log10(positive.min()), np.log10(positive.max())
+            edges = np.logspace(low, max(high, low + 1e-12), nrBins + 1)
+    clipped = np.clip(values, edges[0], edges[-1])
+    counts = np.histogram(clipped, edges)[0]
+    return dict(edges=[float(e) for e in edges], counts=[int(c) for c in counts])
+
+
+def checkMesh(xyz, faces, owner, neighbour, nrCells):
+    """
+    Compute the quality metrics of a mesh.
+
+    args:
+        +       xyz: (n, 3) coordinates of the points
+        +     faces: FaceStore of all faces counting from zero
+        +     owner: owner of all faces
+        + neighbour: neighbour of the internal faces
+        +   nrCells: number of cells
+
+    returns the report, a dict with the mesh size, stats and histogram
+    of each metric and the list of failed metrics.
+    """
+    owner = np.asarray(owner, dtype=np.int64)
+    neighbour = np.asarray(neighbour, dtype=np.int64)
+    fCentres, fAreas = meshGeometry.faceCentresAndAreas(xyz, faces)
+    cCentres, cVolumes = meshGeometry.cellCentresAndVolumes(fCentres, fAreas, owner,
+                                                             neighbour, nrCells)
+    values = dict(
+        nonOrthogonality=nonOrthogonality(cCentres, fAreas, owner, neighbour),
+        skewness=skewness(xyz, faces, cCentres, fCentres, fAreas, owner, neighbour),
+        aspectRatio=aspectRatio(fAreas, cVolumes, owner, neighbour, nrCells),
+        faceArea=np.sqrt(np.einsum('ij,ij->i', fAreas, fAreas)),
+        cellVolume=cVolumes)
+
+    report = dict(points=int(len(xyz)), faces=int(len(faces)),
+                  internalFaces=int(len(neighbour)), cells=int(nrCells),
+                  metrics=dict(), histograms=dict())
+    for name, v in values.items():
+        report['metrics'][name] = metricStats(v, LIMITS[name])
+        report['histograms'][name] = histogram(v, BINS.get(name))
+    report['metrics']['cellVolume']['total'] = float(cVolumes.sum())
+    report['failed'] = [name for name in values if report['metrics'][name]['nrBad'] > 0]
+    return report
+
+
+def readReport(basename):
+    """Return the report written by writeReport as basename.json, None if there is none"""
+    try:
+        with open(basename + '.json') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def writeReport(report, basename):
+    """
+    Write the report as basename.json, the stats as basename.csv and
+    the histograms as basename.histograms.csv
+    """
+    with open(basename + '.json', 'w') as file:
+        json.dump(report, file, indent=2)
+    with open(basename + '.csv', 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(('metric', 'min', 'max', 'mean', 'threshold', 'nrBad'))
+        for name, stats in report['metrics'].items():
+            writer.writerow((name, stats['min'], stats['max'], stats['mean'],
+                             stats['threshold'], stats['nrBad']))
+    with open(basename + '.histograms.csv', 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(('metric', 'low', 'high', 'count'))
+        for name, hist in report['histograms'].items():
+            edges = hist['edges']
+            for low, high, count in zip(edges[:-1], edges[1:], hist['counts']):
+                writer.writerow((name, low, high, count))
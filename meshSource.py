@@ -0,0 +1,662 @@
+"""
+Mesh sources for the Salome to OpenFOAM exporter.
+
+exportToFoam does not talk to SMESH directly but to a MeshSource that
+hands out the whole mesh as flat numpy arrays:
+    + nodes():      node ids and an (n, 3) array of coordinates
+    + volumes():    the volume (cell) ids
+    + cellFaces():  number of faces per volume, nodes per face and all
+                    face nodes after each other
+    + freeFaces():  ids of the face elements on the boundary
+    + groups():     list of (name, type, ids), type is FACE or VOLUME
+    + elemNodes():  nodes of many elements in one go
+    + fingerprint(): hash of the node coordinates and the connectivity
+
+SalomeMeshSource wraps a SMESH mesh. It writes the mesh with one
+ExportMED call to a temporary file and reads that with MedMeshSource,
+mapping the nodes and elements back to their SMESH ids. Without h5py it
+pulls every element exactly once with the per element calls of SMESH.
+ArrayMeshSource keeps a mesh in memory so the exporter can be
+run and benchmarked without Salome. MedMeshSource reads a MED file
+with h5py, so a saved mesh can be exported without starting Salome.
+All ids are Salome ids, i.e. counting from one.
+The calls a source makes to SMESH are counted by method in calls, a
+collections.Counter, see exportProfile.
+"""
+
+import collections
+import hashlib
+import itertools
+import os
+import tempfile
+import numpy as np
+import faceMatching
+import meshGeometry
+from faceStore import FaceStore
+
+try:
+    import salome
+    import SMESH
+    from salome.smesh import smeshBuilder
+except ImportError:
+    salome = None
+try:
+    import h5py
+except ImportError:
+    h5py = None #MedMeshSource can't be used
+
+FACE = 'face'
+VOLUME = 'volume'
+
+#the MED volume types as (corner nodes, faces of the corners),
+#quadratic types only use their corners
+MEDTET = (4, [[0, 1, 2], [0, 1, 3], [1, 2, 3], [0, 2, 3]])
+MEDPYRAMID = (5, [[0, 1, 2, 3], [0, 1, 4], [1, 2, 4], [2, 3, 4], [3, 0, 4]])
+MEDPENTA = (6, [[0, 1, 2], [3, 4, 5], [0, 1, 4, 3], [1, 2, 5, 4], [2, 0, 3, 5]])
+MEDHEXA = (8, [[0, 1, 2, 3], [4, 5, 6, 7], [0, 1, 5, 4], [1, 2, 6, 5], [2, 3, 7, 6],
+               [3, 0, 4, 7]])
+MEDVOLUMES = dict(TE4=MEDTET, T10=MEDTET, PY5=MEDPYRAMID, P13=MEDPYRAMID,
+                  PE6=MEDPENTA, P15=MEDPENTA, P18=MEDPENTA,
+                  HE8=MEDHEXA, H20=MEDHEXA, H27=MEDHEXA)
+#the MED face types as corner nodes
+MEDFACES = dict(TR3=3, TR6=3, TR7=3, QU4=4, QU8=4, QU9=4)
+MEDPOLYGON = 'POG'
+MEDPOLYHEDRON = 'POE'
+#the SMESH entity type of each MED type, to find the SMESH ids of the
+#elements of a MED file without element numbers
+MEDENTITIES = dict(TR3='Entity_Triangle', TR6='Entity_Quad_Triangle',
+                   TR7='Entity_BiQuad_Triangle', QU4='Entity_Quadrangle',
+                   QU8='Entity_Quad_Quadrangle', QU9='Entity_BiQuad_Quadrangle',
+                   POG='Entity_Polygon', TE4='Entity_Tetra', T10='Entity_Quad_Tetra',
+                   PY5='Entity_Pyramid', P13='Entity_Quad_Pyramid', PE6='Entity_Penta',
+                   P15='Entity_Quad_Penta', P18='Entity_BiQuad_Penta', HE8='Entity_Hexa',
+                   H20='Entity_Quad_Hexa', H27='Entity_TriQuad_Hexa', POE='Entity_Polyhedra')
+
+
+class CallCounter(object):
+    """Wrap an object and count the calls of its methods in calls"""
+
+    def __init__(self, obj, calls=None):
+        self._obj = obj
+        self.calls = calls if calls is not None else collections.Counter()
+
+    def __getattr__(self, name):
+        attr = getattr(self._obj, name)
+        if not callable(attr):
+            return attr
+        calls = self.calls
+
+        def counted(*args, **kwargs):
+            calls[name] += 1
+            return attr(*args, **kwargs)
+        #later lookups find it without __getattr__
+        setattr(self, name, counted)
+        return counted
+
+
+class MeshSource(object):
+    """
+    Base class of the mesh sources, subclasses fill in the fetch methods.
+    Everything is fetched once and then kept.
+    """
+
+    def __init__(self, name='Mesh'):
+        self.name = name
+        self._nodes = None
+        self._volumes = None
+        self._cellFaces = None
+        self._freeFaces = None
+        self._nodeIndex = None
+        self.calls = collections.Counter()
+
+    def GetName(self):
+        return self.name
+
+    def nodes(self):
+        """Return (nodeIds, xyz)"""
+        if self._nodes is None:
+            ids, xyz = self.fetchNodes()
+            self._nodes = (np.asarray(ids, dtype=np.int64),
+                           np.asarray(xyz, dtype=np.float64).reshape(-1, 3))
+        return self._nodes
+
+    def volumes(self):
+        """Return the volume ids"""
+        if self._volumes is None:
+            self._volumes = np.asarray(self.fetchVolumes(), dtype=np.int64)
+        return self._volumes
+
+    def cellFaces(self):
+        """Return (cellNrFaces, faceLengths, faceNodes) in the order of volumes()"""
+        if self._cellFaces is None:
+            self._cellFaces = tuple(np.asarray(a, dtype=np.int64)
+                                    for a in self.fetchCellFaces())
+        return self._cellFaces
+
+    def freeFaces(self):
+        """Return the ids of the free (boundary) face elements"""
+        if self._freeFaces is None:
+            self._freeFaces = np.asarray(self.fetchFreeFaces(), dtype=np.int64)
+        return self._freeFaces
+
+    def fingerprint(self):
+        """
+        Return a hash of the node coordinates and the connectivity,
+        it changes when the mesh changes but not when its groups do.
+        """
+        ids, xyz = self.nodes()
+        h = hashlib.sha1()
+        for a in (ids, xyz, self.volumes()) + self.cellFaces():
+            h.update(np.ascontiguousarray(a).tobytes())
+        return h.hexdigest()
+
+    def groups(self):
+        """Return list of (name, type, ids)"""
+        raise NotImplementedError
+
+    def elemNodes(self, ids):
+        """Return (lengths, nodes) of the elements ids"""
+        raise NotImplementedError
+
+    def addGroup(self, name, ids):
+        """Add a group of faces, used for the faces without a group"""
+        raise NotImplementedError
+
+    def nodeIndex(self, nodeIds):
+        """Return the position in nodes() of nodeIds"""
+        ids = self.nodes()[0]
+        if self._nodeIndex is None:
+            if len(ids) == 0 or (ids[0] == 1 and ids[-1] == len(ids) and \
+                                     np.all(np.diff(ids) == 1)):
+                self._nodeIndex = False #ids are 1..n
+            else:
+                self._nodeIndex = np.argsort(ids)
+        nodeIds = np.asarray(nodeIds, dtype=np.int64)
+        if self._nodeIndex is False:
+            return nodeIds - 1
+        return self._nodeIndex[np.searchsorted(ids, nodeIds, sorter=self._nodeIndex)]
+
+
+class SalomeMeshSource(MeshSource):
+    """
+    A MeshSource reading a Salome SMESH mesh.
+
+    The nodes and elements are read in bulk: the mesh is written with
+    ExportMED to a temporary file which is read with MedMeshSource. The
+    SMESH ids of the nodes and elements are the numbers in the file or,
+    if it has none, the ids of each entity type by increasing id, the
+    order SMESH writes them in. The groups and the free faces still come
+    from SMESH, with a call per group.
+
+    Without h5py, or if the MED file can't be mapped to the mesh, the
+    per element calls of SMESH are used instead. Each of them is made
+    exactly once and the result is kept in flat arrays.
+    """
+
+    def __init__(self, mesh):
+        MeshSource.__init__(self, mesh.GetName())
+        self.mesh = CallCounter(mesh, self.calls)
+        self._elemNodes = dict()
+        self._med = None
+
+    def medSource(self):
+        """Return the MedMeshSource of the mesh, None if it can't be used"""
+        if self._med is None:
+            self._med = False
+            if h5py is not None:
+                try:
+                    self._med = self.readMED()
+                except Exception:
+                    self._med = False #the per element calls still work
+        return self._med or None
+
+    def readMED(self):
+        """
+        Export the mesh to a temporary MED file and read it back. Sets
+        medNodeIds and medElemIds, the SMESH id of each node and element
+        of the file.
+        """
+        handle, path = tempfile.mkstemp(suffix='.med')
+        os.close(handle)
+        try:
+            self.mesh.ExportMED(path)
+            med = MedMeshSource(path)
+        finally:
+            os.remove(path)
+        nodeIds = med.nodeNumbers
+        if nodeIds is None:
+            nodeIds = np.sort(np.asarray(self.mesh.GetElementsByType(SMESH.NODE),
+                                         dtype=np.int64))
+        faceIds, volumeIds = med.faceNumbers, med.volumeNumbers
+        if faceIds is None:
+            faceIds = self.entityIds(SMESH.FACE, med.faceTypes)
+        if volumeIds is None:
+            volumeIds = self.entityIds(SMESH.VOLUME, med.volumeTypes)
+        if len(nodeIds) != len(med.xyz):
+            raise ValueError('The MED file has %d nodes, the mesh %d' \
+                                 % (len(med.xyz), len(nodeIds)))
+        #volumes of a type MedMeshSource doesn't read are missing
+        nrVolumes = len(self.mesh.GetElementsByType(SMESH.VOLUME))
+        if len(volumeIds) != nrVolumes:
+            raise ValueError('The MED file has %d volumes, the mesh %d' \
+                                 % (len(volumeIds), nrVolumes))
+        self.medNodeIds = np.asarray(nodeIds, dtype=np.int64)
+        self.medElemIds = np.concatenate((faceIds, volumeIds)).astype(np.int64)
+        return med
+
+    def entityIds(self, elemType, medTypes):
+        """Return the SMESH ids of the elements of medTypes, [(MED type, number)]"""
+        smesh = smeshBuilder.New()
+        ids = [np.zeros(0, dtype=np.int64)]
+        for medType, nr in medTypes:
+            entity = getattr(SMESH, MEDENTITIES.get(medType, ''), None)
+            if entity is None:
+                raise ValueError('No SMESH entity type for MED type %s' % medType)
+            filter = smesh.GetFilter(elemType, SMESH.FT_EntityType, '=', entity)
+            typeIds = np.sort(np.asarray(self.mesh.GetIdsFromFilter(filter), dtype=np.int64))
+            if len(typeIds) != nr:
+                raise ValueError('The MED file has %d %s, the mesh %d' \
+                                     % (nr, medType, len(typeIds)))
+            ids.append(typeIds)
+        return np.concatenate(ids)
+
+    def fetchNodes(self):
+        med = self.medSource()
+        if med is not None:
+            return self.medNodeIds, med.xyz
+        ids = self.mesh.GetElementsByType(SMESH.NODE)
+        xyz = np.empty((len(ids), 3))
+        for n, ni in enumerate(ids):
+            xyz[n] = self.mesh.GetNodeXYZ(ni)
+        return ids, xyz
+
+    def fetchVolumes(self):
+        med = self.medSource()
+        if med is not None:
+            return self.medElemIds[med.nrFaceElems:]
+        return self.mesh.GetElementsByType(SMESH.VOLUME)
+
+    def fetchCellFaces(self):
+        med = self.medSource()
+        if med is not None:
+            cellNrFaces, lengths, nodes = med.cellFaces()
+            return cellNrFaces, lengths, self.medNodeIds[nodes - 1]
+        mesh = self.mesh
+        volumes = self.volumes().tolist()
+        cellNrFaces = np.zeros(len(volumes), dtype=np.int64)
+        faces = list()
+        for vi, v in enumerate(volumes):
+            i = 0
+            fnodes = mesh.GetElemFaceNodes(v, i)
+            while fnodes:                           #While not empty list
+                faces.append(fnodes)
+                i += 1
+                fnodes = mesh.GetElemFaceNodes(v, i)
+            cellNrFaces[vi] = i
+        lengths = np.fromiter(map(len, faces), dtype=np.int64, count=len(faces))
+        return cellNrFaces, lengths, list(itertools.chain.from_iterable(faces))
+
+    def fingerprint(self):
+        """
+        Hash the nodes of each volume instead of its faces, which
+        takes one SMESH call per volume instead of one per face. The
+        faces read from a MED file are hashed without any calls.
+        """
+        if self.medSource() is not None:
+            return MeshSource.fingerprint(self)
+        ids, xyz = self.nodes()
+        volumes = self.volumes()
+        h = hashlib.sha1()
+        for a in (ids, xyz, volumes):
+            h.update(np.ascontiguousarray(a).tobytes())
+        for v in volumes.tolist():
+            h.update(np.array(self.mesh.GetElemNodes(v), dtype=np.int64).tobytes())
+        return h.hexdigest()
+
+    def fetchFreeFaces(self):
+        smesh = smeshBuilder.New()
+        filter = smesh.GetFilter(SMESH.EDGE, SMESH.FT_FreeFaces)
+        return self.mesh.GetIdsFromFilter(filter)
+
+    def groups(self):
+        res = list()
+        for gr in self.mesh.GetGroups():
+            if gr.GetType() == SMESH.FACE:
+                res.append((gr.GetName(), FACE, gr.GetIDs()))
+            elif gr.GetType() == SMESH.VOLUME:
+                res.append((gr.GetName(), VOLUME, gr.GetIDs()))
+        return res
+
+    def elemNodes(self, ids):
+        med = self.medSource()
+        if med is not None:
+            #the elements in the file by SMESH id
+            elemIds = np.asarray(ids, dtype=np.int64)
+            order = np.argsort(self.medElemIds, kind='stable')
+            pos = np.minimum(np.searchsorted(self.medElemIds, elemIds, sorter=order),
+                             max(len(order) - 1, 0))
+            if len(order) and np.array_equal(self.medElemIds[order[pos]], elemIds):
+                lengths, nodes = med.elemNodes(order[pos] + 1)
+                return lengths, self.medNodeIds[nodes - 1]
+        cache = self._elemNodes
+        faces = list()
+        for e in ids:
+            try:
+                fnodes = cache[e]
+            except KeyError:
+                fnodes = cache[e] = self.mesh.GetElemNodes(e)
+            faces.append(fnodes)
+        lengths = np.fromiter(map(len, faces), dtype=np.int64, count=len(faces))
+        return lengths, np.fromiter(itertools.chain.from_iterable(faces),
+                                    dtype=np.int64, count=int(lengths.sum()))
+
+    def addGroup(self, name, ids):
+        mesh = self.mesh
+        #function might have different name
+        try:
+            group = mesh.CreateGroup(SMESH.FACE, name)
+        except AttributeError:
+            group = mesh.CreateEmptyGroup(SMESH.FACE, name)
+
+        group.Add(list(ids))
+        smeshBuilder.New().SetName(group, name)
+
+        if salome.sg.hasDesktop():
+            salome.sg.updateObjBrowser()
+
+
+class ArrayMeshSource(MeshSource):
+    """
+    A MeshSource kept in memory, used to run the exporter without Salome.
+
+    args:
+        +  points: (n, 3) coordinates, node i has id i+1
+        +   cells: list of cells, each a list of faces (lists of node ids)
+                   pointing out of the cell
+        +   faces: list of face elements (lists of node ids), the boundary
+                   faces among them are the free faces
+        +  groups: list of (name, type, ids), face ids count from one in
+                   faces, volume ids follow after the faces
+    """
+
+    def __init__(self, points, cells, faces=(), groups=(), name='Mesh'):
+        MeshSource.__init__(self, name)
+        self.points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        self.cells = cells
+        self.faces = [list(f) for f in faces]
+        self._groups = [(n, t, list(ids)) for n, t, ids in groups]
+
+    def fetchNodes(self):
+        return np.arange(1, len(self.points) + 1), self.points
+
+    def fetchVolumes(self):
+        first = len(self.faces) + 1
+        return np.arange(first, first + len(self.cells))
+
+    def fetchCellFaces(self):
+        cellNrFaces = np.fromiter(map(len, self.cells), dtype=np.int64, count=len(self.cells))
+        faces = list(itertools.chain.from_iterable(self.cells))
+        lengths = np.fromiter(map(len, faces), dtype=np.int64, count=len(faces))
+        return cellNrFaces, lengths, list(itertools.chain.from_iterable(faces))
+
+    def fetchFreeFaces(self):
+        count = dict()
+        for cell in self.cells:
+            for f in cell:
+                key = tuple(sorted(f))
+                count[key] = count.get(key, 0) + 1
+        return [i + 1 for i, f in enumerate(self.faces)
+                if count.get(tuple(sorted(f)), 0) == 1]
+
+    def groups(self):
+        return list(self._groups)
+
+    def elemNodes(self, ids):
+        nrFaces = len(self.faces)
+        elems = list()
+        for e in ids:
+            if e <= nrFaces:
+                elems.append(self.faces[e - 1])
+            else:
+                cell = self.cells[e - nrFaces - 1]
+                #the nodes of a cell are only used for its centre
+                elems.append(sorted(set(itertools.chain.from_iterable(cell))))
+        lengths = np.fromiter(map(len, elems), dtype=np.int64, count=len(elems))
+        return lengths, np.fromiter(itertools.chain.from_iterable(elems),
+                                    dtype=np.int64, count=int(lengths.sum()))
+
+    def addGroup(self, name, ids):
+        self._groups.append((name, FACE, list(ids)))
+
+
+class MedMeshSource(MeshSource):
+    """
+    A MeshSource reading a mesh from a MED file with h5py.
+
+    args:
+        +     path: the MED file
+        + meshName: the mesh to read, the first one in the file if None
+
+    The face elements get the ids 1..nrFaces and the volumes follow
+    after them, the nodes are numbered as in the file. The numbers the
+    file gives the nodes and elements, if it has them, are kept in
+    nodeNumbers, faceNumbers and volumeNumbers, else these are None.
+    faceTypes and volumeTypes are the (MED type, number of elements) in
+    the order of the ids. The faces of
+    the volumes are turned to point out of them. The groups are made
+    from the families of the elements, a group with both faces and
+    volumes is split in a FACE and a VOLUME group.
+    """
+
+    def __init__(self, path, meshName=None):
+        if h5py is None:
+            raise ImportError('h5py is needed to read MED files')
+        with h5py.File(path, 'r') as f:
+            names = list(f['ENS_MAA'])
+            if meshName is None:
+                meshName = names[0]
+            elif meshName not in names:
+                raise ValueError('No mesh %s in %s, it has %s' % (meshName, path,
+                                                                  ', '.join(names)))
+            MeshSource.__init__(self, meshName)
+            self.path = path
+            self.read(f, meshName)
+
+    def read(self, f, meshName):
+        mesh = f['ENS_MAA'][meshName]
+        if 'NOE' not in mesh:
+            #the last time step
+            mesh = mesh[sorted(mesh)[-1]]
+        coo = mesh['NOE']['COO']
+        nrNodes = int(coo.attrs['NBR'])
+        xyz = np.asarray(coo[()], dtype=np.float64).reshape((nrNodes, -1), order='F')
+        self.xyz = np.zeros((nrNodes, 3))
+        self.xyz[:, :xyz.shape[1]] = xyz
+        self.nodeNumbers = elemNumbers(mesh['NOE'])
+        self.faceTypes, self.volumeTypes = list(), list()
+        faceNumbers, volumeNumbers = list(), list()
+
+        faces = list() #(lengths, nodes, families) of each face type
+        volumes = list() #(cellNrFaces, faceLengths, faceNodes, nodes, families)
+        for medType, elems in mesh['MAI'].items():
+            nr = int(elems['NOD'].attrs['NBR'])
+            fam = elems['FAM'][()] if 'FAM' in elems else np.zeros(nr, dtype=np.int64)
+            fam = np.asarray(fam, dtype=np.int64)
+            nod = np.asarray(elems['NOD'][()], dtype=np.int64)
+            if medType in MEDFACES or medType == MEDPOLYGON:
+                self.faceTypes.append((medType, nr))
+                faceNumbers.append(elemNumbers(elems))
+            elif medType in MEDVOLUMES or medType == MEDPOLYHEDRON:
+                self.volumeTypes.append((medType, nr))
+                volumeNumbers.append(elemNumbers(elems))
+            if medType in MEDFACES:
+                corners = nod.reshape((nr, -1), order='F')[:, :MEDFACES[medType]]
+                faces.append((np.full(nr, corners.shape[1], dtype=np.int64),
+                              corners.ravel(), fam))
+            elif medType == MEDPOLYGON:
+                index = np.asarray(elems['INN'][()], dtype=np.int64)
+                faces.append((np.diff(index), nod, fam))
+            elif medType in MEDVOLUMES:
+                nrCorners, localFaces = MEDVOLUMES[medType]
+                corners = nod.reshape((nr, -1), order='F')[:, :nrCorners]
+                lengths = np.array([len(lf) for lf in localFaces], dtype=np.int64)
+                volumes.append((np.full(nr, len(localFaces), dtype=np.int64),
+                                np.tile(lengths, nr),
+                                corners[:, np.concatenate(localFaces)].ravel(),
+                                FaceStore(np.full(nr, nrCorners, dtype=np.int64),
+                                          corners.ravel()), fam))
+            elif medType == MEDPOLYHEDRON:
+                #the face index has one entry per cell, the node index one per face
+                indices = sorted((np.asarray(elems[k][()], dtype=np.int64) for k in elems
+                                  if k not in ('NOD', 'FAM', 'NUM', 'NOM')), key=len)
+                cellNrFaces, faceLengths = np.diff(indices[0]), np.diff(indices[1])
+                volumes.append((cellNrFaces, faceLengths, nod,
+                                cellNodes(cellNrFaces, faceLengths, nod), fam))
+
+        empty = np.zeros(0, dtype=np.int64)
+        self.faceNumbers, self.volumeNumbers = \
+            [None if any(n is None for n in numbers) else np.concatenate(numbers + [empty])
+             for numbers in (faceNumbers, volumeNumbers)]
+        faceLengths = np.concatenate([l for l, n, fam in faces] + [empty])
+        self.faceElems = FaceStore(faceLengths, np.concatenate([n for l, n, fam in faces] +
+                                                               [empty]))
+        self.nrFaceElems = len(faceLengths)
+        self.volumeElems = FaceStore(
+            np.concatenate([v[3].lengths() for v in volumes] + [empty]),
+            np.concatenate([v[3].nodes for v in volumes] + [empty]))
+        cellNrFaces = np.concatenate([v[0] for v in volumes] + [empty])
+        cellFaces = orientCellFaces(self.xyz, cellNrFaces,
+                                    FaceStore(np.concatenate([v[1] for v in volumes] + [empty]),
+                                              np.concatenate([v[2] for v in volumes] + [empty])))
+        self.medCellFaces = (cellNrFaces, cellFaces.lengths(), cellFaces.nodes)
+
+        faceFam = np.concatenate([fam for l, n, fam in faces] + [empty])
+        volumeFam = np.concatenate([v[4] for v in volumes] + [empty])
+        families = dict()
+        fas = f['FAS'][meshName] if 'FAS' in f and meshName in f['FAS'] else dict()
+        if 'ELEME' in fas:
+            for family in fas['ELEME'].values():
+                if 'GRO' in family:
+                    names = [bytes(np.asarray(row, dtype=np.uint8)).rstrip(b'\0')
+                             .decode().strip() for row in family['GRO']['NOM'][()]]
+                    families[int(family.attrs['NUM'])] = names
+        #element families count down from -1 as they are made
+        groupFams = dict()
+        for num, names in sorted(families.items(), key=lambda item: abs(item[0])):
+            for name in names:
+                groupFams.setdefault(name, list()).append(num)
+        self._groups = list()
+        for name, nums in groupFams.items():
+            faceIds = 1 + np.flatnonzero(np.isin(faceFam, nums))
+            volumeIds = 1 + self.nrFaceElems + np.flatnonzero(np.isin(volumeFam, nums))
+            if len(faceIds):
+                self._groups.append((name, FACE, faceIds.tolist()))
+            if len(volumeIds):
+                self._groups.append((name, VOLUME, volumeIds.tolist()))
+
+    def fetchNodes(self):
+        return np.arange(1, len(self.xyz) + 1), self.xyz
+
+    def fetchVolumes(self):
+        first = self.nrFaceElems + 1
+        return np.arange(first, first + len(self.volumeElems))
+
+    def fetchCellFaces(self):
+        return self.medCellFaces
+
+    def fetchFreeFaces(self):
+        #the face elements seen by one volume
+        cellNrFaces, lengths, nodes = self.cellFaces()
+        faces = self.faceElems
+        if len(lengths) == 0 or len(faces) == 0:
+            return np.zeros(0, dtype=np.int64)
+        width = int(max(lengths.max(), faces.lengths().max()))
+        bits = faceMatching.bitsPerNode(len(self.xyz))
+        keys = faceMatching.packKeys(lengths, nodes, bits, width)
+        order, groupId = faceMatching.groupRows(keys)
+        single = keys[order[np.bincount(groupId)[groupId] == 1]]
+        faceKeys = faceMatching.packKeys(faces.lengths(), faces.nodes, bits, width)
+        return 1 + np.flatnonzero(np.isin(faceMatching.rowView(faceKeys),
+                                          faceMatching.rowView(single)))
+
+    def groups(self):
+        return list(self._groups)
+
+    def elemNodes(self, ids):
+        ids = np.asarray(ids, dtype=np.int64)
+        isFace = ids <= self.nrFaceElems
+        if isFace.all():
+            elems = self.faceElems.take(ids - 1)
+        elif not isFace.any():
+            elems = self.volumeElems.take(ids - 1 - self.nrFaceElems)
+        else:
+            elems = FaceStore.fromList([self.faceElems.face(i - 1) if i <= self.nrFaceElems
+                                        else self.volumeElems.face(i - 1 - self.nrFaceElems)
+                                        for i in ids.tolist()])
+        return elems.lengths(), np.asarray(elems.nodes, dtype=np.int64)
+
+    def addGroup(self, name, ids):
+        self._groups.append((name, FACE, list(ids)))
+
+
+def medMeshNames(path):
+    """Return the names of the meshes in a MED file"""
+    if h5py is None:
+        raise ImportError('h5py is needed to read MED files')
+    with h5py.File(path, 'r') as f:
+        return list(f['ENS_MAA'])
+
+
+def elemNumbers(elems):
+    """Return the numbers of the nodes or elements of a MED group, None if it has none"""
+    if 'NUM' not in elems:
+        return None
+    return np.asarray(elems['NUM'][()], dtype=np.int64)
+
+
+def cellNodes(cellNrFaces, faceLengths, faceNodes):
+    """Return the distinct nodes of each cell as a FaceStore"""
+    faceCell = np.repeat(np.arange(len(cellNrFaces)), cellNrFaces)
+    nodeCell = np.repeat(faceCell, faceLengths)
+    width = int(faceNodes.max()) + 1 if len(faceNodes) else 1
+    pairs = np.unique(nodeCell * width + faceNodes)
+    return FaceStore(np.bincount(pairs // width, minlength=len(cellNrFaces)), pairs % width)
+
+
+def orientCellFaces(xyz, cellNrFaces, faces):
+    """
+    Return the faces of the cells turned to point out of their cell,
+    away from the mean of the face centres of the cell. The nodes of
+    faces count from one.
+    """
+    if len(faces) == 0:
+        return faces
+    xyzFaces = FaceStore(faces.lengths(), np.asarray(faces.nodes, dtype=np.int64) - 1)
+    centres = meshGeometry.faceCentres(xyz, xyzFaces)
+    areas = meshGeometry.faceAreas(xyz, xyzFaces, centres)
+    faceCell = np.repeat(np.arange(len(cellNrFaces)), cellNrFaces)
+    cellCentres = np.column_stack([np.bincount(faceCell, centres[:, i],
+                                               minlength=len(cellNrFaces))
+                                   for i in range(3)]) / \
+        np.maximum(cellNrFaces, 1)[:, None]
+    inward = np.einsum('ij,ij->i', areas, centres - cellCentres[faceCell]) < 0.0
+    return faces.flip(np.flatnonzero(inward))
+
+
+def asMeshSource(mesh):
+    """
+    Return mesh as a MeshSource, wrapping Salome meshes and reading
+    MED files given by their path
+    """
+    if isinstance(mesh, MeshSource):
+        return mesh
+    if isinstance(mesh, str) and mesh.lower().endswith('.med'):
+        return MedMeshSource(mesh)
+    return SalomeMeshSource(mesh)
+
+
+def splitFaces(lengths, nodes):
+    """Split flat face nodes into a list of node lists"""
+    nodes = np.asarray(nodes).tolist()
+    ends = np.cumsum(lengths).tolist()
+    return [nodes[e - l:e] for e, l in zip(ends, np.asarray(lengths).tolist())]
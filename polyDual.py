@@ -0,0 +1,286 @@
+"""
+Polyhedral dual of a mesh for the Salome to OpenFOAM exporter.
+
+Like OpenFOAM's polyDualMesh every point of the mesh becomes a cell of
+the dual mesh. A tetrahedral mesh has five to six times more cells than
+points, so its dual is that much smaller, with polyhedral cells of many
+neighbours which usually converge faster.
+    +         points: the cell centres, the centres of the boundary faces,
+                      the middle of the boundary edges and the boundary
+                      points at feature edges and corners
+    + internal faces: one per edge, between the cells of its two points,
+                      through the centres of the cells around the edge.
+                      Boundary edges close the face through the centres
+                      of their two boundary faces and their middle.
+    + boundary faces: one per boundary point and patch, through the
+                      middles of its boundary edges and the centres of its
+                      boundary faces. The edges between patches and where
+                      the boundary bends more than featureAngle split
+                      the face and keep the point as a corner.
+The boundary faces keep the patch of the faces they come from, so the
+groups stay patches.
+
+The faces are walked around each edge and each boundary point by the
+orientation of the faces: the cells around an edge a-b, a < b, in turn
+in the direction of the right hand rule, the dual face then points from
+a to b. So the mesh must have closed cells, boundary faces pointing out
+of it and no baffles. Points on only two edges, e.g. in the middle of
+a straight edge of a polyhedron, give flat cells.
+"""
+
+import numpy as np
+import meshGeometry
+from faceStore import FaceStore
+
+FEATUREANGLE = 60.0 #degrees between boundary faces to keep the edge
+
+
+def meshEdges(faces, nrPoints):
+    """
+    Return the edges of the faces as (edgePoints, slotEdge), the (n, 2)
+    points of each edge, lowest first, and the edge from each face node
+    to the next one.
+    """
+    nodes = np.asarray(faces.nodes, dtype=np.int64)
+    nextNodes = nodes[meshGeometry.nextPositions(faces)]
+    keys = np.minimum(nodes, nextNodes) * nrPoints + np.maximum(nodes, nextNodes)
+    order = np.argsort(keys)
+    sortedKeys = keys[order]
+    isFirst = np.ones(len(keys), dtype=bool)
+    isFirst[1:] = sortedKeys[1:] != sortedKeys[:-1]
+    slotEdge = np.empty(len(keys), dtype=np.int64)
+    slotEdge[order] = np.cumsum(isFirst) - 1
+    edgeKeys = sortedKeys[isFirst]
+    return np.column_stack((edgeKeys // nrPoints, edgeKeys % nrPoints)), slotEdge
+
+
+def chains(nextItem):
+    """
+    Split items into chains following nextItem, -1 ends a chain, and
+    return (order, offsets, closed): the items chain by chain, chain i
+    is order[offsets[i]:offsets[i + 1]], and which chains are closed.
+    The open chains come first, closed chains start at their lowest item.
+    """
+    nrItems = len(nextItem)
+    linked = nextItem >= 0
+    if np.any(np.bincount(nextItem[linked], minlength=nrItems) > 1):
+        raise ValueError('The faces are not oriented consistently')
+    hasPrev = np.zeros(nrItems, dtype=bool)
+    hasPrev[nextItem[linked]] = True
+    starts = np.flatnonzero(~hasPrev)
+
+    #the rest are cycles, found by their lowest item
+    visited = np.zeros(nrItems, dtype=bool)
+    cur = starts
+    while len(cur):
+        visited[cur] = True
+        cur = nextItem[cur]
+        cur = cur[cur >= 0]
+    rest = np.flatnonzero(~visited)
+    label = np.arange(nrItems)
+    changed = len(rest) > 0
+    while changed:
+        lowest = np.minimum(label[rest], label[nextItem[rest]])
+        changed = np.any(lowest != label[rest])
+        label[rest] = lowest
+    cycleStarts = np.flatnonzero(~visited & (label == np.arange(nrItems)))
+
+    #walk all chains a step at a time
+    steps, ids = list(), list()
+    for first, chainIds, closed in ((starts, np.arange(len(starts)), False),
+                                    (cycleStarts, len(starts) + np.arange(len(cycleStarts)),
+                                     True)):
+        cur = first
+        while len(cur):
+            steps.append(cur)
+            ids.append(chainIds)
+            cur = nextItem[cur]
+            keep = (cur != first) if closed else (cur >= 0)
+            cur, first, chainIds = cur[keep], first[keep], chainIds[keep]
+    items = np.concatenate(steps) if steps else np.zeros(0, dtype=np.int64)
+    chainOfItem = np.concatenate(ids) if ids else np.zeros(0, dtype=np.int64)
+    order = items[np.argsort(chainOfItem, kind='stable')]
+    nrChains = len(starts) + len(cycleStarts)
+    offsets = np.zeros(nrChains + 1, dtype=np.int64)
+    np.cumsum(np.bincount(chainOfItem, minlength=nrChains), out=offsets[1:])
+    closed = np.arange(nrChains) >= len(starts)
+    return order, offsets, closed
+
+
+def chainFaces(order, offsets, itemPoints, suffix):
+    """
+    Return a FaceStore with a face per chain: the itemPoints of its items
+    followed by the suffix points for open chains.
+
+    args:
+        +      order, offsets: the chains, see chains
+        +  itemPoints: (nrItems, w) points of each item
+        +      suffix: (nrOpenChains, ws) points closing the open chains
+    """
+    counts = np.diff(offsets)
+    width, suffixWidth = itemPoints.shape[1], suffix.shape[1]
+    isOpen = np.zeros(len(counts), dtype=bool)
+    isOpen[:len(suffix)] = True
+    lengths = width * counts + suffixWidth * isOpen
+    starts = np.cumsum(lengths) - lengths
+    nodes = np.empty(int(lengths.sum()), dtype=np.int64)
+    chainOfItem = np.repeat(np.arange(len(counts)), counts)
+    pos = starts[chainOfItem] + width * (np.arange(len(order)) - offsets[chainOfItem])
+    for j in range(width):
+        nodes[pos + j] = itemPoints[order, j]
+    pos = starts[:len(suffix)] + width * counts[:len(suffix)]
+    for j in range(suffixWidth):
+        nodes[pos + j] = suffix[:, j]
+    return FaceStore(lengths, nodes)
+
+
+def dualMesh(xyz, faces, owner, neighbour, nrCells, patchNrFaces, zones=(),
+             featureAngle=FEATUREANGLE):
+    """
+    Return the polyhedral dual of a mesh.
+
+    args:
+        +          xyz: (n, 3) coordinates of the points
+        +        faces: FaceStore counting from zero, internal faces then
+                        the boundary faces patch by patch
+        + owner, neighbour: the cells of the faces
+        + patchNrFaces: number of faces of each patch
+        +        zones: (name, cell ids) of the cell zones, a point is in
+                        the zone of the dual if all its cells are
+        + featureAngle: boundary edges bending more than this many
+                        degrees are kept as edges of the dual
+
+    returns (xyz, faces, owner, neighbour, patchNrFaces, zones) of the
+    dual mesh, its faces are not ordered, see meshOrdering.orderFaces.
+    Cell i of the dual is point i of the mesh.
+    """
+    xyz = np.asarray(xyz, dtype=np.float64)
+    owner = np.asarray(owner, dtype=np.int64)
+    neighbour = np.asarray(neighbour, dtype=np.int64)
+    nrPoints = len(xyz)
+    nrIntFaces = len(neighbour)
+    nrBFaces = len(faces) - nrIntFaces
+    nodes = np.asarray(faces.nodes, dtype=np.int64)
+    nextPos = meshGeometry.nextPositions(faces)
+    prevPos = np.empty_like(nextPos)
+    prevPos[nextPos] = np.arange(len(nextPos))
+    slotFace = np.repeat(np.arange(len(faces)), faces.lengths())
+    edgePoints, slotEdge = meshEdges(faces, nrPoints)
+    nrEdges = len(edgePoints)
+    forward = nodes < nodes[nextPos]
+
+    #the two boundary face nodes on each boundary edge
+    bSlots = np.flatnonzero(slotFace >= nrIntFaces)
+    bSlots = bSlots[np.argsort(slotEdge[bSlots], kind='stable')]
+    nrOnEdge = np.bincount(slotEdge[bSlots], minlength=nrEdges)
+    if np.any((nrOnEdge != 0) & (nrOnEdge != 2)):
+        raise ValueError('%d edges are not on two boundary faces, the dual needs a mesh '
+                         'without baffles' % np.count_nonzero((nrOnEdge != 0) & (nrOnEdge != 2)))
+    otherSlot = np.full(len(nodes), -1, dtype=np.int64)
+    otherSlot[bSlots[0::2]] = bSlots[1::2]
+    otherSlot[bSlots[1::2]] = bSlots[0::2]
+    bEdges = slotEdge[bSlots[0::2]]
+    bEdgeIndex = np.full(nrEdges, -1, dtype=np.int64)
+    bEdgeIndex[bEdges] = np.arange(len(bEdges))
+
+    #the points of the dual
+    centres, areas = meshGeometry.faceCentresAndAreas(xyz, faces)
+    cellCentres = meshGeometry.cellCentresAndVolumes(centres, areas, owner, neighbour,
+                                                     nrCells)[0]
+    faceBase = nrCells - nrIntFaces #point of boundary face f is faceBase + f
+    edgeBase = nrCells + nrBFaces
+    pointBase = edgeBase + len(bEdges)
+    dualXyz = np.concatenate((cellCentres, centres[nrIntFaces:],
+                              0.5 * (xyz[edgePoints[bEdges, 0]] + xyz[edgePoints[bEdges, 1]]),
+                              xyz))
+
+    #the cells around each edge, one item per cell and edge with the face
+    #it is left through turning around the edge, the other face it is
+    #entered through
+    slots = np.arange(len(nodes))
+    intSlots = slots[slotFace < nrIntFaces]
+    tEdge = np.concatenate((slotEdge, slotEdge[intSlots]))
+    tCell = np.concatenate((owner[slotFace], neighbour[slotFace[intSlots]]))
+    tFace = np.concatenate((slotFace, slotFace[intSlots]))
+    tExit = np.concatenate((forward, ~forward[intSlots]))
+    keys = tEdge * nrCells + tCell
+    order = np.argsort(keys, kind='stable')
+    keys, tFace, tExit = keys[order], tFace[order], tExit[order]
+    if len(keys) % 2 or np.any(keys[0::2] != keys[1::2]) or np.any(tExit[0::2] == tExit[1::2]) \
+            or np.any(keys[2::2] == keys[1:-1:2]):
+        raise ValueError('The cells are not closed or the faces are not oriented consistently')
+    itemKeys = keys[0::2]
+    itemEdge, itemCell = itemKeys // nrCells, itemKeys % nrCells
+    itemExit = np.where(tExit[0::2], tFace[0::2], tFace[1::2])
+    itemEntry = np.where(tExit[0::2], tFace[1::2], tFace[0::2])
+    internal = itemExit < nrIntFaces
+    exitFace = itemExit[internal]
+    nextCell = np.where(owner[exitFace] == itemCell[internal], neighbour[exitFace],
+                        owner[exitFace])
+    nextItem = np.full(len(itemKeys), -1, dtype=np.int64)
+    nextItem[internal] = np.searchsorted(itemKeys, itemEdge[internal] * nrCells + nextCell)
+    order, offsets, closed = chains(nextItem)
+    nrOpen = len(closed) - np.count_nonzero(closed)
+    #open chains go from the boundary face entered to the one left
+    first, last = order[offsets[:nrOpen]], order[offsets[1:nrOpen + 1] - 1]
+    edgeOfChain = itemEdge[order[offsets[:-1]]]
+    suffix = np.column_stack((faceBase + itemExit[last], edgeBase + bEdgeIndex[edgeOfChain[:nrOpen]],
+                              faceBase + itemEntry[first]))
+    intFaces = chainFaces(order, offsets, itemCell[:, None], suffix)
+    intOwner, intNeighbour = edgePoints[edgeOfChain, 0], edgePoints[edgeOfChain, 1]
+
+    #the boundary faces around each boundary point, one item per boundary
+    #face and point, turning across the edge to the previous point unless
+    #it is a feature edge
+    patchStarts = nrIntFaces + np.cumsum(patchNrFaces) - patchNrFaces
+    facePatch = np.searchsorted(patchStarts, np.arange(nrIntFaces, len(faces)), 'right') - 1
+    faceA, faceB = slotFace[bSlots[0::2]] - nrIntFaces, slotFace[bSlots[1::2]] - nrIntFaces
+    cosAngle = np.einsum('ij,ij->i', areas[nrIntFaces + faceA], areas[nrIntFaces + faceB]) / \
+        np.maximum(np.linalg.norm(areas[nrIntFaces + faceA], axis=1) *
+                   np.linalg.norm(areas[nrIntFaces + faceB], axis=1), 1e-300)
+    feature = np.zeros(nrEdges, dtype=bool)
+    feature[bEdges] = (facePatch[faceA] != facePatch[faceB]) | \
+        (cosAngle < np.cos(np.radians(featureAngle)))
+    kites = slots[slotFace >= nrIntFaces]
+    prevSlot = prevPos[kites]
+    turn = otherSlot[prevSlot]
+    if np.any(nodes[turn] != nodes[kites]):
+        raise ValueError('The boundary faces are not oriented consistently')
+    kiteIndex = np.full(len(nodes), -1, dtype=np.int64)
+    kiteIndex[kites] = np.arange(len(kites))
+    nextKite = np.where(feature[slotEdge[prevSlot]], -1, kiteIndex[turn])
+    order, offsets, closed = chains(nextKite)
+    nrOpen = len(closed) - np.count_nonzero(closed)
+    last = kites[order[offsets[1:nrOpen + 1] - 1]]
+    kitePoints = np.column_stack((edgeBase + bEdgeIndex[slotEdge[kites]],
+                                  faceBase + slotFace[kites]))
+    suffix = np.column_stack((edgeBase + bEdgeIndex[slotEdge[prevPos[last]]],
+                              pointBase + nodes[last]))
+    bFaces = chainFaces(order, offsets, kitePoints, suffix)
+    firstKite = kites[order[offsets[:-1]]]
+    bOwner = nodes[firstKite]
+    bPatch = facePatch[slotFace[firstKite] - nrIntFaces]
+    byPatch = np.argsort(bPatch, kind='stable')
+
+    #drop the points of the mesh which are not corners
+    dualFaces = intFaces.concatenate(bFaces.take(byPatch))
+    used = np.zeros(len(dualXyz), dtype=bool)
+    used[dualFaces.nodes] = True
+    newId = np.cumsum(used) - 1
+    dualFaces = FaceStore(dualFaces.lengths(), newId[dualFaces.nodes])
+    dualZones = list()
+    if len(zones):
+        #the points of each cell, from the cells around the edges
+        pairs = np.sort(np.concatenate((edgePoints[itemEdge, 0] * nrCells + itemCell,
+                                        edgePoints[itemEdge, 1] * nrCells + itemCell)))
+        pairs = pairs[np.concatenate(([True], pairs[1:] != pairs[:-1]))]
+        pairPoint, pairCell = pairs // nrCells, pairs % nrCells
+        nrPointCells = np.bincount(pairPoint, minlength=nrPoints)
+        for name, cellIds in zones:
+            inZone = np.zeros(nrCells, dtype=bool)
+            inZone[np.asarray(cellIds, dtype=np.int64)] = True
+            nrInZone = np.bincount(pairPoint, inZone[pairCell], minlength=nrPoints)
+            dualZones.append((name, np.flatnonzero((nrInZone == nrPointCells) &
+                                                   (nrPointCells > 0)).tolist()))
+    return (dualXyz[used], dualFaces, np.concatenate((intOwner, bOwner[byPatch])),
+            intNeighbour, np.bincount(bPatch, minlength=len(patchNrFaces)).tolist(), dualZones)
@@ -4,18 +4,71 @@ Export a Salome Mesh to OpenFOAM.
 It handles all types of cells. Use 
 salomeToOpenFOAM.exportToFoam(Mesh_1) 
 to export. Optionally an output dir can be given as argument.
+Instead of a Salome mesh any meshSource.MeshSource can be exported,
+e.g. a meshSource.ArrayMeshSource which works without Salome, or
+the path of a MED file which is then read with h5py, e.g.
+salomeToOpenFOAM.exportToFoam('Mesh_1.med', 'case/constant/polyMesh')
 
 It's also possible to select a mesh in the object browser and
 run the script via file->load script (ctrl-T).
+Meshes in med, unv or hdf files can be exported without the GUI,
+many at a time, with foamBatch.py.
 
 Groups of volumes will be treated as cellZones. If they are 
 present they will be put in the file cellZones. In order to convert
 to regions use the OpenFOAM tool 
 splitMeshRegions - cellZones
 
-No sorting of faces is done so you'll have to run
-renumberMesh -overwrite
-In order to use the mesh.
+The faces are put in upper triangular order and the boundary faces
+are sorted within each patch, see meshOrdering, so the mesh can be
+used without running renumberMesh. With renumber=True the cells are
+also renumbered with reverse Cuthill-McKee to reduce the bandwidth.
+
+The faces can be matched either with python dictionaries (engine='dict',
+the default) or with sorted numpy arrays (engine='numpy') which is much
+faster on large meshes. Both give identical files, e.g.
+salomeToOpenFOAM.exportToFoam(Mesh_1, engine='numpy')
+The numpy engine can spread the matching over processes with nrProcs.
+
+With format='binary' the files points, faces, owner and neighbour are
+written in OpenFOAM binary format (optionally with labelSize=64),
+which is much faster to write and read for large meshes.
+
+With decompose=N the mesh is also written decomposed for a parallel
+run, as processor0..processorN-1 next to constant, see foamDecompose.
+Fields still have to be decomposed with decomposePar -fields.
+
+With incremental=True a later export of the same mesh, where only the
+groups changed, rewrites just the boundary part of the files instead of
+walking all cells again, see exportCache.
+
+With quality=True the checkMesh metrics (non-orthogonality, skewness,
+aspect ratio, face areas and cell volumes) are computed during the
+export and written to <dirname>.quality.json/.csv, see meshQuality.
+exportToFoam then returns the report, report['failed'] lists the
+metrics beyond the checkMesh limits. An incremental export that only
+rewrites the boundary returns the report saved by the previous export.
+
+With compress=True the files are written gzip compressed, as
+points.gz etc., which OpenFOAM reads as they are. Each file is
+compressed in its own thread while the next one is formatted.
+
+The files are written by a pool of threads: points as soon as the
+nodes are fetched, while the faces are matched, and the other files
+side by side once the faces are ordered.
+
+The time, cpu time, peak memory and SMESH calls of each stage of the
+export are recorded, see exportProfile. With profile=True they are
+written to <dirname>.profile.json and profileCallback is called with
+each stage as it finishes.
+
+With dual=True the mesh is converted to its polyhedral dual like
+OpenFOAM's polyDualMesh, a cell around each point, see polyDual. A
+tetrahedral mesh then gives several times fewer cells. The groups stay
+patches, cellZones keep the points whose cells are all in the zone.
+
+An exported mesh can be read back and checked with foamReader, e.g.
+python foamReader.py case/constant/polyMesh
 """
 #Copyright 2019
 #Author Nicolas Edh,
@@ -43,61 +96,64 @@ In order to use the mesh.
 #
 
 import sys
-import salome
-import SMESH
-from salome.smesh import smeshBuilder
+try:
+    import salome
+    import SMESH
+    from salome.smesh import smeshBuilder
+except ImportError:
+    salome = None #only meshSource.ArrayMeshSource can be exported
 import os, time
+import concurrent.futures
+import numpy as np
+import boundaryFaces
+import exportCache
+import exportProfile
+import faceMatching
+import faceStore
+import foamDecompose
+import foamWriter
+import meshGeometry
+import meshOrdering
+import meshQuality
+import meshSource
+import polyDual
+from foamWriter import writeHeader
 
 debug = 1      # Print Verbosity (0=silent => 3=chatty)
-verify = False # Verify face order, might take longer time
-
-#Note: to skip renumberMesh just sort owner 
-#while moving positions also move neighbour,faces, and bcfaces
-#will probably have to first sort the internal faces then bc-faces within each bc
-
-class MeshBuffer(object):
-    """
-    Limits the calls to Salome by buffering the face and key details of volumes to speed up exporting
-    """
-    
-    def __init__(self, mesh, v):
-        i = 0
-        faces = list()
-        keys = list()
-        fnodes = mesh.GetElemFaceNodes(v, i)
-
-        while fnodes:                           #While not empty list
-            faces.append(fnodes)                #Face list
-            keys.append(tuple(sorted(fnodes)))  #Buffer key
-            i += 1
-            fnodes=mesh.GetElemFaceNodes(v, i)
-        
-        self.v = v         #The volume
-        self.faces = faces #The sorted face list
-        self.keys = keys
-        self.fL = i        #The number of faces
-    
-    @staticmethod
-    def Key(fnodes):
-        """Takes the nodes and compresses them into a hashable key"""
-        return tuple(sorted(fnodes))
-    
-    @staticmethod
-    def ReverseKey(fnodes):
-        """Takes the nodes and compresses them into a hashable key reversed for baffles"""
-        if type(fnodes) is tuple:
-            return tuple(reversed(fnodes))
-        else:
-            return tuple(sorted(fnodes, reverse=True)) 
-
-
-def exportToFoam(mesh, dirname='polyMesh'):
+verify = False # Verify face order and flip faces pointing into their owner
+nrWriters = 6  # Number of threads writing files
+MESHFILES = ('points', 'faces', 'owner', 'neighbour', 'boundary') # files opened up front
+
+def exportToFoam(mesh, dirname='polyMesh', engine='dict', format='ascii', labelSize=32,
+                 chunkSize=foamWriter.CHUNKSIZE, renumber=False, nrProcs=1,
+                 decompose=0, decomposeMethod='simple', incremental=False, quality=False,
+                 compress=False, profile=False, profileCallback=None, dual=False):
     """
     Export a mesh to OpenFOAM.
     
     args: 
-        +    mesh: The mesh
+        +    mesh: The mesh, a Salome mesh, a meshSource.MeshSource or
+                   the path of a MED file
         + dirname: The mesh directory to write to
+        +  engine: 'dict' to match faces with dictionaries or 'numpy' to
+                   match them with sorted arrays, see faceMatching
+        +  format: 'ascii' or 'binary' points, faces, owner and neighbour
+        + labelSize: 32 or 64 bit labels in binary format
+        + chunkSize: number of entries formatted per write in ascii format
+        + renumber: renumber the cells with reverse Cuthill-McKee
+        + nrProcs: number of processes matching faces, engine='numpy' only
+        + decompose: also write processor0..N-1 directories with this many
+                   subdomains, see foamDecompose
+        + decomposeMethod: 'simple' or 'graph' partitioning of the cells
+        + incremental: keep the state of the export next to dirname and only
+                   rewrite the boundary when just the groups changed,
+                   see exportCache
+        + quality: compute the mesh quality report, see meshQuality
+        + compress: write gzip compressed files, see foamWriter.openFile
+        + profile: write the stage timings to <dirname>.profile.json,
+                   see exportProfile
+        + profileCallback: called with the record of each stage
+        +    dual: write the polyhedral dual of the mesh, see polyDual
     
     The algorithm works as follows:
     [1] Loop through the boundaries and collect all faces in each group.
@@ -110,512 +166,539 @@ def exportToFoam(mesh, dirname='polyMesh'):
             If not a boundary face and has not yet been visited add it to the list of internal faces. 
     
     To check if a face has been visited a dictionary is used. 
-    The key is the sorted list of face nodes converted to a string.
+    The key is the sorted list of face nodes packed into an integer.
     The value is the face id. Eg: facesSorted[key] = value
+    With engine='numpy' step [2] is done in bulk by faceMatching.matchFaces
     """
+    if engine not in ('dict', 'numpy'):
+        raise ValueError('Unknown engine %s, use dict or numpy' % engine)
+    if nrProcs > 1 and engine != 'numpy':
+        raise ValueError('nrProcs > 1 needs engine numpy')
+    if format not in ('ascii', 'binary'):
+        raise ValueError('Unknown format %s, use ascii or binary' % format)
+    if decompose > 1 and decomposeMethod not in foamDecompose.METHODS:
+        raise ValueError('Unknown decomposeMethod %s, use %s' \
+                             % (decomposeMethod, ' or '.join(foamDecompose.METHODS)))
+    if incremental and compress:
+        raise ValueError('incremental can\'t rewrite compressed files, use one of them')
+    if incremental and dual:
+        raise ValueError('incremental can\'t rewrite the dual mesh, use one of them')
+    foamWriter.labelType(labelSize) #check the label size
     starttime=time.time()
+    source = meshSource.asMeshSource(mesh)
+    prof = exportProfile.ExportProfile(source.calls, profileCallback)
+    prof.info = dict(mesh=source.GetName(), dirname=os.path.abspath(dirname),
+                     options=dict(engine=engine, format=format, labelSize=labelSize,
+                                  renumber=bool(renumber), nrProcs=nrProcs,
+                                  decompose=decompose, incremental=bool(incremental),
+                                  quality=bool(quality), compress=bool(compress),
+                                  dual=bool(dual)))
+
+    #a previous export of the same mesh might be reused
+    state = None
+    if incremental:
+        #with quality the state was saved with the report of the mesh
+        options = (format, labelSize, bool(renumber), bool(quality))
+        prof.start('fingerprint')
+        fingerprint = source.fingerprint()
+        prof.stop('fingerprint')
+        if decompose <= 1:
+            state = exportCache.loadState(dirname, fingerprint, options)
+        if state is not None and quality:
+            report = meshQuality.readReport(os.path.abspath(dirname) + '.quality')
+            if report is None:
+                state = None
+        if state is not None:
+            debugPrint('The mesh is unchanged since the last export\n', 1)
+
     #try to open files
-    if not os.path.exists(dirname):
-        os.makedirs(dirname)
+    meshFiles = None
+    if state is None:
+        meshFiles = openMeshFiles(dirname, compress)
+        if meshFiles is None:
+            return
+
+    #close and remove the mesh files if the export fails before they are written
+    writers = None
+    written = dict()
     try:
-        filePoints = open(dirname + '/points', 'w')
-        fileFaces = open(dirname + '/faces', 'w')
-        fileOwner = open(dirname + '/owner', 'w')
-        fileNeighbour = open(dirname + '/neighbour', 'w')
-        fileBoundary = open(dirname + '/boundary', 'w')
-    except Exception:
-        print('could not open files aborting')
-        return
-
-    #Get salome properties
-    smesh = smeshBuilder.New()
-
-    debugPrint('Number of nodes: %d\n' %(mesh.NbNodes()))
-    volumes=mesh.GetElementsByType(SMESH.VOLUME)
-    debugPrint('Number of cells: %d\n' %len(volumes))
-    debugPrint('Counting number of faces:\n')
-
-    #Filter faces
-    filter = smesh.GetFilter(SMESH.EDGE, SMESH.FT_FreeFaces)
-    extFaces = set(mesh.GetIdsFromFilter(filter))
-    nrBCfaces = len(extFaces)
-    nrExtFaces = len(extFaces)
-    buffers=list()
-    nrFaces = 0
-
-    for v in volumes:
-        b = MeshBuffer(mesh, v) 
-        nrFaces += b.fL
-        buffers.append(b)
-
-    #all internal faces will be counted twice, external faces once
-    #so:
-    nrFaces = int((nrFaces + nrExtFaces) / 2)
-    nrIntFaces = int(nrFaces - nrBCfaces)
-    debugPrint('total number of faces: %d, internal: %d, external %d\n'  \
-        %(nrFaces, nrIntFaces, nrExtFaces))
-
-    debugPrint('Converting mesh to OpenFOAM\n')
-    faces = [] #list of internal face nodes ((1 2 3 4 ... ))
-    facesSorted = dict() #each list of nodes is sorted.
-    bcFaces = [] #list of bc faces
-    bcFacesSorted = dict()
-    owner = [] #owner file, (of face id, volume id)
-    neighbour = [] #neighbour file (of face id, volume id) only internal faces
-
-    #Loop over all salome boundary elemets (faces) 
-    # and store them inte the list bcFaces
-    grpStartFace = [] # list of face ids where the BCs starts
-    grpNrFaces = [] # list of number faces in each BC
-    grpNames = [] #list of the group name.
-    ofbcfid = 0   # bc face id in openfoam
-    nrExtFacesInGroups = 0
-
-    for gr in mesh.GetGroups():
-        if gr.GetType() == SMESH.FACE:
-            grpNames.append(gr.GetName())
-            debugPrint('found group \"%s\" of type %s, %d\n' \
-                           %(gr.GetName(), gr.GetType(), len(gr.GetIDs())), 2)
-            grIds = gr.GetIDs()
-            nr = len(grIds)
-            if nr > 0:
-                grpStartFace.append(nrIntFaces+ofbcfid)
-                grpNrFaces.append(nr)
-
-            #loop over faces in group
-            for sfid in grIds:
-                fnodes = mesh.GetElemNodes(sfid)
-                key = MeshBuffer.Key(fnodes)
-                if not key in bcFacesSorted:
-                    bcFaces.append(fnodes)
-                    bcFacesSorted[key] = ofbcfid
-                    ofbcfid += 1
-                else:
-                    raise Exception(\
-                        'Error the face, elemId %d, %s belongs to two ' % (sfid, fnodes)  +\
-                            'or more groups. One is : %s'  % (gr.GetName()))
-
-            #if the group is a baffle then the faces should be added twice
-            if isGroupBaffle(mesh, gr, extFaces, grIds):
-                nrBCfaces += nr
-                nrFaces += nr
-                nrIntFaces -= nr
-                #since nrIntFaces is reduced all previously grpStartFaces are 
-                #out of sync
-                grpStartFace = [x - nr for x in grpStartFace]
-                grpNrFaces[-1] = nr*2
-                for sfid in gr.GetIDs():
-                    fnodes = mesh.GetElemNodes(sfid)
-                    key = MeshBuffer.ReverseKey(fnodes)
-                    bcFaces.append(fnodes)
-                    bcFacesSorted[key] = ofbcfid
-                    ofbcfid += 1
-            else:
-                nrExtFacesInGroups += nr
-
-    debugPrint('total number of faces: %d, internal: %d, external %d\n'  \
-        %(nrFaces, nrIntFaces, nrExtFaces), 2)
-    #Do the defined groups cover all BC-faces?
-    if nrExtFacesInGroups < nrExtFaces:
-        debugPrint('Warning, some elements don\'t have a group (BC). ' +\
-                       'Adding to a new group called defaultPatches\n', 1)
-        grpStartFace.append(nrIntFaces + ofbcfid)
-        grpNrFaces.append(nrExtFaces - nrExtFacesInGroups)
-        salomeIDs = []
-        for face in extFaces:
-            fnodes = mesh.GetElemNodes(face)
-            key = MeshBuffer.Key(fnodes)
-            try:
-                bcFacesSorted[key]
-            except KeyError:
-                #if not in dict then add to default patches
-                bcFaces.append(fnodes)
-                bcFacesSorted[key] = ofbcfid
-                salomeIDs.append(face)
-                ofbcfid += 1
-        newGrpName = 'defaultPatches'
-        nri = 1
-        while newGrpName in grpNames:
-            newGrpName = "defaultPatches_%d" % nri
-            nri += 1
-        grpNames.append(newGrpName)
-        #function might have different name
-        try:
-            defGroup = mesh.CreateGroup(SMESH.FACE, newGrpName)
-        except AttributeError:
-            defGroup = mesh.CreateEmptyGroup(SMESH.FACE, newGrpName)
-
-        defGroup.Add(salomeIDs)
-        smesh.SetName(defGroup, newGrpName)
-
-        if salome.sg.hasDesktop():
-            if sys.version_info.major < 3:
-                salome.sg.updateObjBrowser(1)
-            else:
-                salome.sg.updateObjBrowser()
-
-    #initialise the list faces vs owner/neighbour cells
-    owner = [-1] * nrFaces
-    neighbour = [-1] * nrIntFaces
-    debugPrint('Finished processing boundary faces\n')
-    debugPrint('bcFaces: %d\n' % len(bcFaces), 2)
-    debugPrint(str(bcFaces) + '\n', 3)
-    debugPrint('bcFacesSorted: %d\n' % len(bcFacesSorted), 2)
-    debugPrint(str(bcFacesSorted) + '\n', 3)
-    debugPrint('owner: %d\n' % len(owner), 2)
-    debugPrint(str(owner) + '\n', 3)
-    debugPrint('neighbour: %d\n' % len(neighbour), 2)
-    debugPrint(str(neighbour) + '\n', 3)
-
-
-    offid = 0
-    ofvid = 0 #volume id in openfoam
-    for b in buffers:
+        #Get all mesh data in one go
+        prof.start('fetch')
+        nodeIds, xyz = source.nodes()
+
+        debugPrint('Number of nodes: %d\n' %(len(nodeIds)))
+        volumes = source.volumes().tolist()
+        debugPrint('Number of cells: %d\n' %len(volumes))
+        debugPrint('Counting number of faces:\n')
+
+        #Filter faces
+        nrExtFaces = len(np.unique(source.freeFaces()))
+        nrBCfaces = nrExtFaces
+        #the faces of all cells in flat arrays, see faceStore
+        if state is None:
+            cells = cellFaceStore(source)
+            nrFaces = len(cells.faces)
+        else:
+            nrFaces = int(state['nrCellFaces'])
+        nrCellFaces = nrFaces
+        prof.stop('fetch', len(volumes))
+        bits = faceMatching.bitsPerNode(nodeIds.max() if len(nodeIds) else 0)
+
+        #all internal faces will be counted twice, external faces once
+        #so:
+        nrFaces = int((nrFaces + nrExtFaces) / 2)
+        nrIntFaces = int(nrFaces - nrBCfaces)
+        debugPrint('total number of faces: %d, internal: %d, external %d\n'  \
+            %(nrFaces, nrIntFaces, nrExtFaces))
+
+        debugPrint('Converting mesh to OpenFOAM\n')
+        faces = [] #list of internal face nodes ((1 2 3 4 ... ))
+        facesSorted = dict() #each list of nodes is sorted.
+        owner = [] #owner file, (of face id, volume id)
+        neighbour = [] #neighbour file (of face id, volume id) only internal faces
+
+        #Sort the salome boundary elements (faces) into patches,
+        #see boundaryFaces
+        prof.start('boundary')
+        boundary = boundaryFaces.classifyBoundaryFaces(source, bits)
+        prof.stop('boundary', len(boundary['faces']))
+        debugPrint('Classified boundary faces in %.2fs (fetch %.2fs, baffles %.2fs, '
+                   'unassigned %.2fs)\n' % ((sum(boundary['timings'].values()),) + \
+                       tuple(boundary['timings'][k]
+                             for k in ('fetch', 'baffles', 'unassigned'))), 1)
+        bcFaces = boundary['faces'] #the bc faces, baffles twice
+        bcPartner = boundary['partner'] #slot of the reversed copy of baffle faces
+        grpNames = [] #list of the group name.
+        grpNrFaces = [] # list of number faces in each BC
+        for (grName, grIds), (firstSlot, nr) in zip(boundary['patches'], boundary['slots']):
+            debugPrint('found group \"%s\", %d\n' %(grName, len(grIds)), 2)
+            grpNames.append(grName)
+            grpNrFaces.append(nr)
+        for grName in boundary['baffles']:
+            debugPrint('group %s is a baffle\n' % grName, 1)
+        if dual and boundary['baffles']:
+            raise ValueError('The dual needs a mesh without baffles, %s are baffles' \
+                                 % ', '.join(boundary['baffles']))
+
+        #the baffle faces are added twice
+        nrBaffleFaces = int(np.count_nonzero(bcPartner == -2))
+        nrBCfaces += nrBaffleFaces
+        nrFaces += nrBaffleFaces
+        nrIntFaces -= nrBaffleFaces
+        # list of face ids where the BCs starts
+        grpStartFace = [nrIntFaces + firstSlot for firstSlot, nr in boundary['slots']]
+
+        debugPrint('total number of faces: %d, internal: %d, external %d\n'  \
+            %(nrFaces, nrIntFaces, nrExtFaces), 2)
+        #Do the defined groups cover all BC-faces?
+        if len(boundary['unassigned']) > 0:
+            debugPrint('Warning, some elements don\'t have a group (BC). ' +\
+                           'Adding to a new group called %s\n' % grpNames[-1], 1)
+            source.addGroup(grpNames[-1], boundary['unassigned'].tolist())
+
+        if state is not None:
+            bc = exportCache.matchBoundary(state, bcFaces, bcPartner, bits)
+            if bc is not None and nrIntFaces == int(state['meshSize'][3]):
+                debugPrint('Only the groups changed, rewriting the boundary\n', 1)
+                prof.start('rewrite')
+                bcFaces, bcOwner = bc
+                startFaces = [start - nrIntFaces for start in grpStartFace]
+                order = meshOrdering.patchOrder(bcOwner, startFaces, grpNrFaces)
+                bcStore = faceStore.FaceStore(bcFaces.lengths(), bcFaces.nodes - 1)
+                exportCache.rewriteBoundary(dirname, state, bcStore.take(order), bcOwner[order],
+                                            format, labelSize, chunkSize)
+                with foamWriter.openFile(dirname + '/boundary') as fileBoundary:
+                    foamWriter.writeBoundary(fileBoundary, boundaryPatches(grpNames, grpNrFaces,
+                                                                           grpStartFace))
+                writeCellZones(dirname, cellZones(source, volumes, state['cellIds']))
+                prof.stop('rewrite', len(bcFaces))
+                finishProfile(prof, profile, dirname, state['meshSize'])
+                debugPrint('Total time: %0.fs\n' % (time.time() - starttime), 1)
+                if quality:
+                    printQuality(report)
+                    return report
+                return
+            debugPrint('The boundary faces changed, exporting the whole mesh\n', 1)
+            state = None
+            meshFiles = openMeshFiles(dirname, compress)
+            if meshFiles is None:
+                return
+            cells = cellFaceStore(source)
+        filePoints, fileFaces, fileOwner, fileNeighbour, fileBoundary = meshFiles
+
+        #WRITE points to file, they only need the nodes so they are written
+        #while the faces are matched, the points of the dual once it is built
+        writers = concurrent.futures.ThreadPoolExecutor(max_workers=nrWriters)
+        if not dual:
+            debugPrint('Writing the file points\n')
+            written['points'] = writers.submit(prof.call, 'write points', len(xyz), writeFile,
+                                               filePoints, foamWriter.writePoints,
+                                               xyz, format, labelSize, chunkSize)
+        prof.start('matching')
+
+        #initialise the list faces vs owner/neighbour cells
+        owner = [-1] * nrFaces
+        neighbour = [-1] * nrIntFaces
+        debugPrint('Finished processing boundary faces\n')
+        debugPrint('bcFaces: %d\n' % len(bcFaces), 2)
+        debugPrint(str(bcFaces.tolist()) + '\n', 3)
+        debugPrint('owner: %d\n' % len(owner), 2)
+        debugPrint(str(owner) + '\n', 3)
+        debugPrint('neighbour: %d\n' % len(neighbour), 2)
+        debugPrint(str(neighbour) + '\n', 3)
+
+
+        offid = 0
+        ofvid = 0 #volume id in openfoam
+        if engine == 'numpy':
+            faces, owner, neighbour = faceMatching.matchFaces(
+                cells.faces, cells.faceCells(), bcFaces, bcPartner, nrIntFaces, bits, nrProcs)
+            ofvid = len(volumes)
+        else:
+            #the bc faces by key, the reversed copies of baffles by -key
+            bcFaces = bcFaces.tolist()
+            bcFacesSorted = dict()
+            for slot, fnodes in enumerate(bcFaces):
+                key = faceMatching.packKey(fnodes, bits)
+                bcFacesSorted[-key if bcPartner[slot] == -2 else key] = slot
+            debugPrint('bcFacesSorted: %d\n' % len(bcFacesSorted), 2)
+            debugPrint(str(bcFacesSorted) + '\n', 3)
+            #python lists are faster to slice face by face
+            faceNodes = cells.faces.nodes.tolist()
+            faceOffsets = cells.faces.offsets.tolist()
+            cellOffsets = cells.cellOffsets.tolist()
+
+        for v in (volumes if engine == 'dict' else []):
         
-        if debug > 2: #Salome call only if verbose
-            nodes = mesh.GetElemNodes(b.v)
-            debugPrint('volume id: %d, num nodes %d, nodes:%s \n' %(b.v, len(nodes), nodes), 3)
+            if debug > 2: #Salome call only if needed
+                nodes = meshSource.splitFaces(*source.elemNodes([v]))[0]
+                debugPrint('volume id: %d, num nodes %d, nodes:%s \n' %(v, len(nodes), nodes), 3)
         
-        fi = 0 #Face index
-        while fi < b.fL:
-            fnodes = b.faces[fi]
-            key = b.keys[fi]
-            #Check if the node is already in list
-            try:
-                fidinof = facesSorted[key]
-                #if faceSorted didn't throw an exception then the face is 
-                #already in the dict. Its an internal face and should be added 
-                # to the neighbour list
-                #print('fidinof %d' % fidinof)
-                neighbour[fidinof] = ofvid
-                debugPrint('\tan owner already exist for %d, %s, cell %d\n' %(fi, fnodes, ofvid), 3)
-            except KeyError:
-                #the face is not in the list of internal faces
-                #it might a new face or a BCface.
+            for fi in range(cellOffsets[ofvid], cellOffsets[ofvid + 1]):
+                fnodes = faceNodes[faceOffsets[fi]:faceOffsets[fi + 1]]
+                key = faceMatching.packKey(fnodes, bits)
+                #Check if the node is already in list
                 try:
-                    bcind = bcFacesSorted[key]
-                    #if no exception was trown then it's a bc face
-                    debugPrint('\t found bc face: %d, %s, cell %d\n' %(bcind, fnodes, ofvid), 3)
-                    #if the face belongs to a baffle then it exits twice in owner
-                    #check dont overwrite owner
-                    if owner[nrIntFaces + bcind] == -1:
-                        owner[nrIntFaces + bcind] = ofvid
-                        bcFaces[bcind] = fnodes
-                    else:
-                        #build functions that looks for baffles in bclist. with bcind
-                        key = MeshBuffer.ReverseKey(fnodes)
-                        bcind = bcFacesSorted[key]
-                        #make sure the faces has the correct orientation
-                        bcFaces[bcind] = fnodes
-                        owner[nrIntFaces + bcind] = ofvid
+                    fidinof = facesSorted[key]
+                    #if faceSorted didn't throw an exception then the face is 
+                    #already in the dict. Its an internal face and should be added 
+                    # to the neighbour list
+                    #print('fidinof %d' % fidinof)
+                    neighbour[fidinof] = ofvid
+                    debugPrint('\tan owner already exist for %d, %s, cell %d\n' \
+                                   %(fi, fnodes, ofvid), 3)
                 except KeyError:
-                    #the face is not in bc list either so it's a new internal face
-                    debugPrint('\t a new face was found, %d, %s, cell %d\n' %(fi, fnodes, ofvid), 3)
-                    if verify:
-                        if not verifyFaceOrder(mesh, nodes, fnodes):
-                            debugPrint('\t face has bad order, reversing order\n', 3)
-                            fnodes.reverse()
-                    faces.append(fnodes)
-                    key = b.keys[fi]
-                    facesSorted[key] = offid
-                    owner[offid] = ofvid
-                    offid += 1
-                    if nrFaces > 50 and offid % (nrFaces/50) == 0:
-                        if offid % ((nrFaces/50)*10) == 0:
-                            debugPrint(':', 1)
+                    #the face is not in the list of internal faces
+                    #it might a new face or a BCface.
+                    try:
+                        bcind = bcFacesSorted[key]
+                        #if no exception was trown then it's a bc face
+                        debugPrint('\t found bc face: %d, %s, cell %d\n' %(bcind, fnodes, ofvid), 3)
+                        #if the face belongs to a baffle then it exits twice in owner
+                        #check dont overwrite owner
+                        if owner[nrIntFaces + bcind] == -1:
+                            owner[nrIntFaces + bcind] = ofvid
+                            bcFaces[bcind] = fnodes
                         else:
-                            debugPrint('.', 1)
-            fi += 1
+                            #build functions that looks for baffles in bclist. with bcind
+                            revkey = -faceMatching.packKey(fnodes, bits)
+                            bcind = bcFacesSorted[revkey]
+                            #make sure the faces has the correct orientation
+                            bcFaces[bcind] = fnodes
+                            owner[nrIntFaces + bcind] = ofvid
+                    except KeyError:
+                        #the face is not in bc list either so it's a new internal face
+                        debugPrint('\t a new face was found, %d, %s, cell %d\n' \
+                                       %(fi, fnodes, ofvid), 3)
+                        faces.append(fnodes)
+                        facesSorted[key] = offid
+                        owner[offid] = ofvid
+                        offid += 1
+                        if nrFaces > 50 and offid % (nrFaces/50) == 0:
+                            if offid % ((nrFaces/50)*10) == 0:
+                                debugPrint(':', 1)
+                            else:
+                                debugPrint('.', 1)
             
-        ofvid += 1
-        # end for v in volumes
-
-    nrCells = ofvid
-    debugPrint('Finished processing volumes.\n')
-    debugPrint('faces: %d\n' % len(faces), 2)
-    debugPrint(str(faces) + '\n', 3)
-    debugPrint('facesSorted: %d\n' % len(facesSorted), 2)
-    debugPrint(str(facesSorted) + '\n', 3)
-    debugPrint('owner: %d\n' %(len(owner)), 2)
-    debugPrint(str(owner) + '\n', 3)
-    debugPrint('neighbour: %d\n' %(len(neighbour)), 2)
-    debugPrint(str(neighbour) + '\n', 3)
-
-
-    #Convert to "upper triangular order"
-    #owner is sorted, for each cell sort faces it's neighbour faces
-    # i.e. change 
-    # owner   neighbour      owner   neighbour
-    #     0          15         0           3
-    #     0           3  to     0          15
-    #     0          17         0          17
-    #     1           5         1           5
-    # any changes made to neighbour are repeated to faces.
-    debugPrint('Sorting faces in upper triangular order\n', 1)
-    ownedfaces = 1
-    quickrange = range if sys.version_info.major > 2 else xrange
-
-    for faceId in quickrange(0, nrIntFaces):
-        cellId = owner[faceId]
-        nextCellId = owner[faceId + 1] #np since len(owner) > nrIntFaces
-        if cellId == nextCellId:
-            ownedfaces += 1
-            continue
-        
-        if ownedfaces > 1:
-            sId = faceId - ownedfaces + 1 #start ID
-            eId = faceId #end ID
-            inds = range(sId, eId + 1)
-
-            if sys.version_info.major > 2:
-                sorted(inds, key=neighbour.__getitem__)
-            else:
-                inds.sort(key = neighbour.__getitem__)
-
-            neighbour[sId:eId + 1] = map(neighbour.__getitem__, inds)
-            faces[sId:eId + 1] = map(faces.__getitem__, inds)
-
-        ownedfaces = 1
-    converttime = time.time() - starttime
-
-    #WRITE points to file
-    debugPrint('Writing the file points\n')
-    writeHeader(filePoints, 'points')
-    points = mesh.GetElementsByType(SMESH.NODE)
-    nrPoints = len(points)
-    filePoints.write('\n%d\n(\n' % nrPoints)
-    for n, ni in enumerate(points):
-        pos = mesh.GetNodeXYZ(ni)
-        filePoints.write('\t(%g %g %g)\n' % (pos[0], pos[1], pos[2]))
-    filePoints.write(')\n')
-    filePoints.flush()
-    filePoints.close()
-
-    #WRITE faces to file
-    debugPrint('Writing the file faces\n')
-    writeHeader(fileFaces, 'faces')
-    fileFaces.write('\n%d\n(\n' % nrFaces)
-    for node in faces:
-        fileFaces.write('\t%d(' % len(node))
-        for p in node:
-            #salome starts to count from one, OpenFOAM from zero
-            fileFaces.write('%d ' % (p - 1))
-        fileFaces.write(')\n')
-    #internal nodes are done output bcnodes
-    for node in bcFaces:
-        fileFaces.write('\t%d(' % len(node))
-        for p in node:
-            #salome starts to count from one, OpenFOAM from zero
-            fileFaces.write('%d ' % (p - 1))
-        fileFaces.write(')\n')
-    fileFaces.write(')\n')
-    fileFaces.flush()
-    fileFaces.close()
-
-    #WRITE owner to file
-    debugPrint('Writing the file owner\n')
-    writeHeader(fileOwner, 'owner', nrPoints, nrCells, nrFaces, nrIntFaces)
-    fileOwner.write('\n%d\n(\n' % len(owner))
-    for cell in owner:
-        fileOwner.write(' %d \n' % cell)
-    fileOwner.write(')\n')
-    fileOwner.flush()
-    fileOwner.close()
-
-    #WRITE neighbour
-    debugPrint('Writing the file neighbour\n')
-    writeHeader(fileNeighbour, 'neighbour', nrPoints, nrCells, nrFaces, nrIntFaces)
-    fileNeighbour.write('\n%d\n(\n' %(len(neighbour)))
-    for cell in neighbour:
-        fileNeighbour.write(' %d\n' %(cell))
-    fileNeighbour.write(')\n')
-    fileNeighbour.flush()
-    fileNeighbour.close()
-
-    #WRITE boundary file
-    debugPrint('Writing the file boundary\n')
-    writeHeader(fileBoundary, 'boundary')
-    fileBoundary.write('%d\n(\n' %len(grpStartFace))
-    for ind, gname in enumerate(grpNames):
-        fileBoundary.write('\t%s\n\t{\n' %gname)
-        fileBoundary.write('\ttype\t\t')
-        if 'wall' in gname.lower():
-            fileBoundary.write('wall;\n')
-        else:
-            fileBoundary.write('wall;\n')
-        fileBoundary.write('\tnFaces\t\t%d;\n' %grpNrFaces[ind])
-        fileBoundary.write('\tstartFace\t%d;\n' %grpStartFace[ind])
-        fileBoundary.write('\t}\n')
-    fileBoundary.write(')\n')
-    fileBoundary.close()
-
-    #WRITE cellZones
-#Count number of cellZones
-    nrCellZones = 0
-    cellZonesName = list()
-
-    for grp in mesh.GetGroups():
-        if grp.GetType() == SMESH.VOLUME:
-            nrCellZones += 1
-            cellZonesName.append(grp.GetName())
-
-    if nrCellZones > 0:
-        try:
-            fileCellZones = open(dirname + '/cellZones', 'w')
-        except Exception:
-            print('Could not open the file cellZones, other files are ok.')
-        debugPrint('Writing file cellZones\n')
-        #create a dictionary where salomeIDs are keys
-        #and OF cell ids are values.
-        scToOFc = dict([sa, of] for of, sa in enumerate(volumes))
-        writeHeader(fileCellZones, 'cellZones')
-        fileCellZones.write('\n%d(\n' %nrCellZones)
-
-        for grp in mesh.GetGroups():
-            if grp.GetType() == SMESH.VOLUME:
-                fileCellZones.write(grp.GetName() + '\n{\n')
-                fileCellZones.write('\ttype\tcellZone;\n')
-                fileCellZones.write('\tcellLabels\tList<label>\n')
-                cellSalomeIDs = grp.GetIDs()
-                nrGrpCells = len(cellSalomeIDs)
-                fileCellZones.write('%d\n(\n' %nrGrpCells)
-                for csId in cellSalomeIDs:
-                    ofID = scToOFc[csId]
-                    fileCellZones.write('%d\n' %ofID)
-
-                fileCellZones.write(');\n}\n')
-        fileCellZones.write(')\n')
-        fileCellZones.flush()
-        fileCellZones.close()
-
+            ofvid += 1
+            # end for v in volumes
+
+        if engine == 'dict':
+            faces = faceStore.FaceStore.fromList(faces + bcFaces)
+            del faceNodes, faceOffsets
+
+        nrCells = ofvid
+        prof.stop('matching', nrCellFaces)
+        if verify:
+            prof.start('verify')
+            faces = verifyFaceOrder(source, xyz, faces, owner, neighbour, nrCells)
+            prof.stop('verify', nrFaces)
+        debugPrint('Finished processing volumes.\n')
+        debugPrint('faces: %d\n' % len(faces), 2)
+        debugPrint(str(faces) + '\n', 3)
+        debugPrint('facesSorted: %d\n' % len(facesSorted), 2)
+        debugPrint(str(facesSorted) + '\n', 3)
+        debugPrint('owner: %d\n' %(len(owner)), 2)
+        debugPrint(str(owner) + '\n', 3)
+        debugPrint('neighbour: %d\n' %(len(neighbour)), 2)
+        debugPrint(str(neighbour) + '\n', 3)
+
+        #Renumber the cells to reduce the bandwidth
+        cellIds = np.arange(nrCells) #OpenFOAM cell id of each volume
+        if renumber and not dual:
+            debugPrint('Renumbering cells, bandwidth before: %d\n' \
+                           % meshOrdering.bandwidth(owner, neighbour), 1)
+            prof.start('renumber')
+            owner, neighbour, cellIds = meshOrdering.renumberCells(owner, neighbour, nrCells)
+            prof.stop('renumber', nrCells)
+            debugPrint('bandwidth after: %d\n' % meshOrdering.bandwidth(owner, neighbour), 1)
+
+        if incremental:
+            #the boundary faces in slot order, for the next export
+            bcState = (faces.take(np.arange(nrIntFaces, nrFaces)), np.asarray(owner)[nrIntFaces:],
+                       np.asarray(bcPartner) == -2)
+
+        #Convert to "upper triangular order", the boundary faces are
+        #sorted by owner within each patch
+        debugPrint('Sorting faces in upper triangular order\n', 1)
+        prof.start('ordering')
+        faces, owner, neighbour = meshOrdering.orderFaces(
+            faces, owner, neighbour, grpStartFace, grpNrFaces)
+        prof.stop('ordering', nrFaces)
+        converttime = time.time() - starttime
+
+        nrPoints = len(nodeIds)
+        #salome starts to count from one, OpenFOAM from zero
+        faces = faceStore.FaceStore(faces.lengths(), faces.nodes - 1)
+        zones = cellZones(source, volumes, cellIds)
+
+        #CONVERT to the polyhedral dual, a cell per point
+        if dual:
+            debugPrint('Converting to the polyhedral dual\n', 1)
+            prof.start('dual')
+            xyz, faces, owner, neighbour, grpNrFaces, zones = polyDual.dualMesh(
+                xyz, faces, owner, neighbour, nrCells, grpNrFaces, zones)
+            nrCells, nrPoints = nrPoints, len(xyz)
+            nrIntFaces, nrFaces = len(neighbour), len(faces)
+            grpStartFace = (nrIntFaces + np.cumsum(grpNrFaces) - grpNrFaces).tolist()
+            if renumber:
+                owner, neighbour, cellIds = meshOrdering.renumberCells(owner, neighbour, nrCells)
+                zones = [(name, cellIds[cells].tolist()) for name, cells in zones]
+            faces, owner, neighbour = meshOrdering.orderFaces(
+                faces, owner, neighbour, grpStartFace, grpNrFaces)
+            prof.stop('dual', nrCells)
+            debugPrint('Dual mesh: %d points, %d cells, %d faces\n' \
+                           % (nrPoints, nrCells, nrFaces), 1)
+            debugPrint('Writing the file points\n')
+            written['points'] = writers.submit(prof.call, 'write points', nrPoints, writeFile,
+                                               filePoints, foamWriter.writePoints,
+                                               xyz, format, labelSize, chunkSize)
+        patches = boundaryPatches(grpNames, grpNrFaces, grpStartFace)
+
+        #WRITE faces, owner, neighbour, boundary and cellZones side by side,
+        #internal faces first then bc faces
+        debugPrint('Writing the files faces, owner, neighbour and boundary\n')
+        meshSize = (nrPoints, nrCells, nrFaces, nrIntFaces)
+        prof.start('write')
+        written['faces'] = writers.submit(prof.call, 'write faces', nrFaces, writeFile,
+                                          fileFaces, foamWriter.writeFaces,
+                                          faces.lengths(), faces.nodes, format, labelSize,
+                                          chunkSize, nrIntFaces)
+        written['owner'] = writers.submit(prof.call, 'write owner', nrFaces, writeFile,
+                                          fileOwner, foamWriter.writeLabels, 'owner',
+                                          owner, meshSize, ' %d \n', format, labelSize,
+                                          chunkSize, nrIntFaces)
+        written['neighbour'] = writers.submit(prof.call, 'write neighbour', nrIntFaces, writeFile,
+                                              fileNeighbour, foamWriter.writeLabels,
+                                              'neighbour', neighbour, meshSize, ' %d\n', format,
+                                              labelSize, chunkSize)
+        written['boundary'] = writers.submit(writeFile, fileBoundary, foamWriter.writeBoundary,
+                                             patches)
+        written['cellZones'] = writers.submit(writeCellZones, dirname, zones, compress)
+        writers.shutdown(wait=False)
+
+        #CHECK the mesh quality while the files are written
+        report = None
+        if quality:
+            debugPrint('Checking the mesh quality\n')
+            prof.start('quality')
+            report = meshQuality.checkMesh(xyz, faces, owner, neighbour, nrCells)
+            meshQuality.writeReport(report, os.path.abspath(dirname) + '.quality')
+            prof.stop('quality', nrFaces)
+            printQuality(report)
+
+        #wait for the files, a failed write raises here
+        facesPosition = written['faces'].result()
+        ownerPosition = written['owner'].result()
+        for name in ('points', 'neighbour', 'boundary', 'cellZones'):
+            written[name].result()
+        prof.stop('write', nrFaces)
+    except BaseException:
+        abortWrite(dirname, meshFiles, writers, written, compress)
+        raise
+
+    if incremental:
+        exportCache.saveState(dirname, fingerprint, options, meshSize, nrCellFaces,
+                              int(faces.offsets[nrIntFaces]), *bcState, cellIds=cellIds,
+                              facesPosition=facesPosition, ownerPosition=ownerPosition)
+
+    #WRITE the decomposed case
+    if decompose > 1:
+        caseDir = foamDecompose.caseDirectory(dirname)
+        debugPrint('Decomposing into %d processors in %s\n' % (decompose, caseDir), 1)
+        prof.start('decompose')
+        cellProc = foamDecompose.partitionCells(xyz, faces, owner, neighbour, nrCells,
+                                                decompose, decomposeMethod)
+        foamDecompose.writeDecomposed(caseDir, cellProc, decompose, xyz, faces, owner,
+                                      neighbour, patches, zones, format, labelSize, chunkSize,
+                                      compress)
+        prof.stop('decompose', nrCells)
+
+    finishProfile(prof, profile, dirname, meshSize)
     totaltime = time.time() - starttime
     debugPrint('Finished writing to %s \n' % dirname)
     debugPrint('Converted mesh in %.0fs\n' % (converttime), 1)
     debugPrint('Wrote mesh in %.0fs\n' % (totaltime - converttime), 1)
     debugPrint('Total time: %0.fs\n' % totaltime, 1)
+    return report
                    
 
-def writeHeader(file, fileType, nrPoints=0, nrCells=0, nrFaces=0, nrIntFaces=0):
-    """Write a header for the files points, faces, owner, neighbour"""
-    file.write('/*' + '-'*68 + '*\\\n')
-    file.write('|' + ' '*70 + '|\n')
-    file.write('|' + ' '*4 + 'File exported from Salome Platform' +\
-                   ' using SalomeToFoamExporter' +' '*5 +'|\n')
-    file.write('|' + ' '*4 + 'Keep up to date: https://github.com/nicolasedh/salomeToOpenFOAM' +\
-                   ' '*3 + '|\n')
-    file.write('|' + ' '*70 + '|\n')
-    file.write('\*' + '-'*68 + '*/\n')
+def finishProfile(prof, profile, dirname, meshSize):
+    """Stop the profile of the export and write it if profile"""
+    prof.info['meshSize'] = dict(zip(('points', 'cells', 'faces', 'internalFaces'),
+                                     [int(n) for n in meshSize]))
+    record = prof.finish(meshSize[1])
+    for stage in record['stages']:
+        debugPrint('%s: %.2fs\n' % (stage['name'], stage['wall']), 2)
+    if profile:
+        exportProfile.writeRecord(record, os.path.abspath(dirname) + '.profile.json')
+    return record
 
-    file.write('FoamFile\n{\n')
-    file.write('\tversion\t\t2.0;\n')
-    file.write('\tformat\t\tascii;\n')
-    file.write('\tclass\t\t')
 
-    if(fileType == 'points'):
-        file.write('vectorField;\n')
+def writeFile(file, write, *args):
+    """Write file with write(file, *args) and close it, for the writer threads"""
+    try:
+        return write(file, *args)
+    finally:
+        file.close()
+
+
+def openMeshFiles(dirname, compress=False):
+    """Open the files points, faces, owner, neighbour and boundary for writing"""
+    if not os.path.exists(dirname):
+        os.makedirs(dirname)
+    try:
+        return tuple(foamWriter.openFile(dirname + '/' + name, compress) for name in MESHFILES)
+    except Exception:
+        print('could not open files aborting')
+        return None
 
-    elif(fileType == 'faces'):
-        file.write('faceList;\n')
 
-    elif(fileType == 'owner' or fileType == 'neighbour'):
-        file.write('labelList;\n')
-        file.write('\tnote\t\t\"nPoints: %d nCells: %d nFaces: %d nInternalFaces: %d\";\n' \
-                       %(nrPoints, nrCells, nrFaces, nrIntFaces))
+def abortWrite(dirname, meshFiles, writers, written, compress=False):
+    """
+    Clean up after a failed export: cancel the writes that haven't
+    started, wait for the others, then close and remove the mesh files
+    so no half written mesh is left.
+    """
+    for future in written.values():
+        future.cancel()
+    if writers is not None:
+        writers.shutdown(wait=True)
+    if meshFiles is None:
+        return
+    for name, file in zip(MESHFILES, meshFiles):
+        try:
+            file.close()
+        except Exception:
+            pass #a failed compression is reported by the original error
+        path = dirname + '/' + name + ('.gz' if compress else '')
+        if os.path.exists(path):
+            os.remove(path)
 
-    elif(fileType == 'boundary'):
-        file.write('polyBoundaryMesh;\n')
 
-    elif(fileType == 'cellZones'):
-        file.write('regIOobject;\n')
+def cellFaceStore(source):
+    """Return the faces of all cells in flat arrays, see faceStore"""
+    cellNrFaces, faceLengths, faceNodes = source.cellFaces()
+    return faceStore.CellFaceStore(cellNrFaces, faceStore.FaceStore(faceLengths, faceNodes))
 
-    file.write('\tlocation\t\"constant/polyMesh\";\n')
-    file.write('\tobject\t\t' + fileType + ';\n')
-    file.write('}\n\n')
 
+def boundaryPatches(grpNames, grpNrFaces, grpStartFace):
+    """Return the patches of the file boundary, all groups are walls"""
+    return [(gname, [('type', 'wall'), ('nFaces', nr), ('startFace', start)])
+            for gname, nr, start in zip(grpNames, grpNrFaces, grpStartFace)]
 
-    
-def debugPrint(msg, level=1):
-    """Print only if level >= debug """
-    if debug >= level:
-        print(msg)
 
+def cellZones(source, volumes, cellIds):
+    """Return the volume groups as (name, OpenFOAM cell ids)"""
+    zones = [(grName, cellSalomeIDs) for grName, grType, cellSalomeIDs in source.groups()
+             if grType == meshSource.VOLUME]
+    if len(zones) > 0:
+        #create a dictionary where salomeIDs are keys
+        #and OF cell ids are values.
+        scToOFc = dict(zip(volumes, np.asarray(cellIds).tolist()))
+        zones = [(grName, [scToOFc[csId] for csId in cellSalomeIDs])
+                 for grName, cellSalomeIDs in zones]
+    return zones
 
-def verifyFaceOrder(mesh, vnodes, fnodes):
-    """ 
-    Verify if the face order is correct. I.e. pointing out of the cell 
 
-    calc vol center
-    calc f center 
-    calc ftov=fcenter-vcenter 
-     calc fnormal=first to second cross first to last
-    if ftov dot fnormal >0 reverse order
+def writeCellZones(dirname, zones, compress=False):
+    """Write the file cellZones if there are any zones"""
+    if len(zones) > 0:
+        debugPrint('Writing file cellZones\n')
+        try:
+            with foamWriter.openFile(dirname + '/cellZones', compress) as fileCellZones:
+                foamWriter.writeCellZones(fileCellZones, zones)
+        except IOError:
+            print('Could not open the file cellZones, other files are ok.')
 
-    """
-    vc = cog(mesh, vnodes)
-    fc = cog(mesh, fnodes)
-    fcTovc = diff(vc, fc)
-    fn = calcNormal(mesh, fnodes)
 
-    if dotprod(fn, fcTovc) > 0.0:
-        return False
+def printQuality(report):
+    """Print the quality report like checkMesh"""
+    metrics = report['metrics']
+    debugPrint('Max non-orthogonality = %g average: %g\n' \
+                   % (metrics['nonOrthogonality']['max'], metrics['nonOrthogonality']['mean']), 1)
+    debugPrint('Max skewness = %g\n' % metrics['skewness']['max'], 1)
+    debugPrint('Max aspect ratio = %g\n' % metrics['aspectRatio']['max'], 1)
+    debugPrint('Minimum face area = %g. Maximum face area = %g\n' \
+                   % (metrics['faceArea']['min'], metrics['faceArea']['max']), 1)
+    debugPrint('Min volume = %g. Max volume = %g. Total volume = %g\n' \
+                   % (metrics['cellVolume']['min'], metrics['cellVolume']['max'],
+                      metrics['cellVolume']['total']), 1)
+    if report['failed']:
+        debugPrint('***Failed %d mesh checks: %s\n' \
+                       % (len(report['failed']), ', '.join(report['failed'])), 0)
     else:
-        return True
-    
-def cog(mesh, nodes):
-    """
-    calculate the center of gravity. 
-    """
-    c = [0.0, 0.0, 0.0]
+        debugPrint('Mesh OK.\n', 1)
 
-    for n in nodes:
-        pos = mesh.GetNodeXYZ(n)
-        c[0] += pos[0]
-        c[1] += pos[1]
-        c[2] += pos[2]
 
-    c[0] /= len(nodes)
-    c[1] /= len(nodes)
-    c[2] /= len(nodes)
-    return c
+def debugPrint(msg, level=1):
+    """Print only if level >= debug """
+    if debug >= level:
+        print(msg)
 
-def calcNormal(mesh, nodes):
-    """ 
-    Calculate and return face normal. 
-    """
-    p0 = mesh.GetNodeXYZ(nodes[0])
-    p1 = mesh.GetNodeXYZ(nodes[1])
-    pn = mesh.GetNodeXYZ(nodes[-1])
-    u = diff(p1, p0)
-    v = diff(pn, p0)
-    return crossprod(u, v)
-                       
-                 
-    
-def diff(u, v):
-    """ 
-    u - v, in 3D 
-    """
-    res = [0.0]*3
-    res[0] = u[0] - v[0]
-    res[1] = u[1] - v[1]
-    res[2] = u[2] - v[2]
-    return res
-    
-def dotprod(u, v):
-    """ 
-    3D scalar dot product 
-    """
-    return u[0]*v[0] + u[1]*v[1] + u[2]*v[2]
 
-def crossprod(u, v):
+def verifyFaceOrder(source, xyz, faces, owner, neighbour, nrCells):
     """
-    3D cross product 
+    Verify that all faces point out of their owner cell and flip
+    those that don't, see meshGeometry.inwardFaces.
+
+    args:
+        +  source: the MeshSource, to find the nodes of the faces
+        +     xyz: coordinates of the nodes
+        +   faces: FaceStore of all faces with Salome node ids
+        +   owner: owner of all faces
+        + neighbour: neighbour of the internal faces
+    returns the faces with the flipped faces reversed.
     """
-    res = [0.0]*3
-    res[0] = u[1]*v[2] - u[2]*v[1]
-    res[1] = u[2]*v[0] - u[0]*v[2]
-    res[2] = u[0]*v[1] - u[1]*v[0]
-    return res
+    positions = faceStore.FaceStore(faces.lengths(), source.nodeIndex(faces.nodes))
+    flipped = meshGeometry.inwardFaces(xyz, positions, owner, neighbour, nrCells)
+    nrIntFlipped = int(np.count_nonzero(flipped < len(neighbour)))
+    debugPrint('Verified the face order, flipped %d internal and %d boundary faces\n' \
+                   % (nrIntFlipped, len(flipped) - nrIntFlipped), 1)
+    debugPrint(str(flipped.tolist()) + '\n', 3)
+    if len(flipped):
+        faces = faces.flip(flipped)
+    return faces
 
 def findSelectedMeshes():
     meshes = list()
@@ -643,14 +726,6 @@ def findSelectedMeshes():
     else:
         return meshes
 
-def isGroupBaffle(mesh, group, extFaces, grIds):
-    for sid in grIds:
-        if not sid in extFaces:
-            debugPrint('group %s is a baffle\n' % group.GetName(), 1)
-            return True
-    return False
-        
-
 def main():
     """ 
     Main function. Export the selected mesh.
@@ -0,0 +1,193 @@
+"""
+Geometry helpers of the SAM-e manifold scripts, same_18inch_c1.py and
+same_auto_wmesh_woinputs.py.
+
+Each distribution tube has NOZZLE_ROWS rows of two nozzles, one on each
+side along x. A nozzle is a hole of radius CUT_RADIUS cut into the tube
+wall with a thinner cylinder of radius FUSE_RADIUS fused into it.
+
+nozzledTube builds one row of nozzles as a template, replicates it up
+the tube with a translation pattern and does the cut and the fuse on
+that tube alone. The nozzles only reach into their own tube so this
+gives the same solid as cutting and fusing all nozzles of the whole
+manifold at once, while each boolean operation only sees one tube and
+its nozzles. The time then grows with the number of tubes instead of
+with the number of nozzles squared.
+
+classifyFaces sorts the faces of the manifold into the inlet, outlet
+and wall groups by their geometry instead of their index in the output
+of ExtractShapes, so it works for any number of tubes and nozzles:
+    +  inlet: the planar faces facing -x at the lowest x of the shape,
+              the end of the inlet pipe
+    + outlet: the planar faces facing along x at the ends of the nozzles,
+              found among the face centres sorted by x
+    +  walls: all other faces
+The geometry of all faces is queried once by faceProperties.
+"""
+
+import numpy as np
+
+NOZZLE_ROWS = 5        # rows of nozzles per tube
+NOZZLE_Z0 = 0.0508     # height of the rows start, the first row is one pitch above
+NOZZLE_PITCH = 0.0254  # vertical distance between the rows
+NOZZLE_OFFSET = 0.00635 # distance of the nozzles from the tube axis along x
+CUT_RADIUS = 0.00635
+CUT_LENGTH = 0.01905
+FUSE_RADIUS = 0.003175
+FUSE_LENGTH = 0.0195
+TOLERANCE = 1e-5       # distance of a face from where it is expected
+#kinds of faces, see geompy.KindOfShape, which are planar
+PLANAR_KINDS = ('PLANE', 'PLANAR', 'DISK_CIRCLE', 'DISK_ELLIPSE', 'POLYGON')
+
+
+def calcDistTubeLocs(len_header, distTubeSpacing, num_distTubes, dia_distTubes):
+    """
+    Return the x of the axes of the distribution tubes, spaced by
+    distTubeSpacing and centred on a header of length len_header which
+    starts at x = 0. Raises ValueError if the tubes don't fit the header.
+    """
+    len_internal = (num_distTubes - 1) * distTubeSpacing + dia_distTubes
+    if len_internal > len_header:
+        raise ValueError('%d distribution tubes need %g of the header, it is %g long' \
+                             % (num_distTubes, len_internal, len_header))
+    len_external = (len_header - len_internal) / 2
+    return [len_external + dia_distTubes / 2 + i * distTubeSpacing for i in range(num_distTubes)]
+
+
+def nozzleDimensions():
+    """Return the constants of the nozzle geometry, e.g. for the cache key of a shape"""
+    return [NOZZLE_ROWS, NOZZLE_Z0, NOZZLE_PITCH, NOZZLE_OFFSET, CUT_RADIUS, CUT_LENGTH,
+            FUSE_RADIUS, FUSE_LENGTH]
+
+
+def nozzleTemplate(geompy, x, z, radius, length):
+    """
+    Return a compound of the two cylinders of the nozzle row at height z
+    of the tube at x, pointing in +x and -x.
+    """
+    OX = geompy.MakeVectorDXDYDZ(1, 0, 0)
+    minusOX = geompy.MakeVectorDXDYDZ(-1, 0, 0)
+    right = geompy.MakeCylinder(geompy.MakeVertex(x + NOZZLE_OFFSET, 0, z), OX, radius, length)
+    left = geompy.MakeCylinder(geompy.MakeVertex(x - NOZZLE_OFFSET, 0, z), minusOX, radius, length)
+    return geompy.MakeCompound([right, left])
+
+
+def nozzleArray(geompy, x, radius, length, nrRows=NOZZLE_ROWS):
+    """Return the nozzle cylinders of all rows of the tube at x as a compound"""
+    template = nozzleTemplate(geompy, x, NOZZLE_Z0 + NOZZLE_PITCH, radius, length)
+    if nrRows == 1:
+        return template
+    OZ = geompy.MakeVectorDXDYDZ(0, 0, 1)
+    return geompy.MakeMultiTranslation1D(template, OZ, NOZZLE_PITCH, nrRows)
+
+
+def nozzledTube(geompy, tube, x, nrRows=NOZZLE_ROWS):
+    """
+    Return the tube at x with its nozzles, cut and fused on the tube only.
+
+    args:
+        +   tube: the solid of the distribution tube, axis along z
+        +      x: x of the tube axis
+        + nrRows: number of rows of nozzles
+    returns (tube with nozzles, cut cylinders, fuse cylinders), the
+    cylinders as compounds e.g. to publish them.
+    """
+    cuts = nozzleArray(geompy, x, CUT_RADIUS, CUT_LENGTH, nrRows)
+    fuses = nozzleArray(geompy, x, FUSE_RADIUS, FUSE_LENGTH, nrRows)
+    cut = geompy.MakeCutList(tube, [cuts], True)
+    nozzles = geompy.ExtractShapes(fuses, geompy.ShapeType["SOLID"], False)
+    return geompy.MakeFuseList([cut] + nozzles, True, True), cuts, fuses
+
+
+def faceProperties(geompy, faces):
+    """
+    Return the geometry of the faces as arrays, in one pass over them.
+
+    returns (centres, normals, kinds, boxes): the (n, 3) centres of mass,
+    the (n, 3) normals at the centres of the planar faces, zero for the
+    others, the kind of each face and the (n, 6) bounding boxes
+    xmin, xmax, ymin, ymax, zmin, zmax.
+    """
+    centres = np.zeros((len(faces), 3))
+    normals = np.zeros((len(faces), 3))
+    boxes = np.zeros((len(faces), 6))
+    kinds = list()
+    for i, face in enumerate(faces):
+        centre = geompy.MakeCDG(face)
+        centres[i] = geompy.PointCoordinates(centre)
+        kinds.append(str(geompy.KindOfShape(face)[0]))
+        if kinds[-1] in PLANAR_KINDS:
+            normals[i] = geompy.VectorCoordinates(geompy.GetNormal(face, centre))
+        boxes[i] = geompy.BoundingBox(face)
+    return centres, normals, kinds, boxes
+
+
+def nozzleOutlets(tubeX, nrRows=NOZZLE_ROWS):
+    """Return the (n, 3) centres of the ends of the nozzles of the tubes at tubeX"""
+    reach = NOZZLE_OFFSET + FUSE_LENGTH
+    x = np.repeat(np.asarray(tubeX, dtype=np.float64), 2 * nrRows) + \
+        np.tile(np.repeat([reach, -reach], nrRows), len(tubeX))
+    z = np.tile(NOZZLE_Z0 + NOZZLE_PITCH * np.arange(1, nrRows + 1), 2 * len(tubeX))
+    return np.column_stack((x, np.zeros(len(x)), z))
+
+
+def matchPoints(points, targets, tol=TOLERANCE):
+    """
+    Return for each target the index of the nearest point within tol,
+    -1 if there is none. Only the points in the slab of x +- tol around a
+    target, found in the points sorted by x, are compared with it.
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+    targets = np.asarray(targets, dtype=np.float64).reshape(-1, 3)
+    order = np.argsort(points[:, 0], kind='stable')
+    x = points[order, 0]
+    lows = np.searchsorted(x, targets[:, 0] - tol, 'left')
+    highs = np.searchsorted(x, targets[:, 0] + tol, 'right')
+    matches = np.full(len(targets), -1, dtype=np.int64)
+    for t, (low, high) in enumerate(zip(lows.tolist(), highs.tolist())):
+        if low == high:
+            continue
+        candidates = order[low:high]
+        distance = np.linalg.norm(points[candidates] - targets[t], axis=1)
+        nearest = np.argmin(distance)
+        if distance[nearest] <= tol:
+            matches[t] = candidates[nearest]
+    return matches
+
+
+def classifyFaces(centres, normals, kinds, boxes, tubeX, nrRows=NOZZLE_ROWS, tol=TOLERANCE):
+    """
+    Sort the faces of the manifold into inlet, outlet and walls.
+
+    args:
+        + centres, normals, kinds, boxes: the geometry of the faces,
+                 see faceProperties
+        +  tubeX: x of the axes of the distribution tubes
+        + nrRows: number of rows of nozzles per tube
+        +    tol: distance of a face from where it is expected
+
+    returns the indices of the (inlet, outlet, wall) faces. Nozzle ends
+    without a face raise a ValueError, e.g. if tubeX doesn't match the
+    shape.
+    """
+    centres = np.asarray(centres, dtype=np.float64).reshape(-1, 3)
+    normals = np.asarray(normals, dtype=np.float64).reshape(-1, 3)
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 6)
+    planar = np.array([kind in PLANAR_KINDS for kind in kinds], dtype=bool)
+    length = np.maximum(np.linalg.norm(normals, axis=1), 1e-300)
+    alongX = planar & (np.abs(normals[:, 0]) >= (1.0 - 1e-6) * length)
+
+    inlet = np.flatnonzero(alongX & (boxes[:, 1] <= boxes[:, 0].min() + tol))
+
+    #only the faces along x can be the ends of nozzles
+    candidates = np.flatnonzero(alongX)
+    matches = matchPoints(centres[candidates], nozzleOutlets(tubeX, nrRows), tol)
+    if np.any(matches < 0):
+        raise ValueError('%d of %d nozzle ends have no face' \
+                             % (np.count_nonzero(matches < 0), len(matches)))
+    outlet = np.unique(candidates[matches])
+
+    isWall = np.ones(len(centres), dtype=bool)
+    isWall[inlet] = False
+    isWall[outlet] = False
+    return inlet, outlet, np.flatnonzero(isWall)
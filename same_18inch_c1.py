@@ -35,28 +35,46 @@ import GEOM
 from salome.geom import geomBuilder
 import math
 import SALOMEDS
+import hashlib
+import json
+import os
+import sameGeometry
+
+#built shapes are kept as BREP files named by the hash of the arguments of buildSAME
+CACHE_DIR = os.path.join(os.getcwd(), 'geomCache')
+#change when buildSAME builds a different shape from the same arguments
+CACHE_VERSION = 2
 
 def flatten(li):
 	flat_li = [item for sublist in li for item in sublist]
 	return flat_li
 
-def calcDistTubeLocs(len_header, distTubeSpacing, num_distTubes, dia_distTubes):
-
-	len_internal = (num_distTubes-1) * distTubeSpacing + 2*dia_distTubes/2
-
-	len_external = (len_header - len_internal)/2
-
-	x_locs = []
-
-	for i in range(len(num_distTubes)):
-		x_locs.append(len_external + dia_distTubes/2 + i * (distTubeSpacing))
-
-	return x_locs
+def shapeKey(*args):
+	"""
+	Return the hash of the design inputs of a shape, the name of its cache file.
+	The nozzle dimensions of sameGeometry are part of the inputs.
+	"""
+	values = [float(a) for a in args] + [float(a) for a in sameGeometry.nozzleDimensions()]
+	text = json.dumps([CACHE_VERSION] + values)
+	return hashlib.sha256(text.encode('ascii')).hexdigest()
 
-def buildSAME(dia_inlet, len_inlet, dia_header, len_header, num_distTubes, distTubeSpacing, dia_distTubes):
+def buildSAME(dia_inlet, len_inlet, dia_header, len_header, num_distTubes, distTubeSpacing, dia_distTubes, cacheDir=CACHE_DIR):
+	"""
+	Build the SAM-e manifold and return it.
+	A shape built before from the same arguments is loaded from its BREP
+	file in cacheDir instead of doing the boolean operations again, no
+	cache with cacheDir=None.
+	"""
 
 	geompy = geomBuilder.New()
 
+	if cacheDir:
+		cacheFile = os.path.join(cacheDir, shapeKey(dia_inlet, len_inlet, dia_header, len_header, num_distTubes, distTubeSpacing, dia_distTubes) + '.brep')
+		if os.path.exists(cacheFile):
+			Fuse_2 = geompy.ImportBREP(cacheFile)
+			geompy.addToStudy( Fuse_2, 'Fuse_2' )
+			return Fuse_2
+
 	O = geompy.MakeVertex(0, 0, 0)
 	OX = geompy.MakeVectorDXDYDZ(1, 0, 0)
 	OY = geompy.MakeVectorDXDYDZ(0, 1, 0)
@@ -76,61 +94,40 @@ def buildSAME(dia_inlet, len_inlet, dia_header, len_header, num_distTubes, distT
 
 	distCylinder = []
 
-	loc_distTube = calcDistTubeLocs(len_header, distTubeSpacing, num_distTubes, dia_distTubes)
+	loc_distTube = sameGeometry.calcDistTubeLocs(len_header, distTubeSpacing, num_distTubes, dia_distTubes)
 
-	for i in range(len(num_distTubes)):
+	for i in range(num_distTubes):
 		Vertex = geompy.MakeVertex(loc_distTube[i], 0, (dia_header/2 - 0.01))
 		Cylinder = geompy.MakeCylinder(Vertex, OZ, 0.01905, 0.1497)
 		distCylinder.append(Cylinder)
 	
-	headerComps = [Cylinder_1, Box_1, Cylinder_2, distCylinder]
-	headerComps = flatten(headerComps)
-	Fuse_1 = geompy.MakeFuseList(headerComps, True, True)
-
 	Vertex_7 = geompy.MakeVertex(0.5, -0.2, 0.2)
 	Vertex_8 = geompy.MakeVertex(0, 0, -0.2)
-	
-	Vertex_1000 = geompy.MakeVertex(-1, 0, 0)
-	Vector_1 = geompy.MakeVector(O, Vertex_1000)
 
 	Box_2 = geompy.MakeBoxTwoPnt(Vertex_7, Vertex_8)
 
-	vertex_cols = [[],[],[]]
-	cut_cyls = [[],[],[]]
-	fuse_cyls = [[],[],[]]
-
-	col_x = [0.4082, 0.332, 0.2558]
-
-	for i in range(1,6):
-		for j in range(len(col_x)):
-			new_vert = geompy.MakeVertex(col_x[j] + 0.00635, 0, 0.0508 + 0.0254*i)
-			new_cut_cyls = geompy.MakeCylinder(new_vert, OX, 0.00635, 0.01905)
-			new_fuse_cyls = geompy.MakeCylinder(new_vert, OX, 0.003175, 0.0195)
-			
-			vertex_cols[j].append(new_vert)
-			cut_cyls[j].append(new_cut_cyls)
-			fuse_cyls[j].append(new_fuse_cyls)
-			
-			new_vert = geompy.MakeVertex(col_x[j] - 0.00635, 0, 0.0508 + 0.0254*i)
-			new_cut_cyls = geompy.MakeCylinder(new_vert, Vector_1, 0.00635, 0.01905)
-			new_fuse_cyls = geompy.MakeCylinder(new_vert, Vector_1, 0.003175, 0.0195)
-			
-			vertex_cols[j].append(new_vert)
-			cut_cyls[j].append(new_cut_cyls)
-			fuse_cyls[j].append(new_fuse_cyls)
-
-	flat_cut_cyls = [item for sublist in cut_cyls for item in sublist]
-	Cut_1 = geompy.MakeCutList(Fuse_1, flat_cut_cyls, True)
-
-	geompy.addToStudy( Cut_1, 'Cut_1' )
-
-	flat_fuse_cyls = [item for sublist in fuse_cyls for item in sublist]
-	flat_fuse_cyls.append(Cut_1)
+	#Cut and fuse the nozzles on each tube alone, see sameGeometry
+	nozzledTubes = []
+	cut_cyls = []
+	fuse_cyls = []
+	for i in range(num_distTubes):
+		tube, cuts, fuses = sameGeometry.nozzledTube(geompy, distCylinder[i], loc_distTube[i])
+		nozzledTubes.append(tube)
+		cut_cyls.append(cuts)
+		fuse_cyls.append(fuses)
 
-	Fuse_2 = geompy.MakeFuseList(flat_fuse_cyls, True, True)
+	headerComps = flatten([[Cylinder_1, Box_1, Cylinder_2], nozzledTubes])
+	Fuse_2 = geompy.MakeFuseList(headerComps, True, True)
 
 	geompy.addToStudy( Fuse_2, 'Fuse_2' )
 
+	if cacheDir:
+		#write to a temporary file first, parallel runs may build the same shape
+		os.makedirs(cacheDir, exist_ok=True)
+		tmpFile = '%s.%d.tmp' % (cacheFile, os.getpid())
+		geompy.ExportBREP(Fuse_2, tmpFile)
+		os.replace(tmpFile, cacheFile)
+
 	geompy.addToStudy( O, 'O' )
 	geompy.addToStudy( OX, 'OX' )
 	geompy.addToStudy( OY, 'OY' )
@@ -141,26 +138,15 @@ def buildSAME(dia_inlet, len_inlet, dia_header, len_header, num_distTubes, distT
 	geompy.addToStudy( Cylinder_1, 'Cylinder_1' )
 	geompy.addToStudy( Vertex_1, 'Vertex_1' )
 	geompy.addToStudy( Box_1, 'Box_1' )
-	geompy.addToStudy( Vertex_5, 'Vertex_5' )
-	geompy.addToStudy( Vertex_4, 'Vertex_4' )
-	geompy.addToStudy( Cylinder_3, 'Cylinder_3' )
-	geompy.addToStudy( Vertex_6, 'Vertex_6' )
-	geompy.addToStudy( Cylinder_4, 'Cylinder_4' )
-	geompy.addToStudy( Cylinder_5, 'Cylinder_5' )
-	geompy.addToStudy( Fuse_1, 'Fuse_1' )
+	for i in range(len(distCylinder)):
+		geompy.addToStudy(distCylinder[i], ('Cylinder_dist_' + str(i+1)))
 	geompy.addToStudy( Vertex_7, 'Vertex_7' )
 	geompy.addToStudy( Vertex_8, 'Vertex_8' )
 	geompy.addToStudy( Box_2, 'Box_2' )
 
-	flat_vertex_cols = [item for sublist in vertex_cols for item in sublist]
-	for i in range(len(flat_vertex_cols)):
-		geompy.addToStudy(flat_vertex_cols[i], ('Vertex_' + str(i+9)) )
-
-	for i in range(len(flat_cut_cyls)):
-		geompy.addToStudy(flat_cut_cyls[i], ('Cylinder_' + str(i+6)))
-
-	for i in range(len(flat_fuse_cyls)):
-		geompy.addToStudy(flat_fuse_cyls[i], ('Cylinder_' + str(i+6+len(flat_cut_cyls))))
+	for i in range(num_distTubes):
+		geompy.addToStudy(cut_cyls[i], ('Nozzle_cut_' + str(i+1)))
+		geompy.addToStudy(fuse_cyls[i], ('Nozzle_fuse_' + str(i+1)))
 
 	"""
 	geompy.addToStudy( Vertex_9, 'Vertex_9' )
@@ -200,5 +186,7 @@ def buildSAME(dia_inlet, len_inlet, dia_header, len_header, num_distTubes, distT
 	geompy.addToStudy( Fuse_2, 'Fuse_2' )
 	"""
 
-	if salome.sg.hasDesktop():
+	return Fuse_2
+
+if salome.sg.hasDesktop():
 	salome.sg.updateObjBrowser()
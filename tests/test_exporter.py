@@ -0,0 +1,63 @@
+"""
+exportToFoam on the fake SMESH mesh of the benchmarks.
+"""
+
+import os, sys, threading
+import pytest
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, root)
+sys.path.insert(0, os.path.join(root, 'benchmarks'))
+import fakeSmesh
+fakeSmesh.install()
+import faceMatching
+import salomeToOpenFOAMPython3 as exporter
+
+exporter.debug = 0
+
+
+def openDescriptors():
+    return len(os.listdir('/proc/self/fd'))
+
+
+@pytest.mark.parametrize('compress', [False, True])
+def test_failedMatchingClosesTheFiles(tmp_path, monkeypatch, compress):
+    def fail(*args):
+        raise ValueError('unmatched faces')
+    monkeypatch.setattr(faceMatching, 'matchFaces', fail)
+    mesh = fakeSmesh.FakeMesh.block('hex', 1000)
+    dirname = str(tmp_path / 'polyMesh')
+    threads = set(threading.enumerate())
+    descriptors = openDescriptors() if os.path.isdir('/proc/self/fd') else None
+
+    with pytest.raises(ValueError, match='unmatched faces'):
+        exporter.exportToFoam(mesh, dirname, engine='numpy', compress=compress)
+
+    assert set(threading.enumerate()) <= threads
+    if descriptors is not None:
+        assert openDescriptors() == descriptors
+    #no half written mesh is left
+    assert os.listdir(dirname) == []
+
+
+def export(mesh, dirname, **options):
+    """Export mesh, return the report and the names of the stages that ran"""
+    stages = []
+    report = exporter.exportToFoam(mesh, dirname, engine='numpy',
+                                   profileCallback=lambda r: stages.append(r['name']),
+                                   **options)
+    return report, stages
+
+
+def test_incrementalQualityReport(tmp_path):
+    mesh = fakeSmesh.FakeMesh.block('tet', 1000)
+    dirname = str(tmp_path / 'polyMesh')
+    #a state without the report can't give one
+    export(mesh, dirname, incremental=True)
+    report, stages = export(mesh, dirname, incremental=True, quality=True)
+    assert report is not None and 'matching' in stages
+
+    #the boundary is rewritten and the saved report returned
+    again, stages = export(mesh, dirname, incremental=True, quality=True)
+    assert 'rewrite' in stages and 'matching' not in stages
+    assert again == report
@@ -0,0 +1,62 @@
+"""
+Skewness of meshQuality against OpenFOAM's checkMesh.
+"""
+
+import os, sys
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import meshGeometry
+import meshQuality
+from faceStore import FaceStore
+
+
+def shearedHexes(shift):
+    """
+    Return (xyz, faces, owner, neighbour) of the unit cube and a hex
+    next to it along x whose far face is shifted by shift along y.
+    """
+    xyz = np.array([[0, 0, 0], [0, 1, 0], [0, 1, 1], [0, 0, 1],
+                    [1, 0, 0], [1, 1, 0], [1, 1, 1], [1, 0, 1],
+                    [2, shift, 0], [2, 1 + shift, 0], [2, 1 + shift, 1], [2, shift, 1]],
+                   dtype=np.float64)
+    faces = FaceStore.fromList([[4, 5, 6, 7],
+                                [0, 3, 2, 1], [0, 4, 7, 3], [1, 2, 6, 5], [0, 1, 5, 4],
+                                [3, 7, 6, 2],
+                                [8, 9, 10, 11], [4, 8, 11, 7], [5, 6, 10, 9], [4, 5, 9, 8],
+                                [7, 11, 10, 6]])
+    owner = np.array([0, 0, 0, 0, 0, 0, 1, 1, 1, 1, 1])
+    neighbour = np.array([1])
+    return xyz, faces, owner, neighbour
+
+
+def skewness(shift):
+    xyz, faces, owner, neighbour = shearedHexes(shift)
+    fCentres, fAreas = meshGeometry.faceCentresAndAreas(xyz, faces)
+    cCentres, cVolumes = meshGeometry.cellCentresAndVolumes(fCentres, fAreas, owner,
+                                                             neighbour, 2)
+    return meshQuality.skewness(xyz, faces, cCentres, fCentres, fAreas, owner, neighbour)
+
+
+def test_skewnessOfShearedHex():
+    #checkMesh, by hand from primitiveMeshTools: the line between the
+    #centres (0.5, 0.5, 0.5) and (1.5, 1, 0.5) crosses the shared face
+    #0.25 from its centre, the face extends 0.5 that way
+    values = skewness(1.0)
+    assert np.isclose(values[0], 0.5)
+    #far face of the sheared hex: the centre of the hex projects 0.5
+    #from the face centre, the face extends 0.5 that way
+    assert np.isclose(values[6], 1.0)
+    #faces of the cube with the cube centre on their normal
+    assert np.allclose(values[1:6][[0, 4]], 0.0)
+
+
+def test_skewnessUsesTheFaceExtent():
+    #with a large shift 0.2 of the centre distance is the larger scale
+    shift = 20.0
+    d = np.hypot(1.0, shift / 2)
+    assert np.isclose(skewness(shift)[0], (shift / 4) / (0.2 * d))
+    #the far face projects 10 from the owner centre with an extent of 0.5
+    report = meshQuality.checkMesh(*shearedHexes(shift), 2)
+    assert np.isclose(report['metrics']['skewness']['max'], 20.0)
+    assert 'skewness' in report['failed']
@@ -0,0 +1,46 @@
+"""
+SalomeMeshSource on the fake SMESH mesh of the benchmarks.
+"""
+
+import os, sys
+import numpy as np
+import pytest
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, root)
+sys.path.insert(0, os.path.join(root, 'benchmarks'))
+import fakeSmesh
+fakeSmesh.install()
+import meshSource
+
+pytest.importorskip('h5py')
+
+
+def cellFaceSets(source):
+    """Return the faces of each volume id as sorted node tuples"""
+    cellNrFaces, lengths, nodes = source.cellFaces()
+    faces = [tuple(sorted(f)) for f in meshSource.splitFaces(lengths, nodes)]
+    ends = np.cumsum(cellNrFaces).tolist()
+    return dict((v, sorted(faces[e - n:e])) for v, e, n in
+                zip(source.volumes().tolist(), ends, cellNrFaces.tolist()))
+
+
+@pytest.mark.parametrize('cellType', ['tet', 'poly'])
+@pytest.mark.parametrize('medNumbers', [False, True])
+def test_readsThroughMED(monkeypatch, cellType, medNumbers):
+    mesh = fakeSmesh.FakeMesh.block(cellType, 1000)
+    mesh.medNumbers = medNumbers
+    source = meshSource.SalomeMeshSource(mesh)
+    ids, xyz = source.nodes()
+    faces = cellFaceSets(source)
+    #a few bulk calls instead of calls per node and face
+    assert source.calls['ExportMED'] == 1
+    assert sum(source.calls.values()) < 10
+
+    monkeypatch.setattr(meshSource, 'h5py', None)
+    elementwise = meshSource.SalomeMeshSource(mesh)
+    order = np.argsort(ids)
+    assert np.array_equal(ids[order], elementwise.nodes()[0])
+    assert np.array_equal(xyz[order], elementwise.nodes()[1])
+    assert faces == cellFaceSets(elementwise)
+    assert elementwise.calls['GetElemFaceNodes'] > len(faces)